@@ -0,0 +1,233 @@
+"""
+This is a python script and library that generates colocation figures in bulk.
+A job list (e.g. every combination of site, period and plot type) is rendered in parallel worker processes:
+    The datafiles are read once and each job is handed only the rows it needs
+    Figures are drawn with the non-interactive Agg backend and never shown
+    Each figure is saved as <plot>_<site>_<start>_<end>.png next to a CSV of its regressions
+Run as a script, it renders every plot type for each quarter covered by the data.
+"""
+
+import itertools
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import df_funs as _
+import loaders
+import profiling
+
+# Set a directory that will be used to find files.
+DIRECTORY = "data//"
+
+# Establish filenames and schemas for datafiles.
+FILES = {
+        'T640_PRE_DMS' : ('T640_PM25_preDMS_DailyAvg.csv', loaders.T640_PRE_DMS),
+        'T640' : ('T640_20190725_to_20200405_DailyAvg.csv', loaders.T640),
+        'Partisol' : ('Partisol_20190323_to_20200405.csv', loaders.PARTISOL),
+        'BAM' : ('BAM_PM25_20190323_to_20200405.csv', loaders.BAM),
+        'CalFire' : ('Filtered CalFire.csv', loaders.CALFIRE)
+        }
+
+# Site of each datafile that has no Site column: the pre-DMS T640 daily averages were all recorded at Concord.
+FILE_SITES = {'T640_PRE_DMS' : 'Concord - 2956-A Treat Blvd'}
+
+# Plot types and the instruments each one compares.
+PLOTS = {
+        'correlogram' : ["T640", "BAM", "Partisol"],
+        'fire_correlogram' : ["T640", "BAM", "Partisol"],
+        'fire_correlation' : ["T640", "Partisol"]
+        }
+
+@profiling.timed(rows = lambda data: sum(len(v) for k, v in data.items() if k != 'fires'))
+def load_data(directory = DIRECTORY, fire_catalog = None, file_sites = FILE_SITES):
+    """
+    Read and clean every datafile once, for use by any number of jobs.
+    Args:
+        directory (str): directory containing the datafiles
+        fire_catalog (str): path of the fire table, defaults to the CalFire file in directory
+        file_sites (dict): site of each datafile without a Site column, added to it as a Site column so that it can be filtered by site
+    Returns:
+        data (dict): DataFrames keyed as in FILES, plus the fire index under 'fires'.
+            The instrument DataFrames keep every row with its Flags, so that each job can apply its own QC policy.
+    """
+    paths = {k : os.path.join(directory, f) for k, (f, schema) in FILES.items()}
+    if fire_catalog is not None:
+        paths['CalFire'] = fire_catalog
+    data = {k : loaders.load_cached(paths[k], schema, qc = None) for k, (f, schema) in FILES.items() if k != 'CalFire'}
+    for k, site in file_sites.items():
+        if 'Site' not in data[k]:
+            data[k].insert(0, 'Site', pd.Series(site, index = data[k].index, dtype = 'category'))
+    data['CalFire'] = loaders.load_cached(paths['CalFire'], loaders.CALFIRE)
+    data['fires'] = _.fire_index(data['CalFire'])
+    return(data)
+
+def job_matrix(sites, periods, plots = list(PLOTS)):
+    """
+    Build a job for every combination of site, period and plot type.
+    Args:
+        sites (list): site names, as in the Site column of the datafiles
+        periods (list): (start, end) pairs of dates, both inclusive
+        plots (list): plot types, keys of PLOTS
+    Returns:
+        jobs (list): one dict per job with keys site, start, end and plot
+    """
+    jobs = []
+    for site, (start, end), plot in itertools.product(sites, periods, plots):
+        jobs += [{'site' : site, 'start' : pd.Timestamp(start), 'end' : pd.Timestamp(end), 'plot' : plot}]
+    return(jobs)
+
+def job_name(job):
+    """
+    Build the deterministic output name of a job.
+    Args:
+        job (dict): job with keys site, start, end and plot
+    Returns:
+        name (str): file name without extension
+    """
+    site = re.sub(r'[^A-Za-z0-9]+', '_', job['site']).strip('_')
+    name = job['plot'] + '_' + site + '_' + job['start'].strftime('%Y%m%d') + '_' + job['end'].strftime('%Y%m%d')
+    return(name)
+
+def select(df, site, start, end, date = "Date", mask = None):
+    """
+    Filter a DataFrame to one site and period. A DataFrame without a Site column cannot be matched to a site, so no rows are kept when a site is given.
+    Args:
+        df (pandas.DataFrame): DataFrame to filter
+        site (str): site name, or None for every site
+        start (pandas.Timestamp): first date of the period, or None for no lower bound
+        end (pandas.Timestamp): last date of the period, or None for no upper bound
+        date (str): name of the column containing the timestamps
+        mask (numpy.array): optional boolean array of rows to consider, e.g. from loaders.qc_mask
+    Returns:
+        new_df (pandas.DataFrame): filtered DataFrame
+    """
+    rows = pd.Series(True if mask is None else mask, index = df.index)
+    if start is not None:
+        rows &= df[date] >= start
+    if end is not None:
+        rows &= df[date] < end + pd.Timedelta(days = 1)
+    if site is not None:
+        rows &= (df["Site"] == site) if "Site" in df else False
+    new_df = df[rows.to_numpy()]
+    return(new_df)
+
+def instrument_frames(data, job):
+    """
+    Select the rows of each instrument that one job uses, before they are aligned.
+    Args:
+        data (dict): data from load_data
+        job (dict): job with keys site, start and end, and optionally qc to apply a QC policy other than loaders.DEFAULT_QC
+    Returns:
+        frames (dict): DataFrames of the T640 (both segments spliced together), BAM and Partisol
+    """
+    args = (job.get('site'), job.get('start'), job.get('end'))
+    qc = job.get('qc', loaders.DEFAULT_QC)
+    frames = {k : select(data[k], *args, mask = loaders.qc_mask(data[k], FILES[k][1], qc)) for k in ['T640_PRE_DMS', 'T640', 'BAM', 'Partisol']}
+    frames['T640'] = _.splice([frames.pop('T640_PRE_DMS'), frames['T640']])
+    return(frames)
+
+@profiling.timed(rows = lambda result: len(result[2]))
+def prepare(data, job):
+    """
+    Extract and align the data needed by one job.
+    Args:
+        data (dict): data from load_data
+        job (dict): job with keys site, start, end and plot, and optionally instruments to override the instruments of the plot type,
+            qc to apply a QC policy other than loaders.DEFAULT_QC, and shifts mapping instruments to a time added to their timestamps
+            before they are aligned (e.g. to remove a timing offset found with df_funs.lag_pairs)
+    Returns:
+        values (list): aligned values of each instrument compared by the plot type
+        fire (numpy.array): boolean array that is True where a fire was occuring
+        dates (pandas.DatetimeIndex): timestamps shared by the instruments
+    """
+    frames = instrument_frames(data, job)
+    for k, lag in (job.get('shifts') or {}).items():
+        frames[k] = _.shift(frames[k], lag)
+    aligned, dates = _.time_sync_n(*[frames[k] for k in job.get('instruments', PLOTS[job['plot']])])
+    values = [df['Value'].to_numpy() for df in aligned]
+    fire = _.active_fires(data['fires'], dates, names = False)["count"].to_numpy() > 0
+    return(values, fire, dates)
+
+def _init_worker():
+    """
+    Switch worker processes to the non-interactive Agg backend, whatever backend the parent process uses.
+    """
+    import matplotlib.pyplot as plt
+    plt.switch_backend('Agg')
+    profiling.reset()
+
+@profiling.timed(rows = None)
+def render(job, values, fire, out):
+    """
+    Draw and save the figure of one job, with a CSV of its regressions.
+    Args:
+        job (dict): job with keys site, start, end and plot
+        values (list): aligned values of each instrument, from prepare
+        fire (numpy.array): boolean array that is True where a fire was occuring, from prepare
+        out (str): output directory
+    Returns:
+        path (str): path of the saved figure, or None if the instruments share no timestamps in the period
+    """
+    import matplotlib.pyplot as plt
+    import figures
+    if len(fire) == 0:
+        return(None)
+    labels = job.get('instruments', PLOTS[job['plot']])
+    if job['plot'] == 'correlogram':
+        fig, fits = figures.correlogram(values, labels)
+    elif job['plot'] == 'fire_correlogram':
+        fig, fits = figures.fire_correlogram(values, fire, labels)
+    else:
+        fig, fits = figures.fire_correlation(values[0], values[1], fire, labels[0], labels[1])
+    path = os.path.join(out, job_name(job))
+    fig.savefig(path + '.png')
+    plt.close(fig)
+    fits.to_csv(path + '.csv', index = False)
+    return(path + '.png')
+
+def _render_task(args):
+    """
+    Run render on one job. Module-level so that it can be sent to worker processes.
+    Args:
+        args (tuple): arguments for render
+    Returns:
+        path (str): path of the saved figure, from render
+        stages (dict): stages timed by the worker while rendering the job, from profiling.report
+    """
+    profiling.reset()
+    path = render(*args)
+    return(path, profiling.report())
+
+def run(jobs, data = None, out = 'figures', processes = None):
+    """
+    Render a list of jobs in parallel.
+    Args:
+        jobs (list): jobs, e.g. from job_matrix
+        data (dict): data from load_data, read from DIRECTORY if not given
+        out (str): output directory
+        processes (int): number of worker processes, defaults to the number of CPUs
+    Returns:
+        paths (list): path of each saved figure (None for jobs without data), in job order
+    """
+    if data is None:
+        data = load_data()
+    os.makedirs(out, exist_ok = True)
+    tasks = [(job, *prepare(data, job)[:2], out) for job in jobs]
+    with ProcessPoolExecutor(processes, initializer = _init_worker) as pool:
+        results = list(pool.map(_render_task, tasks))
+    for path, stages in results:
+        profiling.merge(stages)
+    paths = [path for path, stages in results]
+    return(paths)
+
+if __name__ == '__main__':
+    data = load_data()
+    sites = list(data['BAM']['Site'].dropna().unique())
+    start = min(data[k]['Date'].min() for k in ['T640_PRE_DMS', 'T640', 'BAM', 'Partisol'])
+    end = max(data[k]['Date'].max() for k in ['T640_PRE_DMS', 'T640', 'BAM', 'Partisol'])
+    quarters = pd.period_range(start, end, freq = 'Q')
+    periods = [(q.start_time.normalize(), q.end_time.normalize()) for q in quarters]
+    for path in run(job_matrix(sites, periods), data):
+        if path is not None:
+            print(path)
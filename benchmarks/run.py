@@ -0,0 +1,217 @@
+"""
+This is a python script that benchmarks the colocation pipeline on synthetic data and compares the results with stored baselines.
+For each size it generates the datafiles with synthetic.write, then times loading, the df_funs alignment and unit helpers,
+the fire lookup, the pairwise regressions and the rendering of a correlogram, and records the peak memory of each stage.
+It needs no network access. Examples:
+    python benchmarks/run.py                                  # 10^3 to 10^5 rows (a few minutes), compared with benchmarks/baseline.json if present
+    python benchmarks/run.py --sizes 1e3,1e4,1e5,1e6,1e7      # larger runs take minutes and several GB of disk and memory
+    python benchmarks/run.py --save-baseline                  # store the results as the new baseline
+A stage regresses if it takes more than --tolerance times its baseline wall time (and at least --min-delta seconds more),
+or more than --tolerance times its baseline peak memory (and at least 1 MB more). The script exits with status 1 if any stage regresses.
+Baselines depend on the machine they were recorded on, so none is committed: record one locally with --save-baseline
+(benchmarks/baseline.json is ignored by git) before making a change, then run again to compare.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Run from anywhere: the library modules live in the parent directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MPLBACKEND', 'Agg')
+# The stages are timed here, so the library's own instrumentation is switched off to keep it out of the measurements.
+os.environ['COLO_PROFILE'] = '0'
+
+import numpy as np
+import pandas as pd
+import df_funs as _
+import loaders
+import synthetic
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+SIZES = [1000, 10000, 100000]
+
+def measure(f, repeat = 3):
+    """
+    Time a function and measure its peak memory.
+    The function is run up to repeat times without memory tracing and the fastest run is kept, then once more under tracemalloc.
+    Stages that take longer than a second are only timed once, since timer noise is small next to them.
+    Args:
+        f (function): function of no arguments running the stage, returning the number of rows it produced
+        repeat (int): largest number of timed runs
+    Returns:
+        result (dict): wall time (s), peak memory (bytes) and rows of the stage
+    """
+    walls = []
+    for i in range(0, repeat):
+        start = time.perf_counter()
+        rows = f()
+        walls += [time.perf_counter() - start]
+        if walls[-1] > 1.0:
+            break
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    f()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    result = {'wall' : min(walls), 'peak_bytes' : peak, 'rows' : int(rows)}
+    return(result)
+
+def stages(paths, render = True):
+    """
+    Build the benchmarked stages for one set of generated datafiles.
+    Args:
+        paths (dict): paths of the datafiles, from synthetic.write
+        render (bool): whether to include rendering the correlogram
+    Returns:
+        stages (list): (name, function) pairs, run in order; later stages use the data loaded by earlier ones
+    """
+    data = {}
+
+    def load():
+        for k, schema in [('T640_PRE_DMS', loaders.T640_PRE_DMS), ('T640', loaders.T640), ('BAM', loaders.BAM), ('Partisol', loaders.PARTISOL), ('CalFire', loaders.CALFIRE)]:
+            data[k] = loaders.load(paths[k], schema)
+        return(sum(len(v) for v in data.values()))
+
+    def to_datetime():
+        return(len(_.to_datetime(data['BAM'], 'Date')))
+
+    def time_sync():
+        return(len(_.time_sync(data['BAM'], data['Partisol'], value_index = 2)))
+
+    def time_sync_2():
+        return(len(_.time_sync_2(data['BAM'], data['Partisol'])[2]))
+
+    def time_sync_n():
+        data['T640_ALL'] = _.splice([data['T640_PRE_DMS'], data['T640']])
+        aligned, dates = _.time_sync_n(data['T640_ALL'], data['BAM'], data['Partisol'])
+        data['aligned'], data['dates'] = aligned, dates
+        return(len(dates))
+
+    def conv_units_2():
+        return(len(_.conv_units_2(data['BAM'], 1000.0, 1, 2)))
+
+    def fires():
+        index = _.fire_index(data['CalFire'])
+        data['fire'] = _.active_fires(index, data['dates'], names = False)["count"].to_numpy() > 0
+        return(len(data['dates']))
+
+    def regress_pairs():
+        df = pd.DataFrame({k : x['Value'].to_numpy() for k, x in zip(['T640', 'BAM', 'Partisol'], data['aligned'])})
+        return(len(_.regress_pairs(df, strata = np.where(data['fire'], "Fire", "No Fire"), levels = ["No Fire", "Fire"], include_all = True)))
+
+    def correlogram():
+        import matplotlib.pyplot as plt
+        import figures
+        fig, fits = figures.correlogram([x['Value'].to_numpy() for x in data['aligned']], ['T640', 'BAM', 'Partisol'])
+        fig.savefig(io.BytesIO(), format = 'png')
+        plt.close(fig)
+        return(len(data['dates']))
+
+    stages = [('load', load), ('to_datetime', to_datetime), ('time_sync', time_sync), ('time_sync_2', time_sync_2), ('time_sync_n', time_sync_n),
+            ('conv_units_2', conv_units_2), ('fires', fires), ('regress_pairs', regress_pairs)]
+    if render:
+        stages += [('correlogram', correlogram)]
+    return(stages)
+
+def run(sizes = SIZES, repeat = 3, render_max = 1000000, seed = 0, **kwargs):
+    """
+    Benchmark every stage at every size.
+    Args:
+        sizes (list): numbers of timestamps of the synthetic data
+        repeat (int): number of timed runs of each stage
+        render_max (int): largest size at which the correlogram is rendered
+        seed (int): seed of the synthetic data
+        **kwargs: further arguments passed to synthetic.write (e.g. gap_rate)
+    Returns:
+        results (dict): results of measure, keyed by '<stage>@<size>'
+    """
+    results = {}
+    # Import scipy and matplotlib before timing, so that the first stage using them is not charged for the import.
+    import scipy.stats
+    import matplotlib.pyplot
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            paths = synthetic.write(directory, n, seed = seed, **kwargs)
+            for name, f in stages(paths, render = n <= render_max):
+                key = name + '@' + str(n)
+                results[key] = measure(f, repeat)
+                print('%-24s %10d rows %10.4f s %12.1f MB' % (key, results[key]['rows'], results[key]['wall'], results[key]['peak_bytes']/1e6), flush = True)
+    return(results)
+
+def compare(results, baseline, tolerance = 1.5, min_delta = 0.01):
+    """
+    Compare benchmark results with a baseline.
+    Args:
+        results (dict): results from run
+        baseline (dict): results from an earlier run
+        tolerance (float): largest allowed ratio of the new wall time or peak memory to the baseline
+        min_delta (float): smallest increase in wall time (s) that counts as a regression, to ignore timer noise on small stages
+    Returns:
+        regressions (list): description of each regression
+    """
+    regressions = []
+    for key, new in results.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        if new['wall'] > tolerance*old['wall'] and new['wall'] - old['wall'] > min_delta:
+            regressions += ['%s: %.4f s against a baseline of %.4f s' % (key, new['wall'], old['wall'])]
+        if old.get('peak_bytes') and new['peak_bytes'] > tolerance*old['peak_bytes'] and new['peak_bytes'] - old['peak_bytes'] > 1e6:
+            regressions += ['%s: %.1f MB against a baseline of %.1f MB' % (key, new['peak_bytes']/1e6, old['peak_bytes']/1e6)]
+    return(regressions)
+
+def main(argv = None):
+    """
+    Run the benchmarks from the command line.
+    Args:
+        argv (list): arguments, defaults to sys.argv[1:]
+    Returns:
+        status (int): 0 if no stage regressed, 1 otherwise
+    """
+    p = argparse.ArgumentParser(description = 'Benchmark the colocation pipeline on synthetic data.')
+    p.add_argument('--sizes', default = ','.join(str(n) for n in SIZES), help = 'comma-separated numbers of timestamps, e.g. 1e3,1e4,1e5 (default: %(default)s)')
+    p.add_argument('--repeat', type = int, default = 3, help = 'timed runs of each stage, the fastest is kept (default: %(default)s)')
+    p.add_argument('--render-max', type = float, default = 1e6, help = 'largest size at which the correlogram is rendered (default: %(default)s)')
+    p.add_argument('--gap-rate', type = float, default = 0.02, help = 'fraction of timestamps missing from each instrument (default: %(default)s)')
+    p.add_argument('--duplicate-rate', type = float, default = 0.001, help = 'fraction of rows repeated (default: %(default)s)')
+    p.add_argument('--sentinel-rate', type = float, default = 0.01, help = 'fraction of rows with -999 values (default: %(default)s)')
+    p.add_argument('--seed', type = int, default = 0, help = 'seed of the synthetic data (default: %(default)s)')
+    p.add_argument('--baseline', default = BASELINE, help = 'baseline JSON file (default: benchmarks/baseline.json)')
+    p.add_argument('--save-baseline', action = 'store_true', help = 'store the results as the baseline instead of comparing with it')
+    p.add_argument('--tolerance', type = float, default = 1.5, help = 'largest allowed ratio to the baseline (default: %(default)s)')
+    p.add_argument('--min-delta', type = float, default = 0.01, help = 'smallest wall time increase (s) that counts as a regression (default: %(default)s)')
+    p.add_argument('--out', default = None, help = 'also write the results to this JSON file')
+    args = p.parse_args(argv)
+    sizes = [int(float(x)) for x in args.sizes.split(',') if x.strip()]
+    results = run(sizes, args.repeat, args.render_max, args.seed, gap_rate = args.gap_rate, duplicate_rate = args.duplicate_rate, sentinel_rate = args.sentinel_rate)
+    report = {'machine' : platform.platform(), 'python' : platform.python_version(), 'pandas' : pd.__version__, 'numpy' : np.__version__, 'results' : results}
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent = 2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent = 2)
+        print('Saved baseline to ' + args.baseline)
+        return(0)
+    if not os.path.exists(args.baseline):
+        print('No baseline at ' + args.baseline + ', run with --save-baseline to record one')
+        return(0)
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    regressions = compare(results, baseline, args.tolerance, args.min_delta)
+    for r in regressions:
+        print('REGRESSION ' + r)
+    if regressions:
+        return(1)
+    print('No regressions against ' + args.baseline)
+    return(0)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""
+This is a library that generates synthetic colocation datafiles with the same layout as the files in data/, for benchmarking.
+The T640, BAM and Partisol files follow the AQS layout (Site, Parameter, Date (LST), Value, Unit, QCCode, OPCode) with each
+instrument's own timestamp format, the pre-DMS T640 file has daily averages, and the CalFire table lists random fire events.
+All three instruments measure one shared PM2.5 signal with their own bias and noise, so their regressions and fits are realistic.
+Row counts, gap, duplicate and -999 sentinel rates are configurable, and the same seed always produces the same files.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+SITE = 'Concord - 2956-A Treat Blvd'
+
+# File names, as in batch.FILES, so that a generated directory can be read with batch.load_data.
+FILES = {
+        'T640_PRE_DMS' : 'T640_PM25_preDMS_DailyAvg.csv',
+        'T640' : 'T640_20190725_to_20200405_DailyAvg.csv',
+        'Partisol' : 'Partisol_20190323_to_20200405.csv',
+        'BAM' : 'BAM_PM25_20190323_to_20200405.csv',
+        'CalFire' : 'Filtered CalFire.csv'
+        }
+
+# Parameter, unit, timestamp layout, bias (slope, offset) and noise of each instrument.
+INSTRUMENTS = {
+        'T640' : ('PM2.5_T640', 'ug/m3', 'ymd', (1.0, 0.0), 0.5),
+        'BAM' : ('PM25_fem', 'ug/m3_LC', 'mdy', (0.7, 2.0), 1.5),
+        'Partisol' : ('PM2.5_frm', 'ug/m3_LC', 'ymd', (0.9, 0.5), 0.8)
+        }
+
+COUNTIES = ['Contra Costa', 'Alameda', 'Solano', 'Napa', 'Sonoma', 'Marin']
+
+def format_dates(dates, layout, time = True):
+    """
+    Format timestamps like the datafiles do, without calling strftime once per row.
+    Each distinct day and each distinct time of day is formatted once and the strings are joined per row.
+    Args:
+        dates (pandas.DatetimeIndex): timestamps to format
+        layout (str): 'ymd' for 2019/07/25 00:00 (T640, Partisol) or 'mdy' for 7/25/2019 0:00 (BAM, pre-DMS, CalFire)
+        time (bool): whether to append the time of day
+    Returns:
+        strings (numpy.array): object array of formatted timestamps
+    """
+    days = dates.normalize()
+    day_codes, unique_days = pd.factorize(days)
+    if layout == 'ymd':
+        day_strings = np.array([d.strftime('%Y/%m/%d') for d in unique_days], dtype = object)
+    else:
+        day_strings = np.array([str(d.month) + '/' + str(d.day) + '/' + str(d.year) for d in unique_days], dtype = object)
+    strings = day_strings[day_codes]
+    if time:
+        minutes = ((dates - days)//pd.Timedelta('1min')).to_numpy()
+        hours, mins = np.divmod(np.arange(0, 1440), 60)
+        if layout == 'ymd':
+            time_strings = np.array([' %02d:%02d' % (h, m) for h, m in zip(hours, mins)], dtype = object)
+        else:
+            time_strings = np.array([' %d:%02d' % (h, m) for h, m in zip(hours, mins)], dtype = object)
+        strings = strings + time_strings[minutes]
+    return(strings)
+
+def signal(n, rng, mean = 8.0, persistence = 0.999):
+    """
+    Generate a positive, autocorrelated PM2.5 signal (a lognormal AR(1) process).
+    Args:
+        n (int): number of samples
+        rng (numpy.random.Generator): random number generator
+        mean (float): typical concentration (ug/m3)
+        persistence (float): AR(1) coefficient of the log concentration
+    Returns:
+        x (numpy.array): concentrations
+    """
+    shocks = rng.normal(0.0, np.sqrt(1 - persistence**2)*0.6, n)
+    # A first-order recursive filter, evaluated in blocks with cumulative sums so that it stays vectorized.
+    log_x = np.empty(n)
+    level = 0.0
+    block = 4096
+    for start in range(0, n, block):
+        e = shocks[start:start + block]
+        k = np.arange(1, len(e) + 1)
+        # log_x[t] = p^t*level + sum over s <= t of p^(t-s)*e[s], rescaled to avoid overflow within the block.
+        w = persistence**-np.arange(0, len(e))
+        log_x[start:start + block] = persistence**k*level + persistence**(k - 1)*np.cumsum(e*w)
+        level = log_x[start + len(e) - 1]
+    x = mean*np.exp(log_x)
+    return(x)
+
+def aqs(dates, truth, name, rng, gap_rate = 0.02, duplicate_rate = 0.001, sentinel_rate = 0.01):
+    """
+    Build one instrument's datafile in the AQS layout.
+    Args:
+        dates (pandas.DatetimeIndex): timestamps of the shared signal
+        truth (numpy.array): shared signal at each timestamp
+        name (str): instrument, a key of INSTRUMENTS
+        rng (numpy.random.Generator): random number generator
+        gap_rate (float): fraction of timestamps with no row
+        duplicate_rate (float): fraction of rows repeated right after themselves
+        sentinel_rate (float): fraction of rows with a -999 value and QC code 8
+    Returns:
+        df (pandas.DataFrame): datafile contents
+    """
+    parameter, unit, layout, (slope, offset), noise = INSTRUMENTS[name]
+    value = np.round(slope*truth + offset + rng.normal(0.0, noise, len(truth)), 2)
+    keep = rng.random(len(truth)) >= gap_rate
+    rows = np.flatnonzero(keep)
+    rows = np.sort(np.concatenate([rows, rows[rng.random(len(rows)) < duplicate_rate]]), kind = 'stable')
+    bad = rng.random(len(rows)) < sentinel_rate
+    df = pd.DataFrame({
+            'Site' : SITE,
+            'Parameter' : parameter,
+            'Date (LST)' : format_dates(dates[rows], layout),
+            'Value' : np.where(bad, -999, value[rows]),
+            'Unit' : unit,
+            'QCCode' : np.where(bad, 8, 0),
+            'OPCode' : 0
+            })
+    return(df)
+
+def pre_dms(dates, truth, rng, sentinel_rate = 0.01):
+    """
+    Build the pre-DMS T640 file: daily averages with the number of minutes averaged.
+    Args:
+        dates (pandas.DatetimeIndex): timestamps of the shared signal
+        truth (numpy.array): shared signal at each timestamp
+        rng (numpy.random.Generator): random number generator
+        sentinel_rate (float): fraction of days with a -999 value
+    Returns:
+        df (pandas.DataFrame): datafile contents
+    """
+    days = pd.Series(truth).groupby(dates.normalize().to_numpy())
+    mean = days.mean()
+    df = pd.DataFrame({
+            'Date' : format_dates(pd.DatetimeIndex(mean.index), 'mdy', time = False),
+            'PM 2.5' : np.where(rng.random(len(mean)) < sentinel_rate, -999, mean.to_numpy()),
+            'Minutes in Average' : np.minimum(days.size().to_numpy(), 1440)
+            })
+    return(df)
+
+def calfire(n, start, end, rng):
+    """
+    Build a CalFire-style table of fire events.
+    Args:
+        n (int): number of events
+        start (pandas.Timestamp): earliest start date
+        end (pandas.Timestamp): latest start date
+        rng (numpy.random.Generator): random number generator
+    Returns:
+        df (pandas.DataFrame): datafile contents
+    """
+    days = max((end - start).days, 1)
+    first = start.normalize() + pd.to_timedelta(rng.integers(0, days, n), unit = 'D')
+    last = first + pd.to_timedelta(rng.integers(0, 30, n), unit = 'D')
+    df = pd.DataFrame({
+            'Name' : ['Fire ' + str(i) for i in range(0, n)],
+            'Date' : format_dates(pd.DatetimeIndex(first), 'mdy', time = False),
+            'End Date' : format_dates(pd.DatetimeIndex(last), 'mdy', time = False),
+            'County' : rng.choice(COUNTIES, n),
+            'Acreage' : np.round(np.exp(rng.normal(5.0, 2.0, n))),
+            'Containment' : '100%'
+            })
+    return(df)
+
+def generate(n, start = '2019-03-23', freq = '1min', pre_dms_fraction = 0.1, fires = None, gap_rate = 0.02, duplicate_rate = 0.001, sentinel_rate = 0.01, seed = 0):
+    """
+    Generate the contents of every datafile.
+    Args:
+        n (int): number of timestamps of the shared signal; each instrument file has about n rows
+        start (str): first timestamp
+        freq (str): spacing of the timestamps
+        pre_dms_fraction (float): fraction of the timestamps, at the start, covered by the daily pre-DMS T640 file instead of the post-DMS one
+        fires (int): number of fire events, defaults to one per 30 days covered
+        gap_rate, duplicate_rate, sentinel_rate (float): see aqs
+        seed (int): seed of the random number generator
+    Returns:
+        files (dict): DataFrames keyed as in FILES
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods = n, freq = freq)
+    truth = signal(n, rng)
+    split = np.arange(0, n) < int(pre_dms_fraction*n)
+    files = {
+            'T640_PRE_DMS' : pre_dms(dates[split], truth[split], rng, sentinel_rate),
+            'T640' : aqs(dates[~split], truth[~split], 'T640', rng, gap_rate, duplicate_rate, sentinel_rate),
+            'Partisol' : aqs(dates, truth, 'Partisol', rng, gap_rate, duplicate_rate, sentinel_rate),
+            'BAM' : aqs(dates, truth, 'BAM', rng, gap_rate, duplicate_rate, sentinel_rate)
+            }
+    days = (dates[-1] - dates[0]).days + 1
+    files['CalFire'] = calfire(fires if fires is not None else max(days//30, 1), dates[0], dates[-1], rng)
+    return(files)
+
+def write(directory, n, **kwargs):
+    """
+    Generate every datafile and write it to a directory, under the same names as in data/.
+    Args:
+        directory (str): output directory
+        n (int): number of timestamps of the shared signal
+        **kwargs: further arguments passed to generate
+    Returns:
+        paths (dict): path of each file, keyed as in FILES
+    """
+    os.makedirs(directory, exist_ok = True)
+    paths = {}
+    for k, df in generate(n, **kwargs).items():
+        paths[k] = os.path.join(directory, FILES[k])
+        df.to_csv(paths[k], index = False)
+    return(paths)
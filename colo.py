@@ -0,0 +1,281 @@
+"""
+This is the command line entry point for the colocation figures and statistics.
+Examples:
+    python colo.py correlogram --instruments T640,BAM,Partisol --out Correlogram.png --no-show
+    python colo.py fire-correlogram --fire-catalog "data/Filtered CalFire.csv" --out "Fire Correlogram.png"
+    python colo.py fits --instruments T640,Partisol --by-fire --out fits.csv
+    python colo.py batch --out figures
+Only argparse is imported at startup. pandas and the data libraries are imported once a subcommand runs,
+and matplotlib and scipy only by the subcommands that use them: --help and align import neither, and fits imports scipy but not matplotlib.
+"""
+
+import argparse
+import sys
+
+# Instruments that can be compared, and the plot types that can be made.
+INSTRUMENTS = ["T640", "BAM", "Partisol"]
+PLOTS = ['correlogram', 'fire-correlogram', 'fire-correlation']
+
+def _instruments(text):
+    """
+    Parse a comma-separated list of instrument names.
+    Args:
+        text (str): e.g. 'T640,BAM,Partisol'
+    Returns:
+        names (list): instrument names
+    """
+    names = [x.strip() for x in text.split(',') if x.strip()]
+    for x in names:
+        if x not in INSTRUMENTS:
+            raise argparse.ArgumentTypeError('unknown instrument ' + x + ', choose from ' + ','.join(INSTRUMENTS))
+    return(names)
+
+def _shifts(text):
+    """
+    Parse a comma-separated list of timing corrections.
+    Args:
+        text (str): e.g. 'BAM=-1h,Partisol=30min'
+    Returns:
+        shifts (dict): time to add to the timestamps of each named instrument
+    """
+    import pandas as pd
+    shifts = {}
+    for item in [x.strip() for x in text.split(',') if x.strip()]:
+        name, _, lag = item.partition('=')
+        if name.strip() not in INSTRUMENTS:
+            raise argparse.ArgumentTypeError('unknown instrument ' + name + ', choose from ' + ','.join(INSTRUMENTS))
+        try:
+            shifts[name.strip()] = pd.Timedelta(lag.strip())
+        except ValueError:
+            raise argparse.ArgumentTypeError('invalid lag ' + lag + ', e.g. BAM=-1h')
+    return(shifts)
+
+def _prepare(args, plot):
+    """
+    Load the datafiles and align the instruments named on the command line.
+    Args:
+        args (argparse.Namespace): parsed arguments
+        plot (str): plot type, a key of batch.PLOTS
+    Returns:
+        job (dict): job describing the selection, as used by batch
+        values (list): aligned values of each instrument
+        fire (numpy.array): boolean array that is True where a fire was occuring
+        dates (pandas.DatetimeIndex): timestamps shared by the instruments
+    """
+    import pandas as pd
+    import batch
+    import loaders
+    data = batch.load_data(args.directory, args.fire_catalog)
+    job = {
+            'site' : args.site,
+            'start' : None if args.start is None else pd.Timestamp(args.start),
+            'end' : None if args.end is None else pd.Timestamp(args.end),
+            'plot' : plot,
+            'instruments' : args.instruments or batch.PLOTS[plot],
+            'qc' : loaders.QC_POLICIES[args.qc],
+            'shifts' : args.shift
+            }
+    values, fire, dates = batch.prepare(data, job)
+    return(job, values, fire, dates)
+
+def align(args):
+    """
+    Write the aligned values of the instruments, with a fire column, as CSV.
+    """
+    import pandas as pd
+    job, values, fire, dates = _prepare(args, 'correlogram')
+    df = pd.DataFrame({name : x for name, x in zip(job['instruments'], values)}, index = pd.Index(dates, name = 'Date'))
+    df['Fire'] = fire
+    df.to_csv(args.out or sys.stdout)
+
+def fits(args):
+    """
+    Write the regressions between every pair of instruments as CSV, optionally split by fire days.
+    """
+    import numpy as np
+    import pandas as pd
+    import df_funs as _
+    job, values, fire, dates = _prepare(args, 'correlogram')
+    df = pd.DataFrame({name : x for name, x in zip(job['instruments'], values)})
+    strata = np.where(fire, "Fire", "No Fire") if args.by_fire else None
+    levels = ["No Fire", "Fire"] if args.by_fire else None
+    if args.bootstrap:
+        table = _.bootstrap_pairs(df, strata = strata, levels = levels, include_all = args.by_fire, B = args.bootstrap, block = args.block, mode = args.mode)
+    else:
+        table = _.regress_pairs(df, strata = strata, levels = levels, include_all = args.by_fire, mode = args.mode)
+    table.to_csv(args.out or sys.stdout, index = False)
+
+def lags(args):
+    """
+    Write the lag that best aligns each pair of instruments, with the correlations at that lag and at zero lag, as CSV.
+    """
+    import pandas as pd
+    import batch
+    import df_funs as _
+    import loaders
+    data = batch.load_data(args.directory, args.fire_catalog)
+    job = {
+            'site' : args.site,
+            'start' : None if args.start is None else pd.Timestamp(args.start),
+            'end' : None if args.end is None else pd.Timestamp(args.end),
+            'qc' : loaders.QC_POLICIES[args.qc]
+            }
+    frames = batch.instrument_frames(data, job)
+    names = args.instruments or INSTRUMENTS
+    table = _.lag_pairs([frames[k] for k in names], names, args.freq, args.max_lag)
+    table.to_csv(args.out or sys.stdout, index = False)
+
+def network(args):
+    """
+    Correlate every monitor in one or more AQS-style exports against every other, writing the pairwise table as CSV
+    and optionally a clustered heatmap.
+    """
+    import pandas as pd
+    import df_funs as _
+    import loaders
+    frames = [loaders.stream(path, loaders.AQS, sites = args.sites, parameters = args.parameters, start = args.start, end = args.end) for path in args.files]
+    frames = [df.assign(Site = df['Site'].astype(str), Parameter = df['Parameter'].astype(str)) for df in frames]
+    df = pd.concat(frames, ignore_index = True)
+    groups = df.groupby(['Site', 'Parameter'], sort = True).indices
+    labels = [site + ' | ' + parameter for site, parameter in groups]
+    dfs = [df.take(rows) for rows in groups.values()]
+    # With --tile the grid is built one block of time steps at a time, so only one block is in memory next to the monitors' rows.
+    grid = _.to_grid(dfs, args.freq)[0] if args.tile is None else _.grid_tiles(dfs, args.freq, args.tile)
+    if args.heatmap is not None:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        import figures
+        fig, table = figures.network_heatmap(grid, labels, args.min_overlap)
+        fig.savefig(args.heatmap)
+        plt.close(fig)
+    else:
+        table = _.correlation_table(_.correlation_matrix(grid, args.min_overlap), labels)
+    table.to_csv(args.out or sys.stdout, index = False)
+
+def plot(args):
+    """
+    Draw one of the figures and save it, showing it unless --no-show is given.
+    """
+    import matplotlib
+    if args.no_show:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import figures
+    import profiling
+    kind = args.command.replace('-', '_')
+    job, values, fire, dates = _prepare(args, kind)
+    labels = job['instruments']
+    if kind == 'correlogram':
+        fig, table = figures.correlogram(values, labels, args.xlim, args.ylim, *args.text_loc)
+    elif kind == 'fire_correlogram':
+        fig, table = figures.fire_correlogram(values, fire, labels, args.xlim, args.ylim, *args.text_loc, *args.fire_text_loc)
+    else:
+        fig, table = figures.fire_correlation(values[0], values[1], fire, labels[0], labels[1], args.xlim, args.ylim)
+    with profiling.stage('colo.savefig'):
+        fig.savefig(args.out)
+    if not args.no_show:
+        plt.show()
+
+def run_batch(args):
+    """
+    Render every plot type for each quarter covered by the data, as batch.py does.
+    """
+    import pandas as pd
+    import batch
+    import loaders
+    data = batch.load_data(args.directory, args.fire_catalog)
+    sites = [args.site] if args.site else list(data['BAM']['Site'].dropna().unique())
+    start = min(data[k]['Date'].min() for k in ['T640_PRE_DMS', 'T640', 'BAM', 'Partisol'])
+    end = max(data[k]['Date'].max() for k in ['T640_PRE_DMS', 'T640', 'BAM', 'Partisol'])
+    quarters = pd.period_range(args.start or start, args.end or end, freq = 'Q')
+    periods = [(q.start_time.normalize(), q.end_time.normalize()) for q in quarters]
+    jobs = [dict(job, qc = loaders.QC_POLICIES[args.qc]) for job in batch.job_matrix(sites, periods)]
+    for path in batch.run(jobs, data, args.out, args.processes):
+        if path is not None:
+            print(path)
+
+def parser():
+    """
+    Build the command line parser.
+    Returns:
+        p (argparse.ArgumentParser): parser with one subcommand per task
+    """
+    p = argparse.ArgumentParser(prog = 'colo', description = 'Colocation figures and statistics for the T640, BAM and Partisol PM2.5 monitors.')
+    sub = p.add_subparsers(dest = 'command', required = True)
+    prof = argparse.ArgumentParser(add_help = False)
+    prof.add_argument('--profile', default = None, metavar = 'JSON', help = 'write the wall time, rows and peak memory of each pipeline stage to a JSON report')
+    prof.add_argument('--cprofile', default = None, metavar = 'PROF', help = 'run under cProfile and dump the statistics to a file')
+    common = argparse.ArgumentParser(add_help = False, parents = [prof])
+    common.add_argument('--directory', default = 'data//', help = 'directory containing the datafiles (default: %(default)s)')
+    common.add_argument('--fire-catalog', default = None, help = 'path of the fire table (default: Filtered CalFire.csv in the data directory)')
+    common.add_argument('--site', default = None, help = 'site to select, as in the Site column (default: all)')
+    common.add_argument('--start', default = None, help = 'first date to include, e.g. 2019-03-23')
+    common.add_argument('--end', default = None, help = 'last date to include, e.g. 2020-04-05')
+    common.add_argument('--qc', default = 'default', choices = ['default', 'strict', 'positive'], help = 'QC policy, see loaders.QC_POLICIES (default: %(default)s)')
+    common.add_argument('--shift', type = _shifts, default = None, help = 'time to add to the timestamps of instruments before aligning them, e.g. BAM=-1h')
+    common.add_argument('--instruments', type = _instruments, default = None, help = 'comma-separated instruments, e.g. T640,BAM,Partisol')
+
+    a = sub.add_parser('align', parents = [common], help = 'write the aligned instrument values as CSV')
+    a.add_argument('--out', default = None, help = 'output CSV (default: standard output)')
+    a.set_defaults(func = align)
+
+    f = sub.add_parser('fits', parents = [common], help = 'write the pairwise regressions as CSV')
+    f.add_argument('--out', default = None, help = 'output CSV (default: standard output)')
+    f.add_argument('--by-fire', action = 'store_true', help = 'fit fire days, no-fire days and all days separately')
+    f.add_argument('--mode', default = 'ols', choices = ['ols', 'deming', 'orthogonal', 'theil-sen'], help = 'regression mode (default: %(default)s)')
+    f.add_argument('--bootstrap', type = int, default = 0, metavar = 'B', help = 'add bootstrap confidence intervals from B resamples')
+    f.add_argument('--block', type = int, default = None, help = 'block length for the moving block bootstrap')
+    f.set_defaults(func = fits)
+
+    g = sub.add_parser('lags', parents = [common], help = 'write the best-aligning lag of each instrument pair as CSV')
+    g.add_argument('--out', default = None, help = 'output CSV (default: standard output)')
+    g.add_argument('--freq', default = '1D', help = 'spacing of the grid the instruments are compared on, e.g. 1min, 1h (default: %(default)s)')
+    g.add_argument('--max-lag', default = '7D', help = 'largest lag searched in either direction, e.g. 6h (default: %(default)s)')
+    g.set_defaults(func = lags)
+
+    w = sub.add_parser('network', parents = [prof], help = 'correlate every monitor in AQS-style exports against every other')
+    w.add_argument('files', nargs = '+', help = 'AQS-style CSV files (Site, Parameter, Date (LST), Value, ...)')
+    w.add_argument('--out', default = None, help = 'output CSV of the pairwise fits (default: standard output)')
+    w.add_argument('--heatmap', default = None, help = 'also save a clustered heatmap of the correlations to this image')
+    w.add_argument('--freq', default = '1D', help = 'spacing of the grid the monitors are compared on, e.g. 1h (default: %(default)s)')
+    w.add_argument('--min-overlap', type = int, default = 3, help = 'smallest number of shared time steps for a pair to be fitted (default: %(default)s)')
+    w.add_argument('--tile', type = int, default = None, help = 'build the time grid and accumulate the fits in blocks of this many time steps, so the full grid is never in memory (default: all at once)')
+    w.add_argument('--sites', type = lambda text: [x.strip() for x in text.split(',') if x.strip()], default = None, help = 'comma-separated sites to keep (default: all)')
+    w.add_argument('--parameters', type = lambda text: [x.strip() for x in text.split(',') if x.strip()], default = None, help = 'comma-separated parameters to keep (default: all)')
+    w.add_argument('--start', default = None, help = 'first date to include, e.g. 2019-03-23')
+    w.add_argument('--end', default = None, help = 'date to stop before, e.g. 2020-04-05')
+    w.set_defaults(func = network)
+
+    defaults = {'correlogram' : 'Correlogram.png', 'fire-correlogram' : 'Fire Correlogram.png', 'fire-correlation' : 'Fire_Correlations.png'}
+    for name in PLOTS:
+        q = sub.add_parser(name, parents = [common], help = 'draw the ' + name.replace('-', ' '))
+        q.add_argument('--out', default = defaults[name], help = 'output image (default: %(default)s)')
+        q.add_argument('--no-show', action = 'store_true', help = 'save the figure without showing it (headless)')
+        q.add_argument('--xlim', type = float, default = 30, help = 'upper bound of the x axes (default: %(default)s)')
+        q.add_argument('--ylim', type = float, default = 30, help = 'upper bound of the y axes (default: %(default)s)')
+        q.add_argument('--text-loc', type = float, nargs = 2, default = [.27, .75], metavar = ('RX', 'RY'), help = 'regression text location as ratios of the axis bounds')
+        q.add_argument('--fire-text-loc', type = float, nargs = 2, default = [.74, .01], metavar = ('RX', 'RY'), help = 'fire regression text location as ratios of the axis bounds')
+        q.set_defaults(func = plot)
+
+    b = sub.add_parser('batch', parents = [common], help = 'render every plot type for each quarter, in parallel')
+    b.add_argument('--out', default = 'figures', help = 'output directory (default: %(default)s)')
+    b.add_argument('--processes', type = int, default = None, help = 'number of worker processes (default: number of CPUs)')
+    b.set_defaults(func = run_batch)
+    return(p)
+
+def main(argv = None):
+    """
+    Run the command line interface.
+    Args:
+        argv (list): arguments, defaults to sys.argv[1:]
+    """
+    import profiling
+    args = parser().parse_args(argv)
+    with profiling.cprofile(args.cprofile):
+        args.func(args)
+    if args.profile is not None:
+        profiling.report(args.profile)
+
+if __name__ == '__main__':
+    main()
@@ -5,11 +5,14 @@
 This is a library that was made to assist with common operations on pandas DataFrames and basic data analysis tasks.
 """
 
+import heapq
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
-from scipy import stats
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 import pandas as pd
+import profiling
+
+# scipy and matplotlib are imported inside the functions that use them,
+# so that data-only uses of this library (e.g. command line subcommands run from cron) start quickly.
 
 def to_datetime(df, date):
     """
@@ -21,11 +24,7 @@ def to_datetime(df, date):
         y (list): list of datetimes
         
     """
-    y = [0]*len(df[date])
-    i=0
-    for x in df[date]:
-        y[i] = x.to_pydatetime()
-        i=i+1
+    y = list(pd.DatetimeIndex(df[date]).to_pydatetime())
     return(y)
 
 def df_select(df, p, s):
@@ -66,26 +65,62 @@ def df_floor(df, v, f):
     df_new = df[df[v] > f]
     return(df_new)
 
-def time_sync(df_2, df_1):
+def _sorted_lookup(keys, values, query, tolerance = None):
+    """
+    Look up the values belonging to a set of query timestamps using a sorted key array and binary search.
+    Where a key is repeated, the first occurrence is used.
+    Args:
+        keys (numpy.array): datetime64 array of timestamps belonging to the values
+        values (numpy.array): values to look up
+        query (numpy.array): datetime64 array of timestamps to look values up for
+        tolerance (pandas.Timedelta, str, None): if given, match the nearest key within this window instead of requiring an exact match
+    Returns:
+        y (numpy.array): float array of values aligned to query, NA where no key matches
+    """
+    keys = np.asarray(keys, dtype = 'datetime64[ns]')
+    query = np.asarray(query, dtype = 'datetime64[ns]')
+    values = np.asarray(values, dtype = float)
+    order = np.argsort(keys, kind = 'stable')
+    keys = keys[order]
+    values = values[order]
+    y = np.full(len(query), np.nan)
+    if len(keys) == 0:
+        return(y)
+    pos = np.searchsorted(keys, query, side = 'left')
+    if tolerance is None:
+        hit = pos < len(keys)
+        hit[hit] = keys[pos[hit]] == query[hit]
+        y[hit] = values[pos[hit]]
+        return(y)
+    tol = pd.Timedelta(tolerance).to_timedelta64()
+    # Compare the neighbours on either side of the insertion point and keep the closer one.
+    left = np.clip(pos - 1, 0, len(keys) - 1)
+    right = np.clip(pos, 0, len(keys) - 1)
+    d_left = np.abs(query - keys[left])
+    d_right = np.abs(keys[right] - query)
+    nearest = np.where(d_right < d_left, right, left)
+    # On ties, binary search on the left side keeps the first of any repeated keys.
+    nearest = np.where(d_right == d_left, np.searchsorted(keys, keys[left], side = 'left'), nearest)
+    hit = np.minimum(d_left, d_right) <= tol
+    y[hit] = values[nearest[hit]]
+    return(y)
+
+def time_sync(df_2, df_1, value_index = 3, tolerance = None, date = "Date"):
     """
     Returns an array of values of df_2 that are synced with the timestamps of df_1.
     Where df_1 has a value for a particular timepoint, but df_2 does not, returns an NA value for that row of the output array.
     Where df_2 has a value for a particular timepoint, but df_1 does not, that value and timepoint are omitted from output array.
+    Timestamps are matched by binary search on the sorted timestamps of df_2, so the cost is O((n + m) log m).
     Args:
         df_1 (pandas.DataFrame): first DataFrame
         df_2 (pandas.DataFrame): second DataFrame
+        value_index (int): index of the df_2 column containing the values to return
+        tolerance (pandas.Timedelta, str, None): if given, use the nearest df_2 timestamp within this window (e.g. '30min')
+        date (str): name of the column containing the timestamps in both DataFrames
     Returns:
         y (numpy.array): array containing df_2 values, but only at timestamps contained in df_1
     """
-    dates = df_1["Date"]
-    y = [0]*len(dates)
-    i = 0
-    for x in dates:
-        instantaneous_df_2 = df_2[df_2["Date"] == x]
-        value_2 = instantaneous_df_2.iloc[0][3]
-        y[i] = value_2
-        i = i+1
-    y = np.array(y)
+    y = _sorted_lookup(df_2[date], df_2.iloc[:, value_index], df_1[date], tolerance)
     return(y)
 
 def time_sync_2(df_1, df_2):
@@ -104,6 +139,834 @@ def time_sync_2(df_1, df_2):
     x = to_datetime(df_1_new, "Date")
     return(df_1_new, df_2_new, x)
 
+@profiling.timed(rows = lambda result: len(result[1]))
+def time_sync_n(*dfs, date = "Date"):
+    """
+    Filters any number of DataFrames to the timestamps shared by all of them.
+    The shared timestamps are found by intersecting the sorted unique timestamps of each DataFrame,
+    and each DataFrame is then gathered once, so the output rows line up one to one.
+    Where a DataFrame repeats a timestamp, the first occurrence is kept.
+    Args:
+        *dfs (pandas.DataFrame): DataFrames to align
+        date (str): name of the column containing the timestamps in every DataFrame
+    Returns:
+        new_dfs (list): DataFrames filtered to shared timestamps, in input order, each with a matching 0..n-1 index
+        x (pandas.DatetimeIndex): timestamps shared by all of the DataFrames
+    """
+    keys = [df[date].to_numpy(dtype = 'datetime64[ns]') for df in dfs]
+    # Intersect from the smallest set upward so each step shrinks the working set as fast as possible.
+    x = None
+    for k in sorted(keys, key = len):
+        u = np.unique(k)
+        x = u if x is None else np.intersect1d(x, u, assume_unique = True)
+    if x is None:
+        return([], pd.DatetimeIndex([]))
+    new_dfs = []
+    for df, k in zip(dfs, keys):
+        order = np.argsort(k, kind = 'stable')
+        rows = order[np.searchsorted(k[order], x, side = 'left')]
+        new_df = df.take(rows)
+        new_df.reset_index(inplace = True, drop = True)
+        new_dfs += [new_df]
+    x = pd.DatetimeIndex(x)
+    return(new_dfs, x)
+
+def _grid_cells(dfs, freq, date = "Date", value = "Value"):
+    """
+    Find the grid cell of every valid value of any number of DataFrames, on a regular time grid covering all of them.
+    Args:
+        dfs (list): DataFrames with timestamp and value columns
+        freq (pandas.Timedelta, str): grid spacing
+        date (str): name of the column containing the timestamps in every DataFrame
+        value (str): name of the column containing the values in every DataFrame
+    Returns:
+        cells (list): int64 cell index of each valid value, one array per DataFrame
+        values (list): the valid values, one float array per DataFrame
+        origin (int): start of the first cell, in nanoseconds since the epoch
+        n (int): number of cells
+    """
+    step = pd.Timedelta(freq).value
+    keys = [df[date].to_numpy(dtype = 'datetime64[ns]').view('int64') for df in dfs]
+    values = [df[value].to_numpy(dtype = float) for df in dfs]
+    valid = [(k != np.iinfo('int64').min) & np.isfinite(v) for k, v in zip(keys, values)]
+    lo = min((k[ok].min() for k, ok in zip(keys, valid) if ok.any()), default = 0)
+    hi = max((k[ok].max() for k, ok in zip(keys, valid) if ok.any()), default = -step)
+    origin = lo - lo % step
+    n = int((hi - origin)//step) + 1
+    cells = [(k[ok] - origin)//step for k, ok in zip(keys, valid)]
+    values = [v[ok] for v, ok in zip(values, valid)]
+    return(cells, values, origin, n)
+
+def to_grid(dfs, freq, date = "Date", value = "Value"):
+    """
+    Place the values of any number of DataFrames on one regular time grid, averaging values that fall into the same cell.
+    Args:
+        dfs (list): DataFrames with timestamp and value columns
+        freq (pandas.Timedelta, str): grid spacing, e.g. '1min', '1h' or '1D'
+        date (str): name of the column containing the timestamps in every DataFrame
+        value (str): name of the column containing the values in every DataFrame
+    Returns:
+        grid (numpy.array): float array with one row per DataFrame and one column per cell, NA where a DataFrame has no value
+        x (pandas.DatetimeIndex): start of each cell
+    """
+    cells, values, origin, n = _grid_cells(dfs, freq, date, value)
+    grid = np.full((len(dfs), n), np.nan)
+    for i, (cell, v) in enumerate(zip(cells, values)):
+        total = np.bincount(cell, weights = v, minlength = n)
+        count = np.bincount(cell, minlength = n)
+        with np.errstate(invalid = 'ignore', divide = 'ignore'):
+            grid[i] = np.where(count > 0, total/count, np.nan)
+    x = pd.DatetimeIndex(origin + pd.Timedelta(freq).value*np.arange(0, n, dtype = 'int64'))
+    return(grid, x)
+
+def grid_tiles(dfs, freq, tile, date = "Date", value = "Value"):
+    """
+    Place the values of any number of DataFrames on one regular time grid, as to_grid does, one block of cells at a time.
+    Only one block of tile cells per DataFrame is held at once, so the full grid is never built; the blocks can be passed to correlation_matrix.
+    Args:
+        dfs (list): DataFrames with timestamp and value columns
+        freq (pandas.Timedelta, str): grid spacing, e.g. '1min', '1h' or '1D'
+        tile (int): number of cells per block
+        date (str): name of the column containing the timestamps in every DataFrame
+        value (str): name of the column containing the values in every DataFrame
+    Yields:
+        block (numpy.array): float array with one row per DataFrame and up to tile columns, the consecutive columns of to_grid
+    """
+    cells, values, origin, n = _grid_cells(dfs, freq, date, value)
+    # Sort each DataFrame's values by cell once, so that each block is a contiguous run found by binary search.
+    for i in range(0, len(dfs)):
+        order = np.argsort(cells[i], kind = 'stable')
+        cells[i], values[i] = cells[i][order], values[i][order]
+    tile = max(int(tile), 1)
+    for start in range(0, n, tile):
+        width = min(tile, n - start)
+        block = np.full((len(dfs), width), np.nan)
+        for i, (cell, v) in enumerate(zip(cells, values)):
+            a, b = np.searchsorted(cell, [start, start + width])
+            total = np.bincount(cell[a:b] - start, weights = v[a:b], minlength = width)
+            count = np.bincount(cell[a:b] - start, minlength = width)
+            with np.errstate(invalid = 'ignore', divide = 'ignore'):
+                block[i] = np.where(count > 0, total/count, np.nan)
+        yield(block)
+
+def _xcorr(a, b, max_lag, nfft):
+    """
+    Cross-correlate two real arrays at lags -max_lag..max_lag with the FFT: c[k] = sum over t of a[t]*b[t + k].
+    Args:
+        a (numpy.array): first array
+        b (numpy.array): second array, of the same length
+        max_lag (int): largest lag, in samples
+        nfft (int): FFT length, at least len(a) + max_lag so that the circular correlation does not wrap
+    Returns:
+        c (numpy.array): correlation at each lag, from -max_lag to max_lag
+    """
+    c = np.fft.irfft(np.conj(np.fft.rfft(a, nfft))*np.fft.rfft(b, nfft), nfft)
+    c = np.concatenate([c[nfft - max_lag:], c[:max_lag + 1]])
+    return(c)
+
+def lagged_correlation(x, y, max_lag, min_overlap = 3):
+    """
+    Compute the Pearson correlation of y against x at every lag from -max_lag to max_lag, ignoring missing values.
+    Rather than shifting and re-merging once per lag, the counts, sums, sums of squares and cross-products over the pairs
+    that are valid at each lag are found with six FFT cross-correlations of the masked arrays, so the cost is O(n log n) for any range of lags.
+    Args:
+        x (array-like): values on a regular grid, NA where missing
+        y (array-like): values on the same grid, NA where missing
+        max_lag (int): largest lag to test, in samples
+        min_overlap (int): smallest number of valid pairs for which a correlation is reported
+    Returns:
+        lags (numpy.array): lag of y relative to x in samples; at a positive lag k, x[t] is paired with y[t + k]
+        r (numpy.array): correlation at each lag, NA where fewer than min_overlap pairs overlap
+        n (numpy.array): number of valid pairs at each lag
+    """
+    x = np.asarray(x, dtype = float)
+    y = np.asarray(y, dtype = float)
+    max_lag = int(min(max_lag, len(x) - 1))
+    mx = np.isfinite(x).astype(float)
+    my = np.isfinite(y).astype(float)
+    # Centering first keeps the sums small, which limits cancellation when the variances are formed.
+    x0 = np.where(mx > 0, x - np.nanmean(x), 0.0) if mx.any() else np.zeros(len(x))
+    y0 = np.where(my > 0, y - np.nanmean(y), 0.0) if my.any() else np.zeros(len(y))
+    nfft = 1 << int(np.ceil(np.log2(max(len(x) + max_lag, 2))))
+    n = np.rint(_xcorr(mx, my, max_lag, nfft))
+    sx = _xcorr(x0, my, max_lag, nfft)
+    sy = _xcorr(mx, y0, max_lag, nfft)
+    sxx = _xcorr(x0*x0, my, max_lag, nfft)
+    syy = _xcorr(mx, y0*y0, max_lag, nfft)
+    sxy = _xcorr(x0, y0, max_lag, nfft)
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        r = (n*sxy - sx*sy)/np.sqrt((n*sxx - sx*sx)*(n*syy - sy*sy))
+    r = np.where(n >= min_overlap, np.clip(r, -1.0, 1.0), np.nan)
+    lags = np.arange(-max_lag, max_lag + 1)
+    return(lags, r, n.astype(int))
+
+@profiling.timed()
+def lag_pairs(dfs, labels, freq, max_lag, min_overlap = 3, date = "Date", value = "Value"):
+    """
+    Find the lag that best aligns each pair of instruments, from their lagged correlations on a shared time grid.
+    Each unordered pair is cross-correlated once; the correlation of x against y at lag k is that of y against x at lag -k,
+    so the reverse pair reads the same curve backwards.
+    Args:
+        dfs (list): DataFrames with timestamp and value columns, one per instrument
+        labels (list): name of each instrument
+        freq (pandas.Timedelta, str): grid spacing, e.g. '1min', '1h' or '1D'
+        max_lag (pandas.Timedelta, str): largest lag to search in either direction, e.g. '6h'
+        min_overlap (int): smallest number of valid pairs for which a correlation is considered
+        date (str): name of the column containing the timestamps in every DataFrame
+        value (str): name of the column containing the values in every DataFrame
+    Returns:
+        lags (pandas.DataFrame): one row per ordered pair with columns x, y, lag (how far y trails x), r at that lag, n pairs at that lag,
+            and r0 and n0 at zero lag. Shifting y by -lag (see shift) lines it up with x.
+    """
+    grid, t = to_grid(dfs, freq, date, value)
+    step = pd.Timedelta(freq)
+    k = int(pd.Timedelta(max_lag)//step)
+    curves = {}
+    for i in range(0, len(dfs)):
+        for j in range(i + 1, len(dfs)):
+            lag, r, n = lagged_correlation(grid[i], grid[j], k, min_overlap)
+            curves[(i, j)] = (lag, r, n)
+            curves[(j, i)] = (lag, r[::-1], n[::-1])
+    rows = []
+    for i in range(0, len(dfs)):
+        for j in range(0, len(dfs)):
+            if i == j:
+                continue
+            lag, r, n = curves[(i, j)]
+            zero = len(lag)//2
+            best = int(np.nanargmax(r)) if np.isfinite(r).any() else zero
+            rows += [{'x' : labels[i], 'y' : labels[j], 'lag' : lag[best]*step, 'r' : r[best], 'n' : n[best], 'r0' : r[zero], 'n0' : n[zero]}]
+    lags = pd.DataFrame(rows, columns = ['x', 'y', 'lag', 'r', 'n', 'r0', 'n0'])
+    return(lags)
+
+def shift(df, lag, date = "Date"):
+    """
+    Shift the timestamps of a DataFrame, e.g. to remove a timing offset found with lag_pairs before aligning it with time_sync_n.
+    Args:
+        df (pandas.DataFrame): DataFrame with a datetime column
+        lag (pandas.Timedelta, str): time to add to every timestamp
+        date (str): name of the column containing the timestamps
+    Returns:
+        new_df (pandas.DataFrame): copy of df with shifted timestamps
+    """
+    new_df = df.copy()
+    new_df[date] = new_df[date] + pd.Timedelta(lag)
+    return(new_df)
+
+class InstrumentSeries:
+    """
+    Compact record of one instrument at one site: sorted int64 epoch timestamps (ns), float32 values and uint8 QC flags
+    (the Flags bits of loaders) in three contiguous NumPy arrays, 13 bytes per row with no per-row Python objects.
+    Time slices are views of the arrays rather than copies, and a DataFrame is only built when to_pandas is called.
+    Args:
+        times (array-like): timestamps, as datetime64 or int64 nanoseconds since the epoch
+        values (array-like): values
+        flags (array-like): QC flags of each row, defaults to 0
+        name (str): instrument name
+        site (str): site name
+    """
+    __slots__ = ['times', 'values', 'flags', 'name', 'site']
+
+    def __init__(self, times, values, flags = None, name = None, site = None):
+        times = np.asarray(times)
+        times = times.astype('datetime64[ns]').view('int64') if times.dtype.kind == 'M' else times.astype('int64', copy = False)
+        values = np.asarray(values, dtype = 'float32')
+        flags = np.zeros(len(times), dtype = 'uint8') if flags is None else np.asarray(flags, dtype = 'uint8')
+        if len(times) > 1 and (np.diff(times) < 0).any():
+            order = np.argsort(times, kind = 'stable')
+            times, values, flags = times[order], values[order], flags[order]
+        self.times = np.ascontiguousarray(times)
+        self.values = np.ascontiguousarray(values)
+        self.flags = np.ascontiguousarray(flags)
+        self.name = name
+        self.site = site
+
+    @classmethod
+    def from_frame(cls, df, name = None, site = None, date = "Date", value = "Value", flags = "Flags"):
+        """
+        Build a series from a DataFrame, e.g. from loaders.load.
+        Args:
+            df (pandas.DataFrame): DataFrame with timestamp and value columns, and optionally a flags column
+            name (str): instrument name
+            site (str): site name
+            date (str): name of the column containing the timestamps
+            value (str): name of the column containing the values
+            flags (str): name of the column containing the QC flags, if any
+        Returns:
+            series (InstrumentSeries): the series
+        """
+        series = cls(df[date].to_numpy(dtype = 'datetime64[ns]'), df[value].to_numpy(), df[flags].to_numpy() if flags in df else None, name, site)
+        return(series)
+
+    def __len__(self):
+        return(len(self.times))
+
+    def __repr__(self):
+        span = '' if len(self) == 0 else ', ' + str(self.dates[0]) + ' to ' + str(self.dates[-1])
+        return('InstrumentSeries(' + repr(self.name) + ', ' + repr(self.site) + ', ' + str(len(self)) + ' rows' + span + ')')
+
+    @property
+    def dates(self):
+        """
+        Timestamps as a datetime64 view of the int64 array (no copy).
+        """
+        return(self.times.view('datetime64[ns]'))
+
+    @property
+    def nbytes(self):
+        """
+        Memory held by the arrays, in bytes.
+        """
+        return(self.times.nbytes + self.values.nbytes + self.flags.nbytes)
+
+    def slice(self, start = None, end = None):
+        """
+        Select a time range by binary search. The result shares its arrays with this series, so nothing is copied.
+        Args:
+            start (pandas.Timestamp, str): first timestamp to keep, or None for no lower bound
+            end (pandas.Timestamp, str): timestamp to stop before, or None for no upper bound
+        Returns:
+            series (InstrumentSeries): series viewing the rows in [start, end)
+        """
+        i = 0 if start is None else np.searchsorted(self.times, pd.Timestamp(start).value, side = 'left')
+        j = len(self.times) if end is None else np.searchsorted(self.times, pd.Timestamp(end).value, side = 'left')
+        series = InstrumentSeries.__new__(InstrumentSeries)
+        series.times, series.values, series.flags = self.times[i:j], self.values[i:j], self.flags[i:j]
+        series.name, series.site = self.name, self.site
+        return(series)
+
+    def mask(self, bits):
+        """
+        Keep the rows that have none of the given flags set.
+        Args:
+            bits (int): Flags bits whose rows are dropped, e.g. loaders.MISSING | loaders.SENTINEL
+        Returns:
+            series (InstrumentSeries): copy of the rows that pass
+        """
+        keep = (self.flags & bits) == 0
+        series = InstrumentSeries.__new__(InstrumentSeries)
+        series.times, series.values, series.flags = self.times[keep], self.values[keep], self.flags[keep]
+        series.name, series.site = self.name, self.site
+        return(series)
+
+    def to_pandas(self, date = "Date", value = "Value", flags = "Flags"):
+        """
+        Convert the series to a DataFrame.
+        Args:
+            date (str): name of the timestamp column
+            value (str): name of the value column
+            flags (str): name of the flags column
+        Returns:
+            df (pandas.DataFrame): DataFrame with timestamp, value and flags columns
+        """
+        df = pd.DataFrame({date : self.dates, value : self.values, flags : self.flags})
+        return(df)
+
+def align_series(*series):
+    """
+    Align any number of InstrumentSeries on the timestamps they all share, like time_sync_n does for DataFrames.
+    Since the timestamps of each series are already sorted, nothing is sorted here: the distinct timestamps of the shortest series
+    are looked up in each of the others by binary search, which keeps them in order.
+    Where a series repeats a timestamp, the first occurrence is kept.
+    Args:
+        *series (InstrumentSeries): series to align
+    Returns:
+        values (list): float32 values of each series at the shared timestamps, in input order
+        x (pandas.DatetimeIndex): timestamps shared by all of the series
+    """
+    if not series:
+        return([], pd.DatetimeIndex([]))
+    shortest = min(series, key = len)
+    t = shortest.times
+    x = t[np.concatenate([[True], t[1:] != t[:-1]])] if len(t) else t
+    for s in series:
+        if s is shortest or len(x) == 0:
+            continue
+        i = np.searchsorted(s.times, x, side = 'left')
+        x = x[(i < len(s.times)) & (s.times[np.minimum(i, len(s.times) - 1)] == x)] if len(s.times) else x[:0]
+    values = [s.values[np.searchsorted(s.times, x, side = 'left')] for s in series]
+    x = pd.DatetimeIndex(x.view('datetime64[ns]'))
+    return(values, x)
+
+def add_calendar(df, date = "Date"):
+    """
+    Add weekday (Monday = 0) and month columns to a DataFrame, derived from its timestamps.
+    Args:
+        df (pandas.DataFrame): DataFrame with a datetime column
+        date (str): name of the column containing the timestamps
+    Returns:
+        df (pandas.DataFrame): the same DataFrame with weekday and month columns
+    """
+    df["weekday"] = df[date].dt.weekday
+    df["month"] = df[date].dt.month
+    return(df)
+
+@profiling.timed()
+def splice(segments, date = "Date", value = "Value", precedence = 'last'):
+    """
+    Combine segments of one instrument's record, e.g. before and after a configuration change, into a single series.
+    Where segments share a timestamp, the value from the segment with precedence is kept.
+    Args:
+        segments (list): DataFrames with timestamp and value columns, in chronological order of the configurations
+        date (str): name of the column containing the timestamps in every segment
+        value (str): name of the column containing the values in every segment
+        precedence (str): 'last' to prefer later segments where they overlap, 'first' to prefer earlier ones
+    Returns:
+        new_df (pandas.DataFrame): DataFrame sorted by timestamp with columns for datetime, value, weekday and month
+    """
+    if precedence not in ('first', 'last'):
+        raise ValueError("precedence must be 'first' or 'last'")
+    new_df = pd.concat([s[[date, value]] for s in segments], ignore_index = True)
+    segment = np.repeat(np.arange(len(segments)), [len(s) for s in segments])
+    rank = segment if precedence == 'first' else -segment
+    # Sort by timestamp, then by rank, so the preferred row comes first within each timestamp.
+    order = np.lexsort((rank, new_df[date].to_numpy()))
+    new_df = new_df.take(order)
+    new_df = new_df[~new_df[date].duplicated(keep = 'first').to_numpy()]
+    new_df.reset_index(inplace = True, drop = True)
+    new_df = add_calendar(new_df, date)
+    return(new_df)
+
+class Resampler:
+    """
+    Running averages of high-rate data (e.g. 1-minute T640 readings) over fixed windows, updated one chunk at a time.
+    Only the sum and count of each window and one flag per sampling interval of each window are kept,
+    so memory grows with the number of windows, not the number of samples.
+    Windows start at multiples of freq from midnight, so daily windows follow the LST day when the timestamps are in LST.
+    Each sampling interval of a window is counted at most once: a repeated timestamp (or a second sample within the same interval),
+    whether in the same chunk or in a later one, is dropped and the first occurrence kept, as load does for whole files.
+    A window is reported only if it holds at least min_fraction of the samples it would hold at the given resolution,
+    e.g. 1080 of the 1440 minutes of a day for the default 75% threshold.
+    Args:
+        freq (pandas.Timedelta, str): window length, e.g. '1h', '1D' or '8h'
+        resolution (pandas.Timedelta, str): sampling interval of the raw data
+        min_fraction (float): fraction of the expected samples a window must contain to be reported
+        offset (pandas.Timedelta, str): time added to the timestamps before they are binned, e.g. '-8h' to average UTC data over PST days
+        by (list): optional columns (e.g. ["Site"]) to average separately
+        date (str): name of the column containing the timestamps
+        value (str): name of the column containing the values
+    """
+
+    def __init__(self, freq = '1D', resolution = '1min', min_fraction = .75, offset = None, by = None, date = "Date", value = "Value"):
+        self.freq = pd.Timedelta(freq).value
+        self.resolution = pd.Timedelta(resolution).value
+        if self.freq <= 0 or self.resolution <= 0 or self.freq % self.resolution:
+            raise ValueError('freq must be a positive multiple of resolution')
+        self.min_count = int(np.ceil(min_fraction*self.freq/self.resolution))
+        self.offset = 0 if offset is None else pd.Timedelta(offset).value
+        self.by = list(by or [])
+        self.date = date
+        self.value = value
+        # Row of each (by values..., window start) in the arrays below, the running sums and counts,
+        # and which sampling intervals of each window have been seen.
+        self.groups = {}
+        self.sums = np.zeros(0)
+        self.counts = np.zeros(0, dtype = 'int64')
+        self.seen = np.zeros((0, self.freq//self.resolution), dtype = bool)
+        # Number of repeated samples dropped so far.
+        self.duplicates = 0
+
+    def _grow(self, n):
+        """
+        Make room for at least n windows, doubling the arrays so that adding windows one chunk at a time stays cheap.
+        Args:
+            n (int): number of windows needed
+        """
+        if n <= len(self.sums):
+            return
+        size = max(n, 2*len(self.sums))
+        extra = size - len(self.sums)
+        self.sums = np.concatenate([self.sums, np.zeros(extra)])
+        self.counts = np.concatenate([self.counts, np.zeros(extra, dtype = 'int64')])
+        self.seen = np.concatenate([self.seen, np.zeros((extra, self.seen.shape[1]), dtype = bool)])
+
+    def add(self, df):
+        """
+        Add a chunk of raw data. Chunks may arrive in any order and windows may span several chunks.
+        Rows with an empty timestamp, value or by column are left out, as are samples already counted.
+        Args:
+            df (pandas.DataFrame): chunk with timestamp and value columns, and the by columns
+        """
+        t = df[self.date].to_numpy(dtype = 'datetime64[ns]')
+        v = df[self.value].to_numpy(dtype = float)
+        keep = ~np.isnat(t) & np.isfinite(v)
+        for c in self.by:
+            keep &= df[c].notna().to_numpy()
+        if not keep.any():
+            return
+        # Bin with integer arithmetic; numpy's modulo rounds toward minus infinity, so timestamps before 1970 bin correctly too.
+        ns = t[keep].view('int64') + self.offset
+        window = ns - ns % self.freq
+        slot = (ns - window)//self.resolution
+        codes, uniques = pd.factorize(pd.MultiIndex.from_arrays([df[c].to_numpy()[keep] for c in self.by] + [window]))
+        rows = np.array([self.groups.setdefault(key, len(self.groups)) for key in uniques], dtype = 'int64')[codes]
+        self._grow(len(self.groups))
+        # Keep the first occurrence of each sampling interval, within the chunk and against earlier chunks.
+        first = np.zeros(len(rows), dtype = bool)
+        first[np.unique(rows*self.seen.shape[1] + slot, return_index = True)[1]] = True
+        new = first & ~self.seen[rows, slot]
+        self.duplicates += int(len(rows) - new.sum())
+        rows, slot = rows[new], slot[new]
+        self.seen[rows, slot] = True
+        self.sums += np.bincount(rows, weights = v[keep][new], minlength = len(self.sums))
+        self.counts += np.bincount(rows, minlength = len(self.counts))
+
+    def result(self, keep_incomplete = False):
+        """
+        Report the averages of the windows seen so far.
+        Args:
+            keep_incomplete (bool): if True, report windows below the completeness threshold too, with an empty value
+        Returns:
+            new_df (pandas.DataFrame): one row per window, sorted by the by columns and window start, with the by columns,
+                the window start (in the original time base), the average value and the number of samples it averages ("Minutes in Average")
+        """
+        columns = self.by + [self.date, self.value, "Minutes in Average"]
+        if not self.groups:
+            return(pd.DataFrame(columns = columns))
+        n = len(self.groups)
+        totals = pd.DataFrame(list(self.groups), columns = self.by + ['window'])
+        totals['sum'] = self.sums[:n]
+        totals['count'] = self.counts[:n]
+        totals = totals.sort_values(self.by + ['window'], ignore_index = True)
+        complete = totals['count'].to_numpy() >= self.min_count
+        if not keep_incomplete:
+            totals = totals[complete].reset_index(drop = True)
+            complete = complete[complete]
+        new_df = totals[self.by].copy()
+        new_df[self.date] = pd.to_datetime(totals['window'].to_numpy() - self.offset, unit = 'ns')
+        new_df[self.value] = np.where(complete, totals['sum'].to_numpy()/totals['count'].to_numpy(), np.nan)
+        new_df["Minutes in Average"] = totals['count'].to_numpy()*(self.resolution/pd.Timedelta('1min').value)
+        return(new_df[columns])
+
+@profiling.timed()
+def resample(df, freq = '1D', resolution = '1min', min_fraction = .75, offset = None, by = None, date = "Date", value = "Value"):
+    """
+    Average high-rate data over fixed windows, keeping only windows that meet a completeness threshold.
+    See Resampler for the arguments; use a Resampler directly to average data that is read in chunks.
+    Args:
+        df (pandas.DataFrame): raw data with timestamp and value columns
+    Returns:
+        new_df (pandas.DataFrame): averaged data, from Resampler.result
+    """
+    r = Resampler(freq, resolution, min_fraction, offset, by, date, value)
+    r.add(df)
+    new_df = r.result()
+    return(new_df)
+
+# Mean radius of the Earth (km).
+EARTH_RADIUS = 6371.0
+
+# Coordinates (latitude, longitude) of the monitoring sites named in the "Site" column of the datafiles.
+SITES = {
+        'Concord - 2956-A Treat Blvd' : (37.9360, -122.0262)
+        }
+
+def _to_xyz(lat, lon):
+    """
+    Convert latitudes and longitudes to Cartesian coordinates (km) on a spherical Earth,
+    so that straight-line (chord) distances can be searched with a KD-tree.
+    Args:
+        lat (numpy.array): latitudes in degrees
+        lon (numpy.array): longitudes in degrees
+    Returns:
+        xyz (numpy.array): (n, 3) array of Cartesian coordinates
+    """
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    xyz = EARTH_RADIUS*np.column_stack([np.cos(lat)*np.cos(lon), np.cos(lat)*np.sin(lon), np.sin(lat)])
+    return(xyz)
+
+@profiling.timed(rows = lambda index: len(index['start']))
+def fire_index(df, start = "Date", end = "End Date", name = "Name", acreage = "Acreage", duration = '1D', latitude = None, longitude = None):
+    """
+    Build an index of fire events that can be queried for the fires active at any set of timestamps.
+    Events are stored as interval arrays sorted by start and by end, so queries are answered by binary search (a sweep line)
+    rather than by expanding every fire into its individual days.
+    Events with an empty start or end, or that end before they start, are never active and are left out of the index,
+    as the original day-by-day expansion added no days for them.
+    Args:
+        df (pandas.DataFrame): fire events, e.g. the CalFire table
+        start (str): name of the column containing the start of each fire
+        end (str): name of the column containing the end of each fire
+        name (str): name of the column containing the name of each fire
+        acreage (str): name of the column containing the acreage of each fire
+        duration (pandas.Timedelta, str): length of the period named by an end timestamp. A fire is active from its start
+            up to, but not including, its end plus this duration. The default treats end dates as whole days.
+        latitude (str): name of the column containing the latitude of each fire, needed for smoke_exposure
+        longitude (str): name of the column containing the longitude of each fire, needed for smoke_exposure
+    Returns:
+        index (dict): sorted interval arrays describing the fires
+    """
+    s = df[start].to_numpy(dtype = 'datetime64[ns]')
+    e = (df[end] + pd.Timedelta(duration)).to_numpy(dtype = 'datetime64[ns]')
+    keep = ~np.isnat(s) & ~np.isnat(e) & (e > s)
+    df = df[keep]
+    s = s[keep].astype('int64')
+    e = e[keep].astype('int64')
+    a = df[acreage].to_numpy(dtype = float)
+    by_start = np.argsort(s, kind = 'stable')
+    by_end = np.argsort(e, kind = 'stable')
+    index = {
+            'start' : s[by_start],
+            'end' : e[by_start],
+            'name' : df[name].to_numpy(dtype = object)[by_start],
+            'end_sorted' : e[by_end],
+            'acreage_by_start' : np.concatenate([[0.0], np.cumsum(a[by_start])]),
+            'acreage_by_end' : np.concatenate([[0.0], np.cumsum(a[by_end])]),
+            'max_duration' : (e - s).max() if len(s) else 0,
+            'acreage' : a[by_start],
+            'end_order' : np.argsort(e[by_start], kind = 'stable')
+            }
+    if latitude is not None and longitude is not None:
+        index['xyz'] = _to_xyz(df[latitude].to_numpy(dtype = float)[by_start], df[longitude].to_numpy(dtype = float)[by_start])
+    return(index)
+
+@profiling.timed()
+def active_fires(index, dates, names = True):
+    """
+    Find the fires active at each of a set of timestamps.
+    The number of active fires and their total acreage are the number (and acreage) of fires started minus the number (and acreage) ended,
+    both found by binary search. Fire names are only gathered when requested.
+    Args:
+        index (dict): fire index built by fire_index
+        dates (array-like): timestamps to classify
+        names (bool): if True, also list the names of the active fires
+    Returns:
+        new_df (pandas.DataFrame): DataFrame with one row per timestamp and columns for the count and total acreage (and names) of active fires
+    """
+    t = np.asarray(dates, dtype = 'datetime64[ns]').astype('int64')
+    started = np.searchsorted(index['start'], t, side = 'right')
+    ended = np.searchsorted(index['end_sorted'], t, side = 'right')
+    new_df = pd.DataFrame({
+            'count' : started - ended,
+            'acreage' : index['acreage_by_start'][started] - index['acreage_by_end'][ended]
+            })
+    if names:
+        # Only fires starting within max_duration before a timestamp can still be active, so only those are checked.
+        first = np.searchsorted(index['start'], t - index['max_duration'], side = 'right')
+        lengths = started - first
+        rows = np.repeat(np.arange(len(t)), lengths)
+        offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+        candidates = first[rows] + np.arange(len(rows)) - offsets[rows]
+        active = index['end'][candidates] > t[rows]
+        # Split on the number of names found for each timestamp, so the lists stay in step with their timestamps.
+        fire_names = np.split(index['name'][candidates[active]], np.cumsum(np.bincount(rows[active], minlength = len(t)))[:-1])
+        new_df['names'] = ['; '.join(x) for x in fire_names]
+    return(new_df)
+
+@profiling.timed()
+def smoke_exposure(index, dates, sites = SITES, scale = 50.0, radius = None):
+    """
+    Compute a smoke influence score for each monitoring site at each of a set of timestamps.
+    Each fire contributes its acreage decayed exponentially with its great-circle distance from the site, for as long as it is active.
+    Fires near each site are found with a KD-tree, and the weighted contributions of the active fires are summed with the same
+    binary-search sweep line used by active_fires, so no fire by timestamp pairs are ever formed.
+    Args:
+        index (dict): fire index built by fire_index with latitude and longitude columns
+        dates (array-like): timestamps to score
+        sites (dict): (latitude, longitude) of each site, keyed by site name
+        scale (float): distance (km) over which a fire's influence decays by a factor of e
+        radius (float): distance (km) beyond which fires are ignored, defaults to 10 decay scales
+    Returns:
+        new_df (pandas.DataFrame): DataFrame with one row per timestamp and one column of scores per site
+    """
+    if 'xyz' not in index:
+        raise ValueError('The fire index was built without fire coordinates')
+    if radius is None:
+        radius = 10*scale
+    names = list(sites)
+    site_xyz = _to_xyz(np.array([sites[x][0] for x in names], dtype = float), np.array([sites[x][1] for x in names], dtype = float))
+    from scipy import spatial
+    tree = spatial.cKDTree(index['xyz'])
+    # Search radius converted from a great-circle distance to a chord length.
+    chord = 2*EARTH_RADIUS*np.sin(min(radius/(2*EARTH_RADIUS), np.pi/2))
+    nearby = tree.query_ball_point(site_xyz, chord)
+    # Weight of every fire at every site; fires outside the radius keep a weight of zero.
+    w = np.zeros((len(names), len(index['start'])))
+    for k, fires in enumerate(nearby):
+        fires = np.asarray(fires, dtype = int)
+        d = np.linalg.norm(index['xyz'][fires] - site_xyz[k], axis = 1)
+        d = 2*EARTH_RADIUS*np.arcsin(np.clip(d/(2*EARTH_RADIUS), 0, 1))
+        w[k, fires] = index['acreage'][fires]*np.exp(-d/scale)
+    t = np.asarray(dates, dtype = 'datetime64[ns]').astype('int64')
+    started = np.searchsorted(index['start'], t, side = 'right')
+    ended = np.searchsorted(index['end'][index['end_order']], t, side = 'right')
+    by_start = np.concatenate([np.zeros((len(names), 1)), np.cumsum(w, axis = 1)], axis = 1)
+    by_end = np.concatenate([np.zeros((len(names), 1)), np.cumsum(w[:, index['end_order']], axis = 1)], axis = 1)
+    # Differences of running sums can come out slightly negative from rounding, so clip them at zero.
+    score = np.clip(by_start[:, started] - by_end[:, ended], 0, None)
+    new_df = pd.DataFrame(score.T, columns = names)
+    return(new_df)
+
+def bin_edges(start, stop, width):
+    """
+    Compute evenly spaced histogram bin edges.
+    Args:
+        start (float): lower edge of the first bin
+        stop (float): upper edge of the last bin
+        width (float): width of each bin
+    Returns:
+        edges (numpy.array): bin edges, from start to stop inclusive
+    """
+    edges = float(start) + float(width)*np.arange(int(round((stop - start)/width)) + 1)
+    return(edges)
+
+def bin_index(values, edges):
+    """
+    Find the bin that each value falls into. Bins include their lower edge and exclude their upper edge.
+    Index 0 is the underflow bin (values below edges[0]) and index len(edges) is the overflow bin (values at or above edges[-1]),
+    so bin k (1 to len(edges) - 1) covers edges[k - 1] to edges[k].
+    Args:
+        values (array-like): values to bin
+        edges (numpy.array): bin edges, e.g. from bin_edges
+    Returns:
+        idx (numpy.array): bin index of each value
+    """
+    idx = np.searchsorted(edges, np.asarray(values, dtype = float), side = 'right')
+    return(idx)
+
+def _level_codes(values, levels = None):
+    """
+    Number each value by its position among a list of levels, e.g. the strata of a regression or the categories of a histogram.
+    Args:
+        values (array-like): value of each row
+        levels (list): levels to number, in order. Defaults to the sorted distinct values.
+    Returns:
+        codes (numpy.array): position of each value in levels, or -1 for values (and empty cells) that are not one of the levels
+        levels (list): the levels
+    """
+    values = np.asarray(values)
+    if levels is None:
+        levels = list(pd.Categorical(values).categories)
+    codes = pd.Index(list(levels)).get_indexer(values).astype(int)
+    return(codes, list(levels))
+
+def histogram(values, edges, categories = None, levels = None, closed = False):
+    """
+    Count the values falling into each bin, with underflow and overflow bins for values outside the edges.
+    Args:
+        values (array-like): values to bin
+        edges (numpy.array): bin edges, e.g. from bin_edges
+        categories (array-like): optional category of each value (e.g. fire/no fire), to count each category separately for stacked histograms
+        levels (list): categories to count, in row order. Defaults to the sorted distinct categories.
+        closed (bool): whether the last bin includes its upper edge, as in numpy.histogram and matplotlib's hist
+    Returns:
+        counts (numpy.array): counts laid out as in bin_index, with one row per category if categories are given
+    """
+    idx = bin_index(values, edges)
+    if closed:
+        idx[np.asarray(values, dtype = float) == edges[-1]] = len(edges) - 1
+    n = len(edges) + 1
+    if categories is None:
+        counts = np.bincount(idx, minlength = n)
+        return(counts)
+    codes, levels = _level_codes(categories, levels)
+    # Values whose category is not one of the levels are left out.
+    keep = codes >= 0
+    m = len(levels)
+    counts = np.bincount(codes[keep]*n + idx[keep], minlength = n*m).reshape(m, n)
+    return(counts)
+
+def bin_colors(edges, cmap):
+    """
+    Look up one color per bin from a colormap, laid out as in bin_index.
+    The underflow and overflow bins share the colors of the first and last bins,
+    so the colors of any number of values can be found by indexing this table with bin_index.
+    Args:
+        edges (numpy.array): bin edges, e.g. from bin_edges
+        cmap (matplotlib.colors.Colormap): colormap to sample
+    Returns:
+        colors (numpy.array): (len(edges) + 1, 4) array of RGBA colors
+    """
+    n = len(edges) - 1
+    colors = cmap(np.clip(np.arange(-1, n + 1), 0, n - 1)/max(n - 1, 1))
+    return(colors)
+
+def plt_hist(counts, edges, ax, colors, clip = False):
+    """
+    Plot histogram counts (from histogram) as a bar graph on a preexisting plot.
+    Underflow and overflow counts are left out, like values outside the range of matplotlib's hist, unless clip is set.
+    Args:
+        counts (numpy.array): counts from histogram, with one row per category for a stacked histogram
+        edges (numpy.array): bin edges used to compute the counts
+        ax (matplotlib.pyplot.axes): preexisting plot object
+        colors (list): one color per category (or a single color for unstacked counts); each may also be a list with one color per bin
+        clip (bool or str): 'low' adds the underflow count to the first bar, True also adds the overflow count to the last bar
+    Returns:
+        Draws the histogram
+    """
+    counts = np.atleast_2d(counts)
+    if counts.shape[0] == 1 and not isinstance(colors, list):
+        colors = [colors]
+    folded = counts[:, 1:-1].copy()
+    if clip:
+        folded[:, 0] += counts[:, 0]
+    if clip is True:
+        folded[:, -1] += counts[:, -1]
+    bottom = np.zeros(folded.shape[1])
+    for k in range(0, folded.shape[0]):
+        ax.bar(edges[:-1], folded[k], width = np.diff(edges), align = 'edge', bottom = bottom, color = colors[k])
+        bottom += folded[k]
+
+def plt_scatter(x, y, ax, colors, edges, max_points = 100000, gridsize = 60):
+    """
+    Plot a scatter plot on a preexisting plot, coloring each point by the bin its x value falls into.
+    Points are drawn as a single collection with colors looked up from a precomputed table.
+    Above max_points, the plot falls back to a hexagonal density plot colored by the number of points in each cell.
+    Args:
+        x (array-like): x values
+        y (array-like): y values
+        ax (matplotlib.pyplot.axes): preexisting plot object
+        colors (numpy.array): color table from bin_colors
+        edges (numpy.array): bin edges used to build the color table
+        max_points (int): largest number of points to draw individually
+        gridsize (int): number of hexagons across the x axis in density mode
+    Returns:
+        Draws the points (or their density)
+    """
+    x = np.asarray(x, dtype = float)
+    y = np.asarray(y, dtype = float)
+    if len(x) > max_points:
+        from matplotlib.colors import ListedColormap
+        ax.hexbin(x, y, gridsize = gridsize, bins = 'log', mincnt = 1, cmap = ListedColormap(colors[1:-1]))
+    else:
+        ax.scatter(x, y, c = colors[bin_index(x, edges)], s = 36)
+
+# Factors converting each concentration unit found in the AQS-style "Unit" column to ug/m3.
+# Gas-phase units are listed as None since their factor depends on the molecular weight of the pollutant.
+UNITS = {
+        'ug/m3' : 1.0,
+        'ug/m3_LC' : 1.0,
+        'mg/m3' : 1000.0,
+        'ng/m3' : 0.001,
+        'ppb' : None,
+        'ppm' : None
+        }
+
+# Molar volume of an ideal gas (L/mol) at 25 C and 1 atm, used to convert mixing ratios to mass concentrations.
+MOLAR_VOLUME = 24.45
+
+def unit_factor(unit, target = 'ug/m3', mw = None):
+    """
+    Look up the factor that converts one unit from the UNITS registry to another.
+    Args:
+        unit (str): unit to convert from
+        target (str): unit to convert to
+        mw (float): molecular weight (g/mol) of the pollutant, required when either unit is ppb or ppm
+    Returns:
+        f (float): unit conversion factor
+    """
+    def to_ug(u):
+        if u not in UNITS:
+            raise KeyError('Unknown unit: ' + str(u))
+        if UNITS[u] is not None:
+            return(UNITS[u])
+        if mw is None:
+            raise ValueError('A molecular weight is required to convert ' + u)
+        return(mw/MOLAR_VOLUME*(1000.0 if u == 'ppm' else 1.0))
+    f = to_ug(unit)/to_ug(target)
+    return(f)
+
 def conv_units(df, p, f):
     """
     Convert the units of a DataFrame column.
@@ -114,12 +977,7 @@ def conv_units(df, p, f):
     Returns:
         y (np.array): array containing converted column values
     """
-    y = [0]*len(df[p])
-    i = 0
-    for x in df[p]:
-        y[i] = x*f
-        i = i+1
-    y = np.array(y)
+    y = df[p].to_numpy()*f
     return(y)
 
 def conv_units_2(df, f, date_index, value_index, Value = None):
@@ -131,20 +989,710 @@ def conv_units_2(df, f, date_index, value_index, Value = None):
         f (float): the conversion factor
         date_index (int): index of the datetime column
         value_index (int): index of the column containing the values to convert
+        Value: ignored, kept so that existing calls still work; the converted column keeps the name of the input column
     Returns:
         new_df (pandas.DataFrame): new DataFrame containing columns for datetime and the converted value 
     """
     Value = list(df)[value_index]
-    x = [0]*len(df['Date'])
-    y = [0]*len(df['Date'])
-    for i in range(0, len(df['Date'])):
-        x[i] = df.iloc[i][date_index]
-        y[i] = df.iloc[i][value_index]*f
-    new_df = pd.DataFrame( data = np.array(y).T, columns = [Value] )
-    new_df.loc[:,"Date"] = pd.Series(x)
+    new_df = pd.DataFrame( data = df.iloc[:, value_index].to_numpy()*f, columns = [Value] )
+    new_df.loc[:,"Date"] = df.iloc[:, date_index].to_numpy()
+    return(new_df)
+
+def conv_units_3(df, f, columns, inplace = False):
+    """
+    Convert the units of several DataFrame columns in one call.
+    Args:
+        df (pandas.DataFrame): the input DataFrame
+        f (float, dict): the conversion factor, or a dict of conversion factors keyed by column name
+        columns (list): names of the columns to convert
+        inplace (bool): if True, overwrite the columns of df instead of returning a copy
+    Returns:
+        new_df (pandas.DataFrame): DataFrame with the columns in the converted units (df itself if inplace)
+    """
+    new_df = df if inplace else df.copy()
+    for p in columns:
+        new_df[p] = new_df[p].to_numpy()*(f[p] if isinstance(f, dict) else f)
+    return(new_df)
+
+def normalize_units(df, target = 'ug/m3', value = 'Value', unit = 'Unit', mw = None, inplace = False):
+    """
+    Convert a DataFrame with a mix of units in its unit column (as in the AQS-style files) to a single unit.
+    Each distinct unit is looked up once in the UNITS registry and the factors are broadcast over the rows.
+    Args:
+        df (pandas.DataFrame): the input DataFrame
+        target (str): unit to convert all rows to
+        value (str): name of the column containing the values
+        unit (str): name of the column containing the units
+        mw (float): molecular weight (g/mol) of the pollutant, required for ppb and ppm rows
+        inplace (bool): if True, overwrite the columns of df instead of returning a copy
+    Returns:
+        new_df (pandas.DataFrame): DataFrame with values and units converted to target (df itself if inplace)
+    """
+    new_df = df if inplace else df.copy()
+    # Rows with no unit get code -1, which picks up the trailing NA factor.
+    codes, uniques = pd.factorize(new_df[unit])
+    factors = np.array([unit_factor(u, target, mw) for u in uniques] + [np.nan])
+    new_df[value] = new_df[value].to_numpy()*factors[codes]
+    new_df[unit] = target
     return(new_df)
 
-def plt_lin_reg(x, y, ax, mf, norm_text_locx, norm_text_locy):
+def theil_sen(x, y, max_pairs = 2000000, seed = 0):
+    """
+    Fit a Theil-Sen regression: the median of the slopes between pairs of points, with the intercept as the median residual.
+    When there are more pairs of points than max_pairs, the median is taken over max_pairs randomly drawn pairs instead of all of them,
+    which keeps the cost at O(n + max_pairs) rather than O(n^2) for long records.
+    Args:
+        x (array-like): x values for the regression
+        y (array-like): y values for the regression
+        max_pairs (int): largest number of pairs of points to compute slopes for
+        seed (int): seed for drawing pairs of points
+    Returns:
+        m (float): slope
+        b (float): intercept
+    """
+    x = np.asarray(x, dtype = float)
+    y = np.asarray(y, dtype = float)
+    n = len(x)
+    if n*(n - 1)//2 <= max_pairs:
+        i, j = np.triu_indices(n, 1)
+    else:
+        rng = np.random.default_rng(seed)
+        i = rng.integers(0, n, max_pairs)
+        j = rng.integers(0, n, max_pairs)
+    dx = x[j] - x[i]
+    keep = dx != 0
+    if not keep.any():
+        return(np.nan, np.nan)
+    m = np.median((y[j] - y[i])[keep]/dx[keep])
+    b = np.median(y - m*x)
+    return(m, b)
+
+# Regression modes accepted by regress_pairs, regress and the plt_lin_reg functions.
+# 'ols' - ordinary least squares of y on x
+# 'deming' - Deming regression, allowing for error in both x and y with a given ratio of error variances
+# 'orthogonal' - orthogonal regression, i.e. Deming regression with equal error variances
+# 'theil-sen' - median of pairwise slopes, robust to outliers
+MODES = ['ols', 'deming', 'orthogonal', 'theil-sen']
+
+@profiling.timed()
+def regress_pairs(df, columns = None, strata = None, levels = None, include_all = False, mode = 'ols', delta = 1.0):
+    """
+    Fit regressions of every column of a DataFrame against every other column, within each stratum.
+    The sums and cross-products of all columns are computed for all strata at once, and every OLS, Deming and orthogonal fit
+    is derived from them, so the cost does not grow with the number of pairs beyond one small matrix per stratum.
+    Theil-Sen fits cannot share these sums and are computed pair by pair.
+    Standard errors and p-values are only reported for OLS fits. The correlation coefficient is always the Pearson r.
+    Rows with an empty cell in any of the columns are left out.
+    Args:
+        df (pandas.DataFrame): aligned values, one column per instrument (e.g. from time_sync_n)
+        columns (list): names of the columns to regress, defaults to all columns
+        strata (array-like): optional stratum of each row (e.g. fire/no fire)
+        levels (list): strata to fit, in output order. Defaults to the sorted distinct strata.
+        include_all (bool): if True, also fit all rows together as the stratum 'all'
+        mode (str): regression mode, one of MODES
+        delta (float): ratio of the error variance of y to that of x, used by Deming regression
+    Returns:
+        fits (pandas.DataFrame): one row per (x, y, stratum) with columns x, y, stratum, n, slope, intercept, rvalue, r2,
+            pvalue, stderr, intercept_stderr, x_min and x_max
+    """
+    if mode not in MODES:
+        raise ValueError('mode must be one of ' + str(MODES))
+    if columns is None:
+        columns = list(df)
+    X = np.column_stack([df[c].to_numpy(dtype = float) for c in columns])
+    if strata is None:
+        strata = np.zeros(len(X), dtype = int)
+        levels = ['all']
+        codes = strata
+        include_all = False
+    else:
+        codes, levels = _level_codes(strata, levels)
+    keep = np.isfinite(X).all(axis = 1) & (codes >= 0)
+    X = X[keep]
+    codes = codes[keep]
+    if include_all:
+        # The combined fit is one more stratum containing every row.
+        X = np.concatenate([X, X])
+        codes = np.concatenate([codes, np.full(len(codes), len(levels))])
+        levels = levels + ['all']
+    k = len(levels)
+    G = np.zeros((len(X), k))
+    G[np.arange(len(X)), codes] = 1.0
+    n = G.sum(axis = 0)
+    means = (G.T @ X)/np.maximum(n, 1)[:, None]
+    # Center within each stratum before forming cross-products, to avoid cancellation.
+    Xc = X - means[codes]
+    C = np.einsum('ns,ni,nj->sij', G, Xc, Xc, optimize = True)
+    x_min = np.full((k, X.shape[1]), np.nan)
+    x_max = np.full((k, X.shape[1]), np.nan)
+    for s in range(0, k):
+        if n[s] > 0:
+            x_min[s] = X[codes == s].min(axis = 0)
+            x_max[s] = X[codes == s].max(axis = 0)
+    # Index every (stratum, x, y) combination with x != y.
+    s_, i_, j_ = np.meshgrid(np.arange(k), np.arange(X.shape[1]), np.arange(X.shape[1]), indexing = 'ij')
+    off = i_ != j_
+    s_, i_, j_ = s_[off], i_[off], j_[off]
+    sxx = C[s_, i_, i_]
+    syy = C[s_, j_, j_]
+    sxy = C[s_, i_, j_]
+    m = n[s_]
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        slope = sxy/sxx
+        intercept = means[s_, j_] - slope*means[s_, i_]
+        r = np.clip(sxy/np.sqrt(sxx*syy), -1.0, 1.0)
+        df_ = m - 2
+        stderr = np.sqrt((1 - r**2)*syy/sxx/df_)
+        intercept_stderr = stderr*np.sqrt(sxx/m + means[s_, i_]**2)
+        t = r*np.sqrt(df_/((1.0 - r)*(1.0 + r)))
+    from scipy import stats
+    pvalue = 2*stats.t.sf(np.abs(t), np.maximum(df_, 1))
+    if mode in ('deming', 'orthogonal'):
+        d = 1.0 if mode == 'orthogonal' else delta
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            slope = (syy - d*sxx + np.sqrt((syy - d*sxx)**2 + 4*d*sxy**2))/(2*sxy)
+        intercept = means[s_, j_] - slope*means[s_, i_]
+    elif mode == 'theil-sen':
+        for p in range(0, len(s_)):
+            rows = codes == s_[p]
+            slope[p], intercept[p] = theil_sen(X[rows, i_[p]], X[rows, j_[p]])
+    if mode != 'ols':
+        pvalue = np.full(len(s_), np.nan)
+        stderr = np.full(len(s_), np.nan)
+        intercept_stderr = np.full(len(s_), np.nan)
+    fits = pd.DataFrame({
+            'x' : np.asarray(columns, dtype = object)[i_],
+            'y' : np.asarray(columns, dtype = object)[j_],
+            'stratum' : np.asarray(levels, dtype = object)[s_],
+            'n' : m.astype(int),
+            'slope' : slope,
+            'intercept' : intercept,
+            'rvalue' : r,
+            'r2' : r**2,
+            'pvalue' : pvalue,
+            'stderr' : stderr,
+            'intercept_stderr' : intercept_stderr,
+            'x_min' : x_min[s_, i_],
+            'x_max' : x_max[s_, i_]
+            })
+    return(fits)
+
+def regress(x, y, mode = 'ols', delta = 1.0):
+    """
+    Fit a regression of y against x.
+    Args:
+        x (array-like): x values for the regression
+        y (array-like): y values for the regression
+        mode (str): regression mode, one of MODES
+        delta (float): ratio of the error variance of y to that of x, used by Deming regression
+    Returns:
+        fit (pandas.Series): regression results, with the fields of a regress_pairs row
+    """
+    fits = regress_pairs(pd.DataFrame({'x' : np.asarray(x, dtype = float), 'y' : np.asarray(y, dtype = float)}), mode = mode, delta = delta)
+    fit = fits.iloc[0]
+    return(fit)
+
+def _fit_rows(x, y, mode = 'ols', delta = 1.0):
+    """
+    Fit one regression per row of a pair of 2-D arrays, with every row fitted at once.
+    Args:
+        x (numpy.array): (B, n) array of x values
+        y (numpy.array): (B, n) array of y values
+        mode (str): regression mode, one of MODES
+        delta (float): ratio of the error variance of y to that of x, used by Deming regression
+    Returns:
+        m (numpy.array): slope of each row
+        b (numpy.array): intercept of each row
+    """
+    if mode == 'theil-sen':
+        fits = [theil_sen(x[k], y[k]) for k in range(0, len(x))]
+        m = np.array([f[0] for f in fits])
+        b = np.array([f[1] for f in fits])
+        return(m, b)
+    mx = x.mean(axis = 1)
+    my = y.mean(axis = 1)
+    dx = x - mx[:, None]
+    dy = y - my[:, None]
+    sxx = np.einsum('bn,bn->b', dx, dx)
+    syy = np.einsum('bn,bn->b', dy, dy)
+    sxy = np.einsum('bn,bn->b', dx, dy)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        if mode == 'ols':
+            m = sxy/sxx
+        else:
+            d = 1.0 if mode == 'orthogonal' else delta
+            m = (syy - d*sxx + np.sqrt((syy - d*sxx)**2 + 4*d*sxy**2))/(2*sxy)
+    b = my - m*mx
+    return(m, b)
+
+def bootstrap_indices(n, B, block = None, seed = 0):
+    """
+    Draw the row indices of B bootstrap resamples of n rows at once.
+    With a block length, the moving block bootstrap is used: each resample is built from randomly placed runs of consecutive rows,
+    which preserves autocorrelation within each run.
+    Args:
+        n (int): number of rows
+        B (int): number of resamples
+        block (int): optional block length for the moving block bootstrap
+        seed (int, numpy.random.Generator): seed or generator for drawing the resamples
+    Returns:
+        idx (numpy.array): (B, n) array of row indices
+    """
+    rng = np.random.default_rng(seed)
+    if block is None or block <= 1:
+        idx = rng.integers(0, n, (B, n))
+        return(idx)
+    block = min(block, n)
+    n_blocks = -(-n//block)
+    starts = rng.integers(0, n - block + 1, (B, n_blocks))
+    idx = (starts[:, :, None] + np.arange(block)).reshape(B, -1)[:, :n]
+    return(idx)
+
+def bootstrap_fit(x, y, B = 10000, block = None, mode = 'ols', delta = 1.0, alpha = 0.05, seed = 0, max_cells = 5000000):
+    """
+    Estimate percentile confidence intervals for the slope and intercept of a regression by bootstrapping.
+    All resamples are drawn as one index matrix and fitted with batched array operations,
+    processed in chunks of at most max_cells resampled values to bound memory.
+    Args:
+        x (array-like): x values for the regression
+        y (array-like): y values for the regression
+        B (int): number of bootstrap resamples
+        block (int): optional block length for the moving block bootstrap, for autocorrelated time series
+        mode (str): regression mode, one of MODES
+        delta (float): ratio of the error variance of y to that of x, used by Deming regression
+        alpha (float): the intervals cover 1 - alpha of the bootstrap distribution
+        seed (int): seed for drawing the resamples
+        max_cells (int): largest number of resampled values to hold in memory at once
+    Returns:
+        ci (dict): slope_lo, slope_hi, intercept_lo and intercept_hi
+    """
+    x = np.asarray(x, dtype = float)
+    y = np.asarray(y, dtype = float)
+    keep = np.isfinite(x) & np.isfinite(y)
+    x, y = x[keep], y[keep]
+    rng = np.random.default_rng(seed)
+    chunk = max(1, max_cells//max(len(x), 1))
+    m = np.empty(B)
+    b = np.empty(B)
+    for k in range(0, B, chunk):
+        idx = bootstrap_indices(len(x), min(chunk, B - k), block, rng)
+        m[k:k + len(idx)], b[k:k + len(idx)] = _fit_rows(x[idx], y[idx], mode, delta)
+    q = [100*alpha/2, 100*(1 - alpha/2)]
+    slope = np.nanpercentile(m, q)
+    intercept = np.nanpercentile(b, q)
+    ci = {'slope_lo' : slope[0], 'slope_hi' : slope[1], 'intercept_lo' : intercept[0], 'intercept_hi' : intercept[1]}
+    return(ci)
+
+def _bootstrap_task(args):
+    """
+    Run bootstrap_fit on one (x, y, stratum) combination. Module-level so that it can be sent to worker processes.
+    Args:
+        args (tuple): positional and keyword arguments for bootstrap_fit
+    Returns:
+        ci (dict): confidence intervals from bootstrap_fit
+    """
+    x, y, kwargs = args
+    return(bootstrap_fit(x, y, **kwargs))
+
+@profiling.timed()
+def bootstrap_pairs(df, columns = None, strata = None, levels = None, include_all = False, B = 10000, block = None, mode = 'ols', delta = 1.0, alpha = 0.05, seed = 0, processes = None):
+    """
+    Fit regressions between every pair of columns within each stratum (as regress_pairs) and add bootstrap confidence intervals.
+    The combinations can be spread over a pool of worker processes. The output can be written straight to a CSV summary with to_csv.
+    As in regress_pairs, rows with an empty cell in any of the columns are left out, so each interval is computed on the same rows as its point estimate.
+    Args:
+        df (pandas.DataFrame): aligned values, one column per instrument
+        columns (list): names of the columns to regress, defaults to all columns
+        strata (array-like): optional stratum of each row
+        levels (list): strata to fit, in output order
+        include_all (bool): if True, also fit all rows together as the stratum 'all'
+        B (int): number of bootstrap resamples
+        block (int): optional block length for the moving block bootstrap
+        mode (str): regression mode, one of MODES
+        delta (float): ratio of the error variance of y to that of x, used by Deming regression
+        alpha (float): the intervals cover 1 - alpha of the bootstrap distribution
+        seed (int): seed for drawing the resamples; each combination uses seed plus its row number
+        processes (int): number of worker processes, or None to run in this process
+    Returns:
+        fits (pandas.DataFrame): regress_pairs output with slope_lo, slope_hi, intercept_lo and intercept_hi columns
+    """
+    fits = regress_pairs(df, columns, strata, levels, include_all, mode, delta)
+    if columns is None:
+        columns = list(df)
+    # Resample the same rows the point estimates were fitted on: rows with an empty cell in any of the columns, or whose stratum is not
+    # one of the levels, are left out, and the combined stratum holds every remaining row.
+    if strata is None:
+        codes, n_levels = np.zeros(len(df), dtype = int), 1
+    else:
+        codes, levels = _level_codes(strata, levels)
+        n_levels = len(levels)
+    complete = np.isfinite(np.column_stack([df[c].to_numpy(dtype = float) for c in columns])).all(axis = 1) & (codes >= 0)
+    # regress_pairs lists its fits stratum by stratum, with the combined stratum last, and every ordered pair of columns within each.
+    n_pairs = len(columns)*(len(columns) - 1)
+    tasks = []
+    for k, row in enumerate(fits.itertuples()):
+        s = k//n_pairs
+        rows = complete.copy() if s >= n_levels else complete & (codes == s)
+        kwargs = dict(B = B, block = block, mode = mode, delta = delta, alpha = alpha, seed = seed + k)
+        tasks += [(df[row.x].to_numpy(dtype = float)[rows], df[row.y].to_numpy(dtype = float)[rows], kwargs)]
+    if processes is None or processes <= 1:
+        cis = [_bootstrap_task(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            cis = list(pool.map(_bootstrap_task, tasks))
+    fits = pd.concat([fits, pd.DataFrame(cis, columns = ['slope_lo', 'slope_hi', 'intercept_lo', 'intercept_hi'])], axis = 1)
+    return(fits)
+
+def _grid_tiles(grid, tile):
+    """
+    Split a stacked grid into tiles of columns (time steps), or pass an iterable of tiles through.
+    Args:
+        grid (numpy.array, iterable): array with one row per series, or an iterable of such arrays covering consecutive time steps
+        tile (int): number of columns per tile, or None for the whole array at once
+    Yields:
+        block (numpy.array): float array with one row per series
+    """
+    if not isinstance(grid, np.ndarray):
+        for block in grid:
+            yield(np.asarray(block, dtype = float))
+        return
+    step = grid.shape[1] if tile is None else int(tile)
+    for start in range(0, grid.shape[1], max(step, 1)):
+        yield(np.asarray(grid[:, start:start + step], dtype = float))
+
+@profiling.timed(rows = lambda result: len(result['n']))
+def correlation_matrix(grid, min_overlap = 3, tile = None):
+    """
+    Compute the correlation, OLS slope and intercept, and overlap count between every pair of series on a shared time grid,
+    using only the time steps where both series of a pair have a value.
+    With M the 0/1 matrix of valid cells and X the values with gaps set to 0, the pairwise overlap counts, sums,
+    sums of squares and cross-products are the four matrix products M M', X M', X^2 M' and X X', so every pair is
+    fitted in one BLAS pass over the data instead of one regression per pair.
+    The products are accumulated over blocks of time steps. Passing an iterable of blocks (e.g. from grid_tiles) bounds memory,
+    since the stacked grid is never in memory at once; tiling an array that is already in memory only bounds the temporaries of each product.
+    Args:
+        grid (numpy.array, iterable): array with one row per series and one column per time step, NA where missing (e.g. from to_grid),
+            or an iterable of such arrays covering consecutive time steps (e.g. read from disk)
+        min_overlap (int): smallest number of shared time steps for which a pair is fitted
+        tile (int): number of time steps per block when grid is an array, or None to use it whole; ignored for an iterable of blocks
+    Returns:
+        matrices (dict): k x k arrays n, r, slope and intercept, where entry [i, j] describes series j regressed against series i;
+            r, slope and intercept are NA where fewer than min_overlap time steps overlap
+    """
+    n = sx = sxx = sxy = shift = None
+    for block in _grid_tiles(grid, tile):
+        m = np.isfinite(block)
+        if shift is None:
+            # Subtracting a rough mean of each series keeps the sums small, which limits cancellation in the variances.
+            # Any constant works, so the first block's mean is used and the result does not depend on the tiling.
+            with np.errstate(invalid = 'ignore'):
+                counts = m.sum(axis = 1)
+                shift = np.where(counts > 0, np.where(m, block, 0.0).sum(axis = 1)/np.maximum(counts, 1), 0.0)
+            k = len(block)
+            n, sx, sxx, sxy = np.zeros((k, k)), np.zeros((k, k)), np.zeros((k, k)), np.zeros((k, k))
+        mf = m.astype(float)
+        x = np.where(m, block - shift[:, None], 0.0)
+        n += mf @ mf.T
+        sx += x @ mf.T
+        sxx += (x*x) @ mf.T
+        sxy += x @ x.T
+    if n is None:
+        return({'n' : np.zeros((0, 0), dtype = int), 'r' : np.zeros((0, 0)), 'slope' : np.zeros((0, 0)), 'intercept' : np.zeros((0, 0))})
+    n = np.rint(n)
+    # sx[i, j] sums series i over the steps it shares with j; the sums of series j over the same steps are sx[j, i].
+    sy = sx.T
+    syy = sxx.T
+    with np.errstate(invalid = 'ignore', divide = 'ignore'):
+        cov = n*sxy - sx*sy
+        var_x = n*sxx - sx*sx
+        var_y = n*syy - sy*sy
+        r = np.clip(cov/np.sqrt(var_x*var_y), -1.0, 1.0)
+        slope = cov/var_x
+        intercept = (sy/n + shift[None, :]) - slope*(sx/n + shift[:, None])
+    ok = n >= min_overlap
+    matrices = {'n' : n.astype(int), 'r' : np.where(ok, r, np.nan), 'slope' : np.where(ok, slope, np.nan), 'intercept' : np.where(ok, intercept, np.nan)}
+    return(matrices)
+
+def correlation_table(matrices, labels):
+    """
+    List the pairwise fits of correlation_matrix as a table, one row per ordered pair.
+    Args:
+        matrices (dict): output of correlation_matrix
+        labels (list): name of each series
+    Returns:
+        table (pandas.DataFrame): columns x, y, n, rvalue, r2, slope and intercept, sorted by decreasing r2
+    """
+    k = len(labels)
+    i, j = np.nonzero(~np.eye(k, dtype = bool))
+    labels = np.asarray(labels, dtype = object)
+    r = matrices['r'][i, j]
+    table = pd.DataFrame({'x' : labels[i], 'y' : labels[j], 'n' : matrices['n'][i, j], 'rvalue' : r, 'r2' : r**2,
+            'slope' : matrices['slope'][i, j], 'intercept' : matrices['intercept'][i, j]})
+    table = table.sort_values('r2', ascending = False, na_position = 'last', kind = 'stable', ignore_index = True)
+    return(table)
+
+def cluster_order(r):
+    """
+    Order series so that strongly correlated ones sit next to each other, by average-linkage hierarchical clustering on 1 - r.
+    Pairs without enough overlap are treated as uncorrelated.
+    Args:
+        r (numpy.array): k x k correlation matrix, e.g. from correlation_matrix
+    Returns:
+        order (numpy.array): indices of the series in clustered order
+    """
+    from scipy.cluster import hierarchy
+    from scipy.spatial.distance import squareform
+    if len(r) < 3:
+        return(np.arange(len(r)))
+    d = 1.0 - np.nan_to_num((r + r.T)/2, nan = 0.0)
+    np.fill_diagonal(d, 0.0)
+    link = hierarchy.linkage(squareform(np.clip(d, 0.0, 2.0), checks = False), method = 'average')
+    order = hierarchy.leaves_list(hierarchy.optimal_leaf_ordering(link, squareform(np.clip(d, 0.0, 2.0), checks = False)))
+    return(order)
+
+class OnlineRegression:
+    """
+    Running ordinary least squares regression of y against x that can be updated as new data arrives.
+    Only the count, means and centered sums of squares and cross-products are kept, and batches are merged into them
+    with the numerically stable pairwise (Welford/Chan) update, so reporting the current fit is O(1).
+    If a window is given, the rows inside it are also kept so they can be subtracted again once they expire.
+    Kept batches are sorted by timestamp and held in a heap ordered by their earliest timestamp, so expiring rows only
+    touches the batches that are (partly) expired, whatever the number of batches in the window.
+    Args:
+        window (pandas.Timedelta, str): optional length of a rolling window (e.g. '30D'), relative to the latest timestamp added
+    """
+
+    def __init__(self, window = None):
+        self.n = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.sxx = 0.0
+        self.syy = 0.0
+        self.sxy = 0.0
+        self.window = None if window is None else pd.Timedelta(window).to_timedelta64()
+        # Heap of (earliest timestamp, insertion count, dates, x, y) batches, each sorted by timestamp.
+        self.rows = []
+        self.count = 0
+        self.latest = None
+
+    def _merge(self, x, y, sign):
+        """
+        Add (sign = 1) or subtract (sign = -1) a batch of rows from the running sums.
+        Args:
+            x (numpy.array): x values
+            y (numpy.array): y values
+            sign (int): 1 to add the rows, -1 to subtract them
+        """
+        n_b = len(x)
+        if n_b == 0:
+            return
+        mx_b = x.mean()
+        my_b = y.mean()
+        dx = x - mx_b
+        dy = y - my_b
+        sxx_b, syy_b, sxy_b = dx @ dx, dy @ dy, dx @ dy
+        if sign > 0:
+            n = self.n + n_b
+            d_x = mx_b - self.mean_x
+            d_y = my_b - self.mean_y
+            w = self.n*n_b/n
+            self.sxx += sxx_b + w*d_x*d_x
+            self.syy += syy_b + w*d_y*d_y
+            self.sxy += sxy_b + w*d_x*d_y
+            self.mean_x += d_x*n_b/n
+            self.mean_y += d_y*n_b/n
+            self.n = n
+            return
+        n = self.n - n_b
+        if n <= 0:
+            self.n, self.mean_x, self.mean_y, self.sxx, self.syy, self.sxy = 0, 0.0, 0.0, 0.0, 0.0, 0.0
+            return
+        mx = (self.n*self.mean_x - n_b*mx_b)/n
+        my = (self.n*self.mean_y - n_b*my_b)/n
+        d_x = mx_b - mx
+        d_y = my_b - my
+        w = n*n_b/self.n
+        self.sxx -= sxx_b + w*d_x*d_x
+        self.syy -= syy_b + w*d_y*d_y
+        self.sxy -= sxy_b + w*d_x*d_y
+        self.mean_x, self.mean_y, self.n = mx, my, n
+
+    def add(self, x, y, dates = None):
+        """
+        Add rows to the regression, then expire the kept rows that have fallen out of the window. Rows with an empty x or y value are left out.
+        Args:
+            x (array-like): x values
+            y (array-like): y values
+            dates (array-like): timestamps of the rows, required if the regression has a window
+        """
+        self._add(x, y, dates)
+        if self.window is not None and self.latest is not None:
+            self.expire(self.latest - self.window)
+
+    def _add(self, x, y, dates = None):
+        """
+        Add rows to the regression without expiring any, see add.
+        """
+        x = np.asarray(x, dtype = float)
+        y = np.asarray(y, dtype = float)
+        keep = np.isfinite(x) & np.isfinite(y)
+        self._merge(x[keep], y[keep], 1)
+        if self.window is None:
+            return
+        if dates is None:
+            raise ValueError('Timestamps are required for a windowed regression')
+        dates = np.asarray(dates, dtype = 'datetime64[ns]')[keep]
+        if len(dates) == 0:
+            return
+        order = np.argsort(dates, kind = 'stable')
+        dates, x, y = dates[order], x[keep][order], y[keep][order]
+        heapq.heappush(self.rows, (dates[0], self.count, dates, x, y))
+        self.count += 1
+        self.latest = dates[-1] if self.latest is None else max(self.latest, dates[-1])
+
+    def remove(self, x, y):
+        """
+        Subtract rows that were previously added from the regression.
+        Args:
+            x (array-like): x values
+            y (array-like): y values
+        """
+        x = np.asarray(x, dtype = float)
+        y = np.asarray(y, dtype = float)
+        keep = np.isfinite(x) & np.isfinite(y)
+        self._merge(x[keep], y[keep], -1)
+
+    def expire(self, cutoff):
+        """
+        Subtract the kept rows with timestamps at or before a cutoff.
+        Args:
+            cutoff (numpy.datetime64, pandas.Timestamp): latest timestamp to expire
+        """
+        cutoff = np.datetime64(pd.Timestamp(cutoff).to_datetime64(), 'ns')
+        while self.rows and self.rows[0][0] <= cutoff:
+            first, count, dates, x, y = heapq.heappop(self.rows)
+            k = np.searchsorted(dates, cutoff, side = 'right')
+            self._merge(x[:k], y[:k], -1)
+            if k < len(dates):
+                heapq.heappush(self.rows, (dates[k], count, dates[k:], x[k:], y[k:]))
+
+    def fit(self, swap = False):
+        """
+        Report the current regression.
+        Args:
+            swap (bool): if True, report the regression of x against y instead
+        Returns:
+            fit (dict): n, slope, intercept, rvalue and r2 of the regression
+        """
+        sxx, syy, mx, my = (self.syy, self.sxx, self.mean_y, self.mean_x) if swap else (self.sxx, self.syy, self.mean_x, self.mean_y)
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            slope = np.float64(self.sxy)/sxx
+            r = np.clip(np.float64(self.sxy)/np.sqrt(sxx*syy), -1.0, 1.0)
+        fit = {'n' : self.n, 'slope' : slope, 'intercept' : my - slope*mx, 'rvalue' : r, 'r2' : r**2}
+        return(fit)
+
+class OnlineRegressions:
+    """
+    Running regressions between every pair of instruments within each stratum, updated as new rows arrive.
+    Each unordered pair keeps one OnlineRegression, which answers for both directions.
+    Args:
+        columns (list): names of the instrument columns
+        window (pandas.Timedelta, str): optional length of a rolling window (e.g. '30D')
+    """
+
+    def __init__(self, columns, window = None):
+        self.columns = list(columns)
+        self.window = window
+        self.regressions = {}
+
+    def update(self, df, strata = None, date = "Date"):
+        """
+        Add new rows to the regressions.
+        Args:
+            df (pandas.DataFrame): new rows, with a column for each instrument
+            strata (array-like): optional stratum of each row
+            date (str): name of the column containing the timestamps, needed if the regressions have a window
+        """
+        strata = np.full(len(df), 'all', dtype = object) if strata is None else np.asarray(strata, dtype = object)
+        dates = df[date].to_numpy() if self.window is not None else None
+        values = {c : df[c].to_numpy(dtype = float) for c in self.columns}
+        for s in pd.unique(strata):
+            rows = strata == s
+            for a in range(0, len(self.columns)):
+                for b in range(a + 1, len(self.columns)):
+                    key = (self.columns[a], self.columns[b], s)
+                    if key not in self.regressions:
+                        self.regressions[key] = OnlineRegression(self.window)
+                    self.regressions[key]._add(values[key[0]][rows], values[key[1]][rows], None if dates is None else dates[rows])
+        # Expire old rows once per regression, from every stratum, including strata that received no new rows.
+        if dates is not None and len(dates):
+            cutoff = np.asarray(dates, dtype = 'datetime64[ns]').max() - pd.Timedelta(self.window).to_timedelta64()
+            for reg in self.regressions.values():
+                reg.expire(cutoff)
+
+    def fits(self):
+        """
+        Report the current regressions.
+        Returns:
+            fits (pandas.DataFrame): one row per (x, y, stratum) with columns x, y, stratum, n, slope, intercept, rvalue and r2
+        """
+        rows = []
+        for (a, b, s), reg in self.regressions.items():
+            rows += [dict(x = a, y = b, stratum = s, **reg.fit())]
+            rows += [dict(x = b, y = a, stratum = s, **reg.fit(swap = True))]
+        fits = pd.DataFrame(rows, columns = ['x', 'y', 'stratum', 'n', 'slope', 'intercept', 'rvalue', 'r2'])
+        return(fits)
+
+def _fit_text(fit, ci = False):
+    """
+    Format the equation and R2 of a regression for display on a plot.
+    Args:
+        fit (pandas.Series): regression results from regress or regress_pairs
+        ci (bool): if True, also show the confidence intervals of the slope and intercept (from bootstrap_pairs)
+    Returns:
+        text (str): regression text
+    """
+    rs = str(round(fit['r2'], 2))
+    m_ = str(round(fit['slope'], 2))
+    b_ = np.around(fit['intercept']).astype('str')
+    text = 'y = '+ m_ +'x + ' + b_ + '\n' + 'r' + r'$^2$' + ' = ' + rs
+    if ci:
+        text += '\n' + 'm: [' + str(round(fit['slope_lo'], 2)) + ', ' + str(round(fit['slope_hi'], 2)) + ']'
+        text += '\n' + 'b: [' + str(round(fit['intercept_lo'], 1)) + ', ' + str(round(fit['intercept_hi'], 1)) + ']'
+    return(text)
+
+def plt_fit(fit, ax, mf, text_locx = None, text_locy = None, c = None, x_start = None, ci = False):
+    """
+    Plot a fitted regression on a preexisting plot. The regression is only drawn, not computed.
+    Args:
+        fit (pandas.Series): regression results from regress or regress_pairs
+        ax (matplotlib.pyplot.axes): preexisting plot object
+        mf (str): string indicating marker format in matplotlib conventions
+        text_locx (float): x value of the regression text location, no text is drawn if not given
+        text_locy (float): y value of the regression text location
+        c (str): color of the regression text
+        x_start (float): x value to start the line at, defaults to the minimum of the fitted x values
+        ci (bool): if True, also show the confidence intervals of the slope and intercept (from bootstrap_pairs)
+    Returns:
+        Draws a regression line and prints associated R2 and linear equation on plot. Nothing is drawn for fits of fewer than two points.
+    """
+    if fit['n'] < 2:
+        return
+    m = fit['slope']
+    b = fit['intercept']
+    x_r = [fit['x_min'] if x_start is None else x_start, fit['x_max']]
+    y_r = [m*x_r[0]+b, m*x_r[1]+b]
+    ax.plot(x_r, y_r, mf)
+    if text_locx is not None:
+        ax.text(
+                text_locx,
+                text_locy,
+                _fit_text(fit, ci),
+                c = c,
+                horizontalalignment = 'center'
+                )
+
+def plt_lin_reg(x, y, ax, mf, norm_text_locx, norm_text_locy, mode = 'ols'):
     """
     Plot a linear regression on a preexisting plot.
     Text associated with the regression is located by ratios relative to the data minima and maxima.
@@ -155,24 +1703,20 @@ def plt_lin_reg(x, y, ax, mf, norm_text_locx, norm_text_locy):
         mf (str): string indicating marker format in matplotlib conventions
         norm_text_locx (float): ratio from 0 to 1 indicating where along the x axis to locate the regression text
         norm_text_locy (float): ratio from 0 to 1 indicating where along the y axis to locate the regression text
+        mode (str): regression mode, one of MODES
     Returns:
         Draws a regression line and prints associated R2 and linear equation on plot
     """
-    m, b, r, p, se = stats.linregress(x, y)
-    x_r = [min(x), max(x)]
-    y_r = [m*min(x)+b, m*max(x)+b]
-    rs = str(round(r**2, 2))
-    m_ = str(round(m, 2))
-    b_ = np.around(b).astype('str')
-    ax.plot(x_r, y_r, mf)
-    ax.text(
-            min(x)+norm_text_locx*(max(x)-min(x)),
-            (m*min(x)+b)+norm_text_locy*((m*max(x)+b)-(m*min(x)+b)),
-            'y = '+ m_ +'x + ' + b_ + '\n' + 'r' + r'$^2$' + ' = ' + rs,
-            horizontalalignment = 'center'
+    fit = regress(x, y, mode)
+    m, b = fit['slope'], fit['intercept']
+    x_0, x_1 = fit['x_min'], fit['x_max']
+    plt_fit(
+            fit, ax, mf,
+            x_0+norm_text_locx*(x_1-x_0),
+            (m*x_0+b)+norm_text_locy*((m*x_1+b)-(m*x_0+b))
             )
 
-def plt_lin_reg_2(x, y, ax, mf, text_locx, text_locy):
+def plt_lin_reg_2(x, y, ax, mf, text_locx, text_locy, mode = 'ols'):
     """
     Plot a linear regression on a preexisting plot.
     Text associated with the regression is located by absolute x and y values.
@@ -183,25 +1727,13 @@ def plt_lin_reg_2(x, y, ax, mf, text_locx, text_locy):
         mf (str): string indicating marker format in matplotlib conventions
         text_locx (float): x value of the regression text location
         text_locy (float): y value of the regression text location 
+        mode (str): regression mode, one of MODES
     Returns:
         Draws a regression line and prints associated R2 and linear equation on plot
     """
-    m, b, r, p, se = stats.linregress(x, y)
-    x_r = [min(x), max(x)]
-    y_r = [m*min(x)+b, m*max(x)+b]
-    rs = str(round(r**2, 2))
-    m_ = str(round(m, 2))
-    b_ = np.around(b).astype('str')
-    ax.plot(x_r, y_r, mf)
-    ax.text(
-            text_locx,
-            text_locy,
-            'y = '+ m_ +'x + ' + b_ + '\n' + 'r' + r'$^2$' + ' = ' + rs,
-            c = mf[1],
-            horizontalalignment = 'center' 
-            )
+    plt_fit(regress(x, y, mode), ax, mf, text_locx, text_locy, c = mf[1])
 
-def plt_line_reg(x, y, ax, mf):
+def plt_line_reg(x, y, ax, mf, mode = 'ols'):
     """
     Plot a linear regression on a preexisting plot. Do not display regression information text.
     Args:
@@ -209,18 +1741,13 @@ def plt_line_reg(x, y, ax, mf):
         y (array-like): y values for the regression
         ax (matplotlib.pyplot.axes): preexisting plot object
         mf (str): string indicating marker format in matplotlib conventions
+        mode (str): regression mode, one of MODES
     Returns:
         Draws a regression line
     """
-    m, b, r, p, se = stats.linregress(x, y)
-    x_r = [min(x), max(x)]
-    y_r = [m*min(x)+b, m*max(x)+b]
-    rs = np.around(r**2, 2).astype('str')
-    m_ = np.around(m, 2).astype('str')
-    b_ = np.around(b, 2).astype('str')
-    ax.plot(x_r, y_r, mf)
+    plt_fit(regress(x, y, mode), ax, mf)
 
-def plt_lin_reg_y_int(x, y, ax, mf, text_locx, text_locy):
+def plt_lin_reg_y_int(x, y, ax, mf, text_locx, text_locy, mode = 'ols'):
     """
     Plot a linear regression on a preexisting plot.
     Plots regression from y intercept to x maximum.
@@ -232,20 +1759,8 @@ def plt_lin_reg_y_int(x, y, ax, mf, text_locx, text_locy):
         mf (str): string indicating marker format in matplotlib conventions
         text_locx (float): x value of the regression text location
         text_locy (float): y value of the regression text location 
+        mode (str): regression mode, one of MODES
     Returns:
         Draws a regression line and prints associated R2 and linear equation on plot
     """
-    m, b, r, p, se = stats.linregress(x, y)
-    x_r = [0, max(x)]
-    y_r = [m*0+b, m*max(x)+b]
-    rs = str(round(r**2, 2))
-    m_ = str(round(m, 2))
-    b_ = np.around(b).astype('str')
-    ax.plot(x_r, y_r, mf)
-    ax.text(
-            text_locx,
-            text_locy,
-            'y = '+ m_ +'x + ' + b_ + '\n' + 'r' + r'$^2$' + ' = ' + rs,
-            c = 'k',
-            horizontalalignment = 'center'
-            )
+    plt_fit(regress(x, y, mode), ax, mf, text_locx, text_locy, c = 'k', x_start = 0)
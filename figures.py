@@ -0,0 +1,225 @@
+"""
+This is a library of the figures made by the colocation scripts.
+Each function takes data that has already been loaded and aligned, draws one figure, and returns it without showing or saving it.
+"""
+
+import numpy as np
+import pandas as pd
+import df_funs as _
+import profiling
+import matplotlib.pyplot as plt
+
+@profiling.timed(rows = lambda result: len(result[1]))
+def correlogram(data, labels, xlim = 30, ylim = 30, rx = .27, ry = .75):
+    """
+    Make a correlogram with histograms on the diagonal and scatter plots colored by x-axis value off the diagonal.
+    Args:
+        data (list): aligned values of each instrument (e.g. from time_sync_n), from left to right and top to bottom
+        labels (list): name of each instrument
+        xlim (float): upper bound of the x axes
+        ylim (float): upper bound of the y axes of the scatter plots
+        rx (float): ratio of xlim at which to locate the regression text
+        ry (float): ratio of ylim at which to locate the regression text
+    Returns:
+        fig (matplotlib.figure.Figure): the figure
+        fits (pandas.DataFrame): regressions between every pair of instruments, from regress_pairs
+    """
+    k = len(data)
+
+    # Count the datapoints of each instrument falling into 3 ug/m3 bins from 0 to 30.
+    # Values below that range are drawn as part of the first bar, as the original per-bin counting loop did;
+    # values of 30 and above are left out.
+    edges = _.bin_edges(0.0, 30.0, 3.0)
+    hists = [_.histogram(x, edges) for x in data]
+
+    # Fit linear regressions between every pair of instruments.
+    fits = _.regress_pairs(pd.DataFrame({labels[n] : np.asarray(data[n]) for n in range(0,k)}))
+    fit = fits.set_index(["x", "y"])
+
+    # Establish a colormap based on the expected range of the data (0 to 30), with one color per 1 ug/m3 bin.
+    color_edges = _.bin_edges(0.0, 30.0, 1.0)
+    colors_1 = _.bin_colors(color_edges, plt.get_cmap('jet', 30))
+
+    # Establish colors for the histogram bins using the same colorscale as the other colormap.
+    colors_2 = _.bin_colors(edges, plt.get_cmap('jet', 10))[1:-1]
+
+    # Set the font size for the plots.
+    plt.rcParams['font.size'] = 20
+
+    # Create the figure with a grid of subplots.
+    fig, axes = plt.subplots( figsize = (20, 20), nrows = k, ncols = k, squeeze = False)
+
+    # Loop through the rows and columns of the figure.
+    for i in range(0,k):
+        for j in range(0,k):
+            # When on the diagonal, plot a histogram.
+            if i == j:
+                _.plt_hist(hists[j], edges, axes[i][j], colors_2, clip = 'low')
+                axes[i][j].set_xlim([0, xlim])
+                axes[i][j].set_ylim([0, 47])
+            # When not on diagonal, plot colored scatter plots with their linear regressions.
+            else:
+                _.plt_scatter(data[j], data[i], axes[i][j], colors_1, color_edges)
+                _.plt_fit(fit.loc[(labels[j], labels[i])], axes[i][j], '-k', rx*xlim, ry*ylim, c = 'k')
+                axes[i][j].set_xlim([0, xlim])
+                axes[i][j].set_ylim([0, ylim])
+            # If on the bottom row, apply x labels.
+            if i == k - 1:
+                axes[i][j].set_xlabel(labels[j])
+            # If on the left column, apply y labels.
+            if j == 0:
+                axes[i][j].set_ylabel(labels[i])
+    return(fig, fits)
+
+@profiling.timed(rows = lambda result: len(result[1]))
+def fire_correlogram(data, fire, labels, xlim = 30, ylim = 30, rx = .27, ry = .75, r_x = .74, r_y = .01):
+    """
+    Make a correlogram colored by whether or not a wildfire was occuring, with stacked histograms on the diagonal.
+    Args:
+        data (list): aligned values of each instrument (e.g. from time_sync_n), from left to right and top to bottom
+        fire (numpy.array): boolean array that is True where a fire was occuring
+        labels (list): name of each instrument
+        xlim (float): upper bound of the x axes
+        ylim (float): upper bound of the y axes of the scatter plots
+        rx (float): ratio of xlim at which to locate the no-fire regression text
+        ry (float): ratio of ylim at which to locate the no-fire regression text
+        r_x (float): ratio of xlim at which to locate the fire regression text
+        r_y (float): ratio of ylim at which to locate the fire regression text
+    Returns:
+        fig (matplotlib.figure.Figure): the figure
+        fits (pandas.DataFrame): regressions between every pair of instruments for fire and no-fire days, from regress_pairs
+    """
+    k = len(data)
+    data = [np.asarray(x) for x in data]
+
+    # Count the fire and no-fire datapoints of each instrument falling into 3 ug/m3 bins from 0 to 30.
+    # Rows of each count array are ordered no fire, fire. As with matplotlib's hist over the range 0 to 30, values outside it are not drawn.
+    edges = _.bin_edges(0.0, 30.0, 3.0)
+    hists = [_.histogram(x, edges, categories = fire, levels = [False, True], closed = True) for x in data]
+
+    # Fit linear regressions between every pair of instruments for fire and no-fire days.
+    fits = _.regress_pairs(pd.DataFrame({labels[n] : data[n] for n in range(0,k)}), strata = np.where(fire, "Fire", "No Fire"), levels = ["No Fire", "Fire"])
+    fit = fits.set_index(["x", "y", "stratum"])
+
+    # Set the font size for the plots.
+    plt.rcParams['font.size'] = 20
+
+    # Create the figure with a grid of subplots.
+    fig, axes = plt.subplots( figsize = (20, 20), nrows = k, ncols = k, squeeze = False)
+
+    # Loop through the rows and columns of the figure.
+    for i in range(0,k):
+        for j in range(0,k):
+            # When on the diagonal, stack the no-fire and fire counts with black and red coloring respectively.
+            if i == j:
+                _.plt_hist(hists[i], edges, axes[i][j], ["k", "r"])
+                axes[i][j].set_xlim([0, xlim])
+                axes[i][j].set_ylim([0, 47])
+            # When not on the diagonal, plot fire and no fire data separately with separate colors and linear regressions.
+            else:
+                axes[i][j].plot(data[j][~fire], data[i][~fire], 'ok')
+                _.plt_fit(fit.loc[(labels[j], labels[i], "No Fire")], axes[i][j], '-k', rx*xlim, ry*ylim, c = 'k')
+                axes[i][j].plot(data[j][fire], data[i][fire], 'or')
+                _.plt_fit(fit.loc[(labels[j], labels[i], "Fire")], axes[i][j], '-r', r_x*xlim, r_y*ylim, c = 'r')
+                axes[i][j].set_xlim([0, xlim])
+                axes[i][j].set_ylim([0, ylim])
+            # Apply x axis labels to the bottom row of subplots.
+            if i == k - 1:
+                axes[i][j].set_xlabel(labels[j])
+            # Apply y axis labels to the left column of subplots.
+            if j == 0:
+                axes[i][j].set_ylabel(labels[i])
+    return(fig, fits)
+
+@profiling.timed(rows = lambda result: len(result[1]))
+def fire_correlation(x, y, fire, x_label = "T640", y_label = "Partisol", xlim = 30, ylim = 30):
+    """
+    Make a scatter plot of one instrument against another, grouped by whether or not a wildfire was occuring.
+    Wildfire data is red, data with no wildfire is blue. Linear regressions are shown for both groups and the combined data.
+    Args:
+        x (array-like): aligned values of the x-axis instrument
+        y (array-like): aligned values of the y-axis instrument
+        fire (numpy.array): boolean array that is True where a fire was occuring
+        x_label (str): name of the x-axis instrument
+        y_label (str): name of the y-axis instrument
+        xlim (float): upper bound of the x axis
+        ylim (float): upper bound of the y axis
+    Returns:
+        fig (matplotlib.figure.Figure): the figure
+        fits (pandas.DataFrame): regressions of y against x for fire days, no-fire days and all days, from regress_pairs
+    """
+    x = np.asarray(x)
+    y = np.asarray(y)
+
+    # Fit linear regressions of y against x for fire days, no-fire days and all days.
+    fits = _.regress_pairs(pd.DataFrame({x_label : x, y_label : y}), strata = np.where(fire, "Fire", "No Fire"), levels = ["No Fire", "Fire"], include_all = True)
+    fits = fits[fits["x"] == x_label]
+    fit = fits.set_index("stratum")
+
+    # Set the font size for the plots.
+    plt.rcParams['font.size'] = 20
+
+    # Create a string containing special characters for units to show on plot.
+    units = ' (' + r'$\rm \mu$' + 'g/m' + r'$^3$' + ')'
+
+    # Establish a figure.
+    fig, ax1 = plt.subplots( figsize = (20, 20), nrows = 1, ncols = 1)
+    fig.subplots_adjust(bottom = .17)
+
+    # Plot data where there was no fire in blue. Plot an associated linear regression.
+    ax1.plot(x[~fire], y[~fire], "ob", label = "Days Without Fire")
+    _.plt_fit(fit.loc["No Fire"], ax1, '-b', .8*xlim, .72*ylim, c = 'b')
+    # Plot data where there was a fire in red. Plot an associated linear regression.
+    ax1.plot(x[fire], y[fire], "or", label = "Fire Days")
+    _.plt_fit(fit.loc["Fire"], ax1, '-r', .86*xlim, .46*ylim, c = 'r')
+    # Plot a linear regression for the combined dataset.
+    _.plt_fit(fit.loc['all'], ax1, '-k', .925*xlim, .595*ylim, c = 'k')
+    # Establish axis limits, labels, and legend.
+    ax1.set_ylabel(y_label + ' PM' + r'$\rm _{2.5}$' + units)
+    ax1.set_xlim([0, xlim])
+    ax1.set_ylim([0, ylim])
+    ax1.legend(loc = 4)
+    ax1.set_xlabel(x_label + ' PM' + r'$\rm _{2.5}$' + units)
+    return(fig, fits)
+
+def network_heatmap(grid, labels, min_overlap = 3, tile = None):
+    """
+    Make a heatmap of the correlations between every pair of monitors, ordered by hierarchical clustering so that
+    groups of monitors that track each other form blocks along the diagonal. This scales to hundreds of monitors,
+    where a correlogram's grid of scatter plots does not.
+    Args:
+        grid (numpy.array, iterable): values with one row per monitor and one column per time step, NA where missing (e.g. from to_grid),
+            or an iterable of blocks of time steps (e.g. from grid_tiles)
+        labels (list): name of each monitor
+        min_overlap (int): smallest number of shared time steps for which a pair is correlated
+        tile (int): number of time steps per block, see correlation_matrix
+    Returns:
+        fig (matplotlib.figure.Figure): the figure
+        table (pandas.DataFrame): pairwise fits from correlation_table, sorted by decreasing r2
+    """
+    matrices = _.correlation_matrix(grid, min_overlap, tile)
+    table = _.correlation_table(matrices, labels)
+    order = _.cluster_order(matrices['r'])
+    k = len(labels)
+
+    # Set the font size for the plots, smaller as the number of monitors grows.
+    plt.rcParams['font.size'] = 20 if k <= 10 else 10
+
+    # Draw the clustered correlation matrix; pairs without enough overlap are left blank.
+    size = min(max(10, 0.25*k), 40)
+    fig, ax = plt.subplots(figsize = (size + 3, size))
+    image = ax.imshow(matrices['r'][np.ix_(order, order)], cmap = 'RdBu_r', vmin = -1, vmax = 1, interpolation = 'nearest')
+    fig.colorbar(image, ax = ax, label = 'r')
+
+    # Label the monitors when there are few enough for the labels to be legible.
+    if k <= 60:
+        names = [str(labels[i]) for i in order]
+        ax.set_xticks(range(0, k))
+        ax.set_xticklabels(names, rotation = 90)
+        ax.set_yticks(range(0, k))
+        ax.set_yticklabels(names)
+    else:
+        ax.set_xticks([])
+        ax.set_yticks([])
+    fig.tight_layout()
+    return(fig, table)
@@ -0,0 +1,506 @@
+"""
+This is a library for reading the instrument and fire datafiles used by the colocation scripts.
+Timestamps are parsed with vectorized, format-based conversion instead of one strptime call per row.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+import pandas as pd
+import df_funs
+import profiling
+
+# Timestamp formats found in the datafiles.
+# '%m/%d/%Y' - T640 pre-DMS daily averages and the CalFire table
+# '%Y/%m/%d %H:%M' - T640 post-DMS daily averages and Partisol
+# '%m/%d/%Y %H:%M' - BAM
+DATE_FORMATS = ['%m/%d/%Y', '%Y/%m/%d %H:%M', '%m/%d/%Y %H:%M']
+
+def detect_date_format(s, formats = DATE_FORMATS, n = 100):
+    """
+    Detect the timestamp format of a column of date strings from a sample of its values.
+    Args:
+        s (pandas.Series, array-like): date strings
+        formats (list): candidate formats, tried in order
+        n (int): number of non-empty values to sample
+    Returns:
+        fmt (str): first format that parses every sampled value
+    """
+    sample = pd.Series(s).dropna().astype(str)
+    sample = sample.iloc[np.linspace(0, len(sample) - 1, min(n, len(sample))).astype(int)] if len(sample) else sample
+    for fmt in formats:
+        try:
+            pd.to_datetime(sample, format = fmt)
+        except (ValueError, TypeError):
+            continue
+        return(fmt)
+    raise ValueError('None of the formats ' + str(formats) + ' match the sampled timestamps')
+
+def parse_dates(s, fmt = None):
+    """
+    Convert a column of date strings to datetimes.
+    Each distinct string is parsed once and the result is broadcast back to every row,
+    which makes repetitive exports (e.g. daily timestamps repeated across sites) cheap to parse.
+    Args:
+        s (pandas.Series, array-like): date strings
+        fmt (str): timestamp format, detected from the data if not given
+    Returns:
+        dates (pandas.Series): datetime column
+    """
+    s = pd.Series(s)
+    if fmt is None:
+        fmt = detect_date_format(s)
+    codes, uniques = pd.factorize(s)
+    parsed = pd.to_datetime(pd.Series(uniques, dtype = object), format = fmt).to_numpy(dtype = 'datetime64[ns]')
+    # Missing strings get code -1, which picks up the trailing NaT.
+    parsed = np.append(parsed, np.datetime64('NaT', 'ns'))
+    dates = pd.Series(parsed[codes], index = s.index, name = s.name)
+    return(dates)
+
+def read_csv(path, date_columns = (), fmt = None, **kwargs):
+    """
+    Read a CSV file and convert its timestamp columns to datetimes.
+    Args:
+        path (str): path of the file to read
+        date_columns (list): names of the columns containing timestamps
+        fmt (str): timestamp format shared by the date columns, detected from the data if not given
+        **kwargs: further arguments passed to pandas.read_csv
+    Returns:
+        df (pandas.DataFrame): DataFrame with the date columns converted
+    """
+    dtype = dict(kwargs.pop('dtype', None) or {})
+    dtype.update({c : str for c in date_columns})
+    df = pd.read_csv(path, dtype = dtype, **kwargs)
+    for c in date_columns:
+        df[c] = parse_dates(df[c], fmt)
+    return(df)
+
+# Bits of the Flags column that load adds to every datafile, marking rows that may need to be dropped.
+MISSING = 1     # an empty cell in one of the schema's columns
+SENTINEL = 2    # a sentinel value, e.g. -999
+QC_CODE = 4     # a non-zero QCCode
+OP_CODE = 8     # a non-zero OPCode
+
+# Declarative descriptions of each datafile. Each schema lists:
+#   usecols - columns to read from the file (all others are skipped by the parser)
+#   dtype - compact dtypes for the columns that are read
+#   dates - columns containing timestamps
+#   date_format - timestamp format, or None to detect it from the data
+#   sentinels - values marking erroneous data, keyed by column
+#   codes - QC code columns, mapped to the Flags bit set where they are non-zero
+#   dedupe - column whose repeated values are dropped (first occurrence kept), or None
+#   rename - new names for the columns that are read
+AQS_DTYPE = {'Site' : 'category', 'Value' : 'float32', 'QCCode' : 'float32', 'OPCode' : 'float32'}
+
+T640_PRE_DMS = {
+        'usecols' : ['Date', 'PM 2.5'],
+        'dtype' : {'PM 2.5' : 'float32'},
+        'dates' : ['Date'],
+        'date_format' : '%m/%d/%Y',
+        'sentinels' : {'PM 2.5' : [-999]},
+        'codes' : {},
+        'dedupe' : 'Date',
+        'rename' : {'PM 2.5' : 'Value'}
+        }
+
+T640 = {
+        'usecols' : ['Site', 'Date (LST)', 'Value'],
+        'dtype' : AQS_DTYPE,
+        'dates' : ['Date (LST)'],
+        'date_format' : '%Y/%m/%d %H:%M',
+        'sentinels' : {'Value' : [-999]},
+        'codes' : {'QCCode' : QC_CODE, 'OPCode' : OP_CODE},
+        'dedupe' : 'Date (LST)',
+        'rename' : {'Date (LST)' : 'Date'}
+        }
+
+PARTISOL = dict(T640)
+
+BAM = dict(T640, date_format = '%m/%d/%Y %H:%M')
+
+# Any AQS-style export (e.g. a network-wide download), with its timestamp format detected from the data.
+AQS = dict(T640, usecols = ['Site', 'Parameter', 'Date (LST)', 'Value'], dtype = dict(AQS_DTYPE, Parameter = 'category'), date_format = None)
+
+CALFIRE = {
+        'usecols' : ['Name', 'Date', 'End Date', 'County', 'Acreage'],
+        'dtype' : {'County' : 'category', 'Acreage' : 'float32'},
+        'dates' : ['Date', 'End Date'],
+        'date_format' : '%m/%d/%Y',
+        'sentinels' : {},
+        'codes' : {},
+        'dedupe' : None,
+        'rename' : {}
+        }
+
+# QC policies, applied to the Flags and Value columns of a loaded datafile. Each policy lists:
+#   flags - Flags bits whose rows are dropped
+#   floor - values at or below this are dropped (like df_floor), or None
+#   ceiling - values above this are dropped, or None
+#   outliers - values more than this many robust standard deviations (1.4826 median absolute deviations) from the median are dropped, or None
+DEFAULT_QC = {'flags' : MISSING | SENTINEL, 'floor' : None, 'ceiling' : None, 'outliers' : None}
+
+QC_POLICIES = {
+        'default' : DEFAULT_QC,
+        'strict' : dict(DEFAULT_QC, flags = MISSING | SENTINEL | QC_CODE | OP_CODE),
+        'positive' : dict(DEFAULT_QC, floor = 0.0)
+        }
+
+def _flags(df, schema):
+    """
+    Compute the Flags column of a datafile that has just been read, before its columns are renamed.
+    Args:
+        df (pandas.DataFrame): the schema's columns and QC code columns
+        schema (dict): description of the file
+    Returns:
+        flags (numpy.array): uint8 array of Flags bits
+    """
+    flags = np.where(df[schema['usecols']].isna().any(axis = 1).to_numpy(), MISSING, 0).astype('uint8')
+    for c, values in schema['sentinels'].items():
+        flags |= np.where(df[c].isin(values).to_numpy(), SENTINEL, 0).astype('uint8')
+    for c, bit in schema['codes'].items():
+        flags |= np.where(df[c].fillna(0).to_numpy() != 0, bit, 0).astype('uint8')
+    return(flags)
+
+@profiling.timed()
+def read(path, schema):
+    """
+    Read a datafile as described by a schema and flag its rows, without dropping any.
+    The Flags column, and the QC code columns of the schema, are added after the schema's columns.
+    Args:
+        path (str): path of the file to read
+        schema (dict): description of the file, e.g. T640_PRE_DMS, T640, PARTISOL, BAM or CALFIRE
+    Returns:
+        df (pandas.DataFrame): DataFrame with renamed columns, the Flags column and the QC code columns
+    """
+    usecols = schema['usecols'] + list(schema['codes'])
+    df = read_csv(path, schema['dates'], schema['date_format'], usecols = usecols, dtype = schema['dtype'])
+    df = df[usecols]
+    df.insert(len(schema['usecols']), 'Flags', _flags(df, schema))
+    df = df.rename(columns = schema['rename'])
+    return(df)
+
+def qc_mask(df, schema, qc = DEFAULT_QC, value = "Value"):
+    """
+    Compute the rows of a datafile that pass a QC policy, in a single vectorized pass over its Flags and values.
+    Repeated timestamps among the passing rows are dropped too (first occurrence kept).
+    Args:
+        df (pandas.DataFrame): DataFrame from read
+        schema (dict): schema the file was read with
+        qc (dict): QC policy, e.g. DEFAULT_QC or a value of QC_POLICIES
+        value (str): name of the column the floor, ceiling and outlier rules apply to
+    Returns:
+        keep (numpy.array): boolean array that is True for the rows to keep
+    """
+    keep = (df['Flags'].to_numpy() & qc['flags']) == 0
+    if value in df:
+        v = df[value].to_numpy(dtype = float)
+        if qc['floor'] is not None:
+            keep &= v > qc['floor']
+        if qc['ceiling'] is not None:
+            keep &= v <= qc['ceiling']
+        if qc['outliers'] is not None and keep.any():
+            median = np.median(v[keep])
+            mad = np.median(np.abs(v[keep] - median))
+            keep &= np.abs(v - median) <= qc['outliers']*1.4826*mad
+    if schema['dedupe'] is not None:
+        # Rows that are already dropped are blanked so they cannot shadow a later valid timestamp.
+        date = schema['rename'].get(schema['dedupe'], schema['dedupe'])
+        keep &= ~df[date].where(keep).duplicated().to_numpy()
+    return(keep)
+
+@profiling.timed()
+def apply_qc(df, schema, qc = DEFAULT_QC):
+    """
+    Keep the rows of a datafile that pass a QC policy. The DataFrame is copied once, whatever the number of rules.
+    Args:
+        df (pandas.DataFrame): DataFrame from read
+        schema (dict): schema the file was read with
+        qc (dict): QC policy, e.g. DEFAULT_QC or a value of QC_POLICIES
+    Returns:
+        new_df (pandas.DataFrame): the passing rows with a 0..n-1 index
+    """
+    new_df = df[qc_mask(df, schema, qc)]
+    new_df.reset_index(inplace = True, drop = True)
+    return(new_df)
+
+def load(path, schema, qc = DEFAULT_QC):
+    """
+    Read a datafile as described by a schema and clean it.
+    Rows with empty cells, sentinel values or repeated timestamps (and whatever else the QC policy excludes) are dropped with a single combined mask,
+    so the file is only copied once after it is read.
+    Args:
+        path (str): path of the file to read
+        schema (dict): description of the file, e.g. T640_PRE_DMS, T640, PARTISOL, BAM or CALFIRE
+        qc (dict): QC policy, or None to keep every row
+    Returns:
+        df (pandas.DataFrame): cleaned DataFrame with a 0..n-1 index, renamed columns, the Flags column and the QC code columns
+    """
+    df = read(path, schema)
+    if qc is not None:
+        df = apply_qc(df, schema, qc)
+    return(df)
+
+def _chunk_columns(schema, sites = None, parameters = None):
+    """
+    Find the columns that read_chunks reads, before the QC code columns: the schema's columns and any filter columns the schema does not read,
+    with Site and Parameter first, as in the AQS layout.
+    Args:
+        schema (dict): description of the file
+        sites, parameters: filters, see read_chunks
+    Returns:
+        extra (list): filter columns added to the schema's columns
+        columns (list): names of the columns, in output order
+    """
+    filters = {'Site' : sites, 'Parameter' : parameters}
+    extra = [c for c, keep in filters.items() if keep is not None and c not in schema['usecols']]
+    lead = [c for c in filters if c in extra or c in schema['usecols']]
+    columns = lead + [c for c in schema['usecols'] if c not in lead]
+    return(extra, columns)
+
+def read_chunks(path, schema, chunksize = 1000000, sites = None, parameters = None, start = None, end = None, exclude_qc = None):
+    """
+    Read a datafile as described by a schema in chunks of rows, so that files larger than memory can be processed.
+    Each chunk is filtered, flagged and cleaned of empty cells and sentinel values like load does, but repeated timestamps are not dropped.
+    Rows are filtered by site and parameter before their timestamps are parsed, so rows from other sites cost little.
+    A Site or Parameter column used to filter the rows is kept in the output (as a category), even if the schema does not read it,
+    so that rows of different sites or parameters can still be told apart.
+    Args:
+        path (str): path of the file to read
+        schema (dict): description of the file, e.g. T640
+        chunksize (int): number of rows per chunk
+        sites (list): sites to keep, as in the Site column, or None for every site
+        parameters (list): parameters to keep, as in the Parameter column, or None for every parameter
+        start (pandas.Timestamp, str): first timestamp to keep, or None for no lower bound
+        end (pandas.Timestamp, str): timestamp to stop before, or None for no upper bound
+        exclude_qc (list): QC codes (e.g. [8]) whose rows are dropped, or None to keep every row
+    Yields:
+        df (pandas.DataFrame): cleaned chunk with the added filter columns, the schema's renamed columns, the Flags column and the QC code columns
+    """
+    filters = {'Site' : sites, 'Parameter' : parameters}
+    extra, columns = _chunk_columns(schema, sites, parameters)
+    columns = columns + list(schema['codes'])
+    usecols = list(columns)
+    if exclude_qc is not None and 'QCCode' not in usecols:
+        usecols += ['QCCode']
+    dtype = dict(schema['dtype'])
+    dtype.update({c : 'category' for c in extra})
+    dtype.update({c : str for c in schema['dates']})
+    date = schema['dates'][0] if schema['dates'] else None
+    fmt = schema['date_format']
+    with pd.read_csv(path, usecols = usecols, dtype = dtype, chunksize = chunksize) as reader:
+        for df in reader:
+            keep = np.ones(len(df), dtype = bool)
+            for c, values in filters.items():
+                if values is not None:
+                    keep &= df[c].isin(values).to_numpy()
+            if exclude_qc is not None:
+                keep &= ~df['QCCode'].isin(exclude_qc).to_numpy()
+            df = df[keep]
+            for c in schema['dates']:
+                # Detect the format once, from the first non-empty chunk, so that every chunk is parsed the same way.
+                if fmt is None and len(df):
+                    fmt = detect_date_format(df[c])
+                df[c] = parse_dates(df[c], fmt)
+            df = df[columns]
+            df.insert(len(extra) + len(schema['usecols']), 'Flags', _flags(df, schema))
+            keep = (df['Flags'].to_numpy() & (MISSING | SENTINEL)) == 0
+            if start is not None:
+                keep &= (df[date] >= pd.Timestamp(start)).to_numpy()
+            if end is not None:
+                keep &= (df[date] < pd.Timestamp(end)).to_numpy()
+            df = df[keep].rename(columns = schema['rename'])
+            yield(df)
+
+@profiling.timed()
+def stream(path, schema, sites = None, parameters = None, start = None, end = None, exclude_qc = None, chunksize = 1000000):
+    """
+    Read the rows of a large datafile (e.g. a network-wide AQS export) that match a set of filters, reading it in chunks.
+    Only one chunk of raw rows and the filtered rows are held in memory, so peak memory follows the size of the output rather than the file.
+    Repeated timestamps are dropped as each chunk arrives, keeping the first row like load does, so duplicates that straddle a chunk boundary are caught too.
+    A timestamp is only a repeat within the same site and parameter: the Site and Parameter columns, when read or used to filter, are part of the key.
+    Args:
+        path (str): path of the file to read
+        schema (dict): description of the file, e.g. T640, PARTISOL or BAM
+        sites, parameters, start, end, exclude_qc: filters, see read_chunks
+        chunksize (int): number of rows per chunk
+    Returns:
+        df (pandas.DataFrame): cleaned DataFrame with a 0..n-1 index, the added filter columns and renamed columns, as returned by load
+    """
+    extra, columns = _chunk_columns(schema, sites, parameters)
+    date = schema['rename'].get(schema['dedupe'], schema['dedupe']) if schema['dedupe'] is not None else None
+    # Latest timestamp and every timestamp kept so far of each site and parameter. Files sorted by time only ever need the former;
+    # the latter is searched only for rows at or before the latest timestamp.
+    latest = {}
+    history = {}
+    chunks = []
+    for chunk in read_chunks(path, schema, chunksize, sites, parameters, start, end, exclude_qc):
+        if date is not None and len(chunk):
+            by = [c for c in ['Site', 'Parameter'] if c in chunk]
+            chunk = chunk[~chunk.duplicated(by + [date]).to_numpy()]
+            dates = chunk[date].to_numpy().astype('int64')
+            groups = chunk.groupby(by, observed = True, sort = False, dropna = False).indices if by else {() : np.arange(len(chunk))}
+            keep = np.ones(len(chunk), dtype = bool)
+            for group, rows in groups.items():
+                d = dates[rows]
+                if group in latest:
+                    old = d <= latest[group]
+                    if old.any():
+                        keep[rows[old]] = ~np.isin(d[old], np.concatenate(history[group]))
+                    d = d[keep[rows]]
+                    latest[group] = max(latest[group], d.max()) if len(d) else latest[group]
+                    history[group].append(d)
+                else:
+                    latest[group] = d.max()
+                    history[group] = [d]
+            chunk = chunk[keep]
+        chunks.append(chunk)
+    df = pd.concat(chunks, ignore_index = True) if chunks else pd.DataFrame(columns = [schema['rename'].get(c, c) for c in columns] + ['Flags'] + list(schema['codes']))
+    # Chunks carry their own categories, which concat turns back into strings.
+    for c in extra + [schema['rename'].get(c, c) for c, t in schema['dtype'].items() if t == 'category']:
+        if c in df:
+            df[c] = df[c].astype('category')
+    return(df)
+
+@profiling.timed()
+def resample_file(path, schema = T640, freq = '1D', resolution = '1min', min_fraction = .75, offset = None, by = ("Site",), chunksize = 1000000):
+    """
+    Average a raw high-rate datafile (e.g. 1-minute T640 data) over fixed windows, reading it in chunks.
+    Only one chunk of raw rows and the running sums of each window are held in memory at a time.
+    Repeated timestamps are counted once, even when they straddle a chunk boundary, see df_funs.Resampler.
+    Args:
+        path (str): path of the file to read
+        schema (dict): description of the file; its date column must be renamed to Date and its value column be named Value
+        freq (pandas.Timedelta, str): window length, e.g. '1h' or '1D'
+        resolution (pandas.Timedelta, str): sampling interval of the raw data
+        min_fraction (float): fraction of the expected samples a window must contain to be reported
+        offset (pandas.Timedelta, str): time added to the timestamps before they are binned, see df_funs.Resampler
+        by (list): columns to average separately
+        chunksize (int): number of rows per chunk
+    Returns:
+        df (pandas.DataFrame): averaged data with the by columns, Date, Value and Minutes in Average, from df_funs.Resampler
+    """
+    r = df_funs.Resampler(freq, resolution, min_fraction, offset, by)
+    for chunk in read_chunks(path, schema, chunksize):
+        r.add(chunk)
+    df = r.result()
+    return(df)
+
+# Directory that cleaned datafiles are cached in: $COLO_CACHE if set, otherwise .colo_cache next to this module,
+# so that runs started from any working directory share one cache.
+# Increment SCHEMA_VERSION whenever load changes the way it cleans data, so that old cache entries are not reused.
+CACHE_DIRECTORY = os.environ.get('COLO_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.colo_cache'))
+SCHEMA_VERSION = 2
+
+def file_hash(path, block_size = 1 << 20):
+    """
+    Compute the SHA-1 hash of a file's contents, reading it in blocks.
+    Args:
+        path (str): path of the file
+        block_size (int): number of bytes to read at a time
+    Returns:
+        h (str): hex digest of the file contents
+    """
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return(h.hexdigest())
+
+def cache_key(path, schema, verify = False):
+    """
+    Build the cache key of a datafile read with a schema.
+    The key changes whenever the file's path, size or modification time changes, or whenever the schema or SCHEMA_VERSION changes.
+    Hashing the contents as well catches edits that keep the size and modification time, at the cost of reading the whole file.
+    Args:
+        path (str): path of the datafile
+        schema (dict): schema the file is read with
+        verify (bool): whether to include the SHA-1 hash of the file contents in the key
+    Returns:
+        key (str): hex digest identifying the cleaned data
+    """
+    st = os.stat(path)
+    parts = [os.path.abspath(path), st.st_size, st.st_mtime_ns, SCHEMA_VERSION, repr(sorted(schema.items()))]
+    if verify:
+        parts.append(file_hash(path))
+    key = hashlib.sha1(json.dumps(parts).encode()).hexdigest()
+    return(key)
+
+@profiling.timed()
+def load_cached(path, schema, directory = None, qc = DEFAULT_QC, verify = False):
+    """
+    Read a datafile as described by a schema, reusing a flagged copy from a previous run when the file and schema are unchanged.
+    Every row is cached with its Flags, so any QC policy can be applied to a cache entry without reading the file again.
+    Cache entries are stored as Feather files (memory-mapped on read) when pyarrow is installed, and as pickles otherwise.
+    Entries are written to a temporary file of their own and moved into place with os.replace, so concurrent runs never see a partial entry.
+    Entries left behind by older versions of the same file are removed once the new entry is in place; other processes' temporary files are left alone.
+    Args:
+        path (str): path of the file to read
+        schema (dict): description of the file, e.g. T640_PRE_DMS, T640, PARTISOL, BAM or CALFIRE
+        directory (str): cache directory, defaults to CACHE_DIRECTORY
+        qc (dict): QC policy, or None to keep every row (e.g. to apply policies later with apply_qc)
+        verify (bool): whether to also key the entry on a hash of the file contents (see cache_key)
+    Returns:
+        df (pandas.DataFrame): cleaned DataFrame, as returned by load
+    """
+    try:
+        from pyarrow import feather
+    except ImportError:
+        feather = None
+    if directory is None:
+        directory = CACHE_DIRECTORY
+    source = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16]
+    ext = '.feather' if feather is not None else '.pkl'
+    cache_file = os.path.join(directory, source + '_' + cache_key(path, schema, verify) + ext)
+    if os.path.exists(cache_file):
+        if ext == '.feather':
+            df = feather.read_table(cache_file, memory_map = True).to_pandas()
+        else:
+            df = pd.read_pickle(cache_file)
+    else:
+        df = read(path, schema)
+        os.makedirs(directory, exist_ok = True)
+        # Write to a temporary file unique to this process first, so that an interrupted or concurrent run cannot leave a truncated entry behind.
+        fd, tmp_file = tempfile.mkstemp(suffix = ext + '.tmp', prefix = source + '_', dir = directory)
+        os.close(fd)
+        try:
+            if ext == '.feather':
+                feather.write_feather(df, tmp_file)
+            else:
+                df.to_pickle(tmp_file)
+            os.replace(tmp_file, cache_file)
+        except BaseException:
+            os.remove(tmp_file)
+            raise
+        for name in os.listdir(directory):
+            if name.startswith(source + '_') and name.endswith(ext) and name != os.path.basename(cache_file):
+                # Another run may remove (or still be reading) the same stale entry.
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+    if qc is not None:
+        df = apply_qc(df, schema, qc)
+    return(df)
+
+def load_series(path, schema, name = None, qc = DEFAULT_QC, directory = None):
+    """
+    Read an instrument datafile into one compact df_funs.InstrumentSeries per site, for long records held in memory.
+    The DataFrame from load_cached is only kept while the arrays are extracted from it.
+    Args:
+        path (str): path of the file to read
+        schema (dict): description of the file, e.g. T640_PRE_DMS, T640, PARTISOL or BAM
+        name (str): instrument name given to the series
+        qc (dict): QC policy, or None to keep every row with its flags
+        directory (str): cache directory, defaults to CACHE_DIRECTORY
+    Returns:
+        series (dict): InstrumentSeries keyed by site, or by None for files without a Site column
+    """
+    df = load_cached(path, schema, directory, qc)
+    if 'Site' not in df:
+        return({None : df_funs.InstrumentSeries.from_frame(df, name)})
+    series = {}
+    for site, rows in df.groupby('Site', observed = True, sort = False).indices.items():
+        series[site] = df_funs.InstrumentSeries.from_frame(df.take(rows), name, site)
+    return(series)
@@ -0,0 +1,183 @@
+"""
+This is a library for timing the stages of the colocation pipeline (loading, aligning, fitting and drawing).
+Each stage records its wall time, the number of rows it produced and, optionally, the peak memory traced while it ran.
+Stages are marked with the stage context manager or the timed decorator, and the totals can be written as a JSON report.
+Set the environment variable COLO_PROFILE=0 to switch the instrumentation off; timed then returns functions undecorated
+and stage does nothing, so the only cost left is a function call per stage.
+Peak memory is measured with tracemalloc, which slows every allocation (and imports several times over),
+so it is only recorded when COLO_PROFILE=memory; by default stages record wall time and rows only.
+"""
+
+import contextlib
+import functools
+import json
+import os
+import time
+import tracemalloc
+
+# Whether stages are recorded, and whether their memory is traced.
+ENABLED = os.environ.get('COLO_PROFILE', '1') != '0'
+MEMORY = os.environ.get('COLO_PROFILE', '1') == 'memory'
+
+# Totals of each stage, keyed by name, and the traced memory at the start of each running stage with the peak it has reached, innermost last.
+STAGES = {}
+_running = []
+
+class Record:
+    """
+    Measurements of one run of a stage. The code inside a stage may set rows, e.g. rec.rows = len(df).
+    """
+    __slots__ = ['name', 'rows', 'wall', 'peak']
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+        self.wall = 0.0
+        self.peak = None
+
+_NULL = Record(None)
+
+def _add(rec):
+    """
+    Add a finished run to the totals of its stage.
+    Args:
+        rec (Record): measurements of the run
+    """
+    total = STAGES.setdefault(rec.name, {'calls' : 0, 'wall' : 0.0, 'rows' : None, 'peak_bytes' : None})
+    total['calls'] += 1
+    total['wall'] += rec.wall
+    if rec.rows is not None:
+        total['rows'] = (total['rows'] or 0) + int(rec.rows)
+    if rec.peak is not None:
+        total['peak_bytes'] = max(total['peak_bytes'] or 0, rec.peak)
+
+@contextlib.contextmanager
+def _stage(name):
+    """
+    Time a block of code as a named stage, see stage.
+    Peak memory is reported relative to the memory traced when the stage started.
+    """
+    rec = Record(name)
+    if MEMORY:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        current, peak = tracemalloc.get_traced_memory()
+        # Keep the peak reached so far by the enclosing stage before the counter is reset for this one.
+        if _running:
+            _running[-1][1] = max(_running[-1][1], peak)
+        tracemalloc.reset_peak()
+        _running.append([current, current])
+    start = time.perf_counter()
+    try:
+        yield(rec)
+    finally:
+        rec.wall = time.perf_counter() - start
+        if MEMORY:
+            base, peak = _running.pop()
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            rec.peak = peak - base
+            if _running:
+                _running[-1][1] = max(_running[-1][1], peak)
+        _add(rec)
+
+def stage(name):
+    """
+    Time a block of code as a named stage.
+    Args:
+        name (str): name of the stage, e.g. 'load.BAM'
+    Returns:
+        context (context manager): yields a Record whose rows attribute may be set inside the block
+    """
+    if not ENABLED:
+        return(contextlib.nullcontext(_NULL))
+    return(_stage(name))
+
+def _rows(result):
+    """
+    Count the rows of a stage's result: the length of a DataFrame, Series, array or Index, or of the first one in a tuple.
+    Args:
+        result (object): value returned by the stage
+    Returns:
+        rows (int): number of rows, or None if the result has no rows
+    """
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    if hasattr(result, 'shape') and len(getattr(result, 'shape')):
+        return(result.shape[0])
+    return(None)
+
+def timed(name = None, rows = _rows):
+    """
+    Decorate a function so that each call is timed as a stage.
+    Args:
+        name (str): name of the stage, defaults to module.function
+        rows (function): function of the return value giving the number of rows produced, or None to record no rows
+    Returns:
+        decorator (function): decorator that returns the function unchanged when profiling is off
+    """
+    def decorator(f):
+        if not ENABLED:
+            return(f)
+        label = name or f.__module__ + '.' + f.__name__
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with _stage(label) as rec:
+                result = f(*args, **kwargs)
+                rec.rows = None if rows is None else rows(result)
+            return(result)
+        return(wrapper)
+    return(decorator)
+
+def report(path = None):
+    """
+    Report the totals of every stage recorded so far, in the order the stages first ran.
+    Args:
+        path (str): optional path of a JSON file to write the report to
+    Returns:
+        stages (dict): calls, total wall time (s), total rows and largest peak memory (bytes) of each stage
+    """
+    stages = {k : dict(v) for k, v in STAGES.items()}
+    if path is not None:
+        with open(path, 'w') as f:
+            json.dump({'stages' : stages}, f, indent = 2)
+    return(stages)
+
+def merge(stages):
+    """
+    Add the totals reported by another process (e.g. a batch worker) to the totals of this one.
+    Args:
+        stages (dict): totals from report
+    """
+    for name, other in stages.items():
+        total = STAGES.setdefault(name, {'calls' : 0, 'wall' : 0.0, 'rows' : None, 'peak_bytes' : None})
+        total['calls'] += other['calls']
+        total['wall'] += other['wall']
+        if other['rows'] is not None:
+            total['rows'] = (total['rows'] or 0) + other['rows']
+        if other['peak_bytes'] is not None:
+            total['peak_bytes'] = max(total['peak_bytes'] or 0, other['peak_bytes'])
+
+def reset():
+    """
+    Forget every stage recorded so far.
+    """
+    STAGES.clear()
+
+@contextlib.contextmanager
+def cprofile(path):
+    """
+    Run a block of code under cProfile and dump the statistics, e.g. for snakeviz or pstats.
+    Args:
+        path (str): path of the file to write the statistics to, or None to run the block without profiling
+    """
+    if path is None:
+        yield
+        return
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
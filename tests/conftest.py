@@ -0,0 +1,11 @@
+"""
+Shared setup for the tests: the library modules live in the repository root, which is put on the import path here,
+and plots are drawn with a non-interactive backend.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MPLBACKEND', 'Agg')
+os.environ.setdefault('COLO_PROFILE', '0')
@@ -0,0 +1,64 @@
+"""
+Tests of matching the timestamps of one instrument's record to another's.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import df_funs as _
+
+def frame(times, values):
+    return(pd.DataFrame({'Date' : pd.to_datetime(times), 'Value' : values}))
+
+def test_time_sync_exact():
+    df_1 = frame(['2020-01-01 00:00', '2020-01-01 01:00', '2020-01-01 02:00'], [0.0, 0.0, 0.0])
+    df_2 = frame(['2020-01-01 02:00', '2020-01-01 00:00', '2020-01-01 00:00'], [2.0, 1.0, 9.0])
+    # Timestamps missing from df_2 give NA; a repeated timestamp gives its first row.
+    np.testing.assert_array_equal(_.time_sync(df_2, df_1, 1), [1.0, np.nan, 2.0])
+
+def test_time_sync_tolerance_hit_and_miss():
+    df_1 = frame(['2020-01-01 00:00', '2020-01-01 01:00', '2020-01-01 02:00', '2020-01-01 05:00'], [0.0]*4)
+    df_2 = frame(['2020-01-01 00:00', '2020-01-01 01:10', '2020-01-01 02:45'], [1.0, 2.0, 3.0])
+    y = _.time_sync(df_2, df_1, 1, tolerance = '30min')
+    # An exact hit, a match 10 minutes away, and two timestamps with nothing within 30 minutes.
+    np.testing.assert_array_equal(y, [1.0, 2.0, np.nan, np.nan])
+    # The window includes its bound.
+    np.testing.assert_array_equal(_.time_sync(df_2, df_1, 1, tolerance = '45min'), [1.0, 2.0, 3.0, np.nan])
+
+def test_time_sync_tie_takes_the_earlier_neighbour():
+    df_1 = frame(['2020-01-01 00:30', '2020-01-01 00:31'], [0.0, 0.0])
+    df_2 = frame(['2020-01-01 01:00', '2020-01-01 00:00', '2020-01-01 00:00'], [2.0, 1.0, 9.0])
+    # 00:30 is 30 minutes from both neighbours: the earlier one wins, and of its repeats the first row.
+    np.testing.assert_array_equal(_.time_sync(df_2, df_1, 1, tolerance = '30min'), [1.0, 2.0])
+
+def test_time_sync_n_keeps_shared_timestamps():
+    a = frame(['2020-01-01 02:00', '2020-01-01 00:00', '2020-01-01 01:00', '2020-01-01 00:00'], [2.0, 0.0, 1.0, 9.0])
+    b = frame(['2020-01-01 00:00', '2020-01-01 02:00', '2020-01-01 03:00'], [10.0, 12.0, 13.0])
+    c = frame(['2020-01-01 02:00', '2020-01-01 00:00'], [22.0, 20.0])
+    (a_, b_, c_), x = _.time_sync_n(a, b, c)
+    assert list(x) == list(pd.to_datetime(['2020-01-01 00:00', '2020-01-01 02:00']))
+    # Rows line up one to one in timestamp order, with the first of any repeats.
+    assert list(a_['Value']) == [0.0, 2.0]
+    assert list(b_['Value']) == [10.0, 12.0]
+    assert list(c_['Value']) == [20.0, 22.0]
+    assert all(list(df.index) == [0, 1] and (df['Date'].to_numpy() == x.to_numpy()).all() for df in (a_, b_, c_))
+
+def test_time_sync_n_without_shared_timestamps():
+    (a_, b_), x = _.time_sync_n(frame(['2020-01-01 00:00'], [1.0]), frame(['2020-01-01 01:00'], [2.0]))
+    assert len(x) == 0 and len(a_) == 0 and len(b_) == 0
+    new_dfs, x = _.time_sync_n()
+    assert new_dfs == [] and len(x) == 0
+
+def test_splice_precedence():
+    before = frame(['2020-01-01 00:00', '2020-01-01 01:00', '2020-01-01 02:00'], [1.0, 2.0, 3.0])
+    after = frame(['2020-01-01 03:00', '2020-01-01 01:00', '2020-01-01 02:00'], [14.0, 12.0, 13.0])
+    last = _.splice([before, after])
+    assert list(last['Value']) == [1.0, 12.0, 13.0, 14.0]
+    assert last['Date'].is_monotonic_increasing and list(last.index) == [0, 1, 2, 3]
+    assert list(_.splice([before, after], precedence = 'first')['Value']) == [1.0, 2.0, 3.0, 14.0]
+    # Precedence follows the order of the segments, not the order of their rows.
+    assert list(_.splice([after, before])['Value']) == [1.0, 2.0, 3.0, 14.0]
+
+def test_splice_rejects_unknown_precedence():
+    with pytest.raises(ValueError):
+        _.splice([frame(['2020-01-01'], [1.0])], precedence = 'middle')
@@ -0,0 +1,19 @@
+"""
+Tests of the row selection of the batch driver.
+"""
+
+import pandas as pd
+import batch
+
+def test_select_without_site_column_keeps_nothing_for_a_site():
+    df = pd.DataFrame({'Date' : pd.date_range('2019-03-23', periods = 3, freq = '1D'), 'Value' : [1.0, 2.0, 3.0]})
+    assert len(batch.select(df, 'Concord - 2956-A Treat Blvd', None, None)) == 0
+    assert len(batch.select(df, None, None, None)) == 3
+
+def test_pre_dms_rows_only_reach_their_own_site():
+    data = batch.load_data()
+    site = batch.FILE_SITES['T640_PRE_DMS']
+    concord = batch.instrument_frames(data, {'site' : site})['T640']
+    other = batch.instrument_frames(data, {'site' : 'Another Site'})['T640']
+    assert concord['Date'].min() < data['T640']['Date'].min()
+    assert len(other) == 0
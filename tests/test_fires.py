@@ -0,0 +1,66 @@
+"""
+Tests of the fire index: the fires active at each timestamp and the distance-weighted smoke exposure of each site.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import df_funs as _
+
+def catalog(rows, **columns):
+    """
+    Build a fire table from (name, start, end, acreage) rows.
+    """
+    df = pd.DataFrame(rows, columns = ['Name', 'Date', 'End Date', 'Acreage'])
+    df['Date'] = pd.to_datetime(df['Date'])
+    df['End Date'] = pd.to_datetime(df['End Date'])
+    for k, v in columns.items():
+        df[k] = v
+    return(df)
+
+def test_active_fires():
+    index = _.fire_index(catalog([['A', '2020-01-01', '2020-01-03', 10.0], ['B', '2020-01-02', '2020-01-02', 5.0]]))
+    dates = pd.to_datetime(['2019-12-31 00:00', '2020-01-01 00:00', '2020-01-02 12:00', '2020-01-03 23:00', '2020-01-04 00:00'])
+    df = _.active_fires(index, dates)
+    assert list(df['count']) == [0, 1, 2, 1, 0]
+    assert list(df['acreage']) == [0.0, 10.0, 15.0, 10.0, 0.0]
+    assert list(df['names']) == ['', 'A', 'A; B', 'A', '']
+
+def test_inverted_events_are_never_active():
+    # A ends before it starts; it must not cancel B or shift B's name onto other timestamps.
+    index = _.fire_index(catalog([['A', '2020-01-05', '2020-01-02', 1.0], ['B', '2020-01-01', '2020-01-10', 7.0], ['C', None, '2020-01-04', 2.0]]))
+    df = _.active_fires(index, pd.to_datetime(['2020-01-03', '2020-01-06']))
+    assert list(df['count']) == [1, 1]
+    assert list(df['acreage']) == [7.0, 7.0]
+    assert list(df['names']) == ['B', 'B']
+
+def test_names_match_counts_on_a_large_catalog():
+    rng = np.random.default_rng(0)
+    start = pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 365, 2000), unit = 'D')
+    # About one event in ten ends before it starts.
+    end = start + pd.to_timedelta(rng.integers(-5, 40, 2000), unit = 'D')
+    df = catalog(list(zip(['F' + str(k) for k in range(0, 2000)], start, end, rng.random(2000))))
+    dates = pd.date_range('2019-12-01', '2021-03-01', freq = '1D')
+    fires = _.active_fires(_.fire_index(df), dates)
+    for k in range(0, len(dates), 37):
+        t = dates[k]
+        active = df[(df['Date'] <= t) & (t < df['End Date'] + pd.Timedelta('1D'))]
+        assert fires['count'][k] == len(active)
+        assert fires['acreage'][k] == pytest.approx(active['Acreage'].sum())
+        assert sorted(x for x in fires['names'][k].split('; ') if x) == sorted(active['Name'])
+
+def test_smoke_exposure_decays_with_distance():
+    lat, lon = _.SITES['Concord - 2956-A Treat Blvd']
+    # Fire A burns at the site, B about 111 km north, C far beyond the search radius.
+    df = catalog([['A', '2020-01-01', '2020-01-01', 100.0], ['B', '2020-01-01', '2020-01-02', 100.0], ['C', '2020-01-01', '2020-01-02', 1e6]],
+            Latitude = [lat, lat + 1.0, lat + 20.0], Longitude = [lon, lon, lon])
+    index = _.fire_index(df, latitude = 'Latitude', longitude = 'Longitude')
+    score = _.smoke_exposure(index, pd.to_datetime(['2020-01-01', '2020-01-02', '2020-01-03']), scale = 50.0)
+    d = _.EARTH_RADIUS*np.radians(1.0)
+    expected = [100.0 + 100.0*np.exp(-d/50.0), 100.0*np.exp(-d/50.0), 0.0]
+    assert score['Concord - 2956-A Treat Blvd'].to_numpy() == pytest.approx(expected)
+
+def test_smoke_exposure_needs_coordinates():
+    index = _.fire_index(catalog([['A', '2020-01-01', '2020-01-01', 1.0]]))
+    with pytest.raises(ValueError):
+        _.smoke_exposure(index, pd.to_datetime(['2020-01-01']))
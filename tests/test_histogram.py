@@ -0,0 +1,45 @@
+"""
+Tests of the histogram counts and of folding the out-of-range counts into the plotted bars.
+"""
+
+import numpy as np
+import matplotlib.pyplot as plt
+import df_funs as _
+
+def bar_heights(ax):
+    return([p.get_height() for p in ax.patches])
+
+def test_histogram_underflow_and_overflow():
+    edges = _.bin_edges(0.0, 30.0, 3.0)
+    counts = _.histogram([-1.0, 0.0, 2.9, 3.0, 29.0, 30.0, 45.0], edges)
+    assert counts[0] == 1
+    assert counts[1:3].tolist() == [2, 1]
+    assert counts[10] == 1
+    assert counts[-1] == 2
+
+def test_histogram_closed_keeps_the_last_edge():
+    edges = _.bin_edges(0.0, 30.0, 3.0)
+    counts = _.histogram([30.0], edges, closed = True)
+    assert counts[10] == 1 and counts[-1] == 0
+
+def test_plt_hist_folds_underflow_only():
+    edges = _.bin_edges(0.0, 30.0, 3.0)
+    counts = _.histogram([-5.0, -1.0, 1.0, 29.0, 40.0, 50.0], edges)
+    heights = {}
+    for clip in (False, 'low', True):
+        fig, ax = plt.subplots()
+        _.plt_hist(counts, edges, ax, 'k', clip = clip)
+        heights[clip] = bar_heights(ax)
+        plt.close(fig)
+    assert heights[False][0] == 1 and heights[False][-1] == 1
+    assert heights['low'][0] == 3 and heights['low'][-1] == 1
+    assert heights[True][0] == 3 and heights[True][-1] == 3
+
+def test_plt_hist_stacks_categories():
+    edges = _.bin_edges(0.0, 6.0, 3.0)
+    counts = _.histogram([-1.0, 1.0, 4.0, 4.0], edges, categories = ['a', 'b', 'a', 'b'])
+    fig, ax = plt.subplots()
+    _.plt_hist(counts, edges, ax, ['r', 'b'], clip = 'low')
+    assert bar_heights(ax) == [1, 1, 1, 1]
+    assert [p.get_y() for p in ax.patches] == [0, 0, 1, 1]
+    plt.close(fig)
@@ -0,0 +1,69 @@
+"""
+Tests of the FFT lagged cross-correlation and the lag search between instruments.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import df_funs as _
+
+def naive(x, y, lag, min_overlap = 3):
+    """
+    Correlate x[t] with y[t + lag] over the pairs where both are present, by shifting the arrays.
+    """
+    if lag >= 0:
+        a, b = x[:len(x) - lag], y[lag:]
+    else:
+        a, b = x[-lag:], y[:len(y) + lag]
+    ok = np.isfinite(a) & np.isfinite(b)
+    if ok.sum() < min_overlap:
+        return(np.nan, int(ok.sum()))
+    return(np.corrcoef(a[ok], b[ok])[0, 1], int(ok.sum()))
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(0)
+    truth = np.cumsum(rng.normal(0.0, 1.0, 600)) + 50.0
+    x = truth + rng.normal(0.0, 0.3, 600)
+    # y trails x by 4 samples, with its own noise and gaps.
+    y = np.roll(truth, 4) + rng.normal(0.0, 0.3, 600)
+    x[rng.random(600) < 0.1] = np.nan
+    y[rng.random(600) < 0.2] = np.nan
+    return(x, y)
+
+def test_masked_correlation_matches_shifted_pairs(series):
+    x, y = series
+    lags, r, n = _.lagged_correlation(x, y, 20)
+    for lag, r_k, n_k in zip(lags, r, n):
+        expected, count = naive(x, y, lag)
+        assert n_k == count
+        assert r_k == pytest.approx(expected, abs = 1e-10)
+
+def test_min_overlap_blanks_sparse_lags():
+    x = np.array([1.0, 2.0, 3.0, np.nan, np.nan, np.nan])
+    y = np.array([np.nan, np.nan, np.nan, 1.0, 2.0, 3.0])
+    lags, r, n = _.lagged_correlation(x, y, 5)
+    assert n[lags == 3][0] == 3
+    assert r[lags == 3][0] == pytest.approx(1.0)
+    assert np.isnan(r[lags == 0][0])
+
+def test_lag_pairs_finds_the_offset_and_mirrors_it(series):
+    x, y = series
+    dates = pd.date_range('2020-01-01', periods = len(x), freq = '1h')
+    dfs = [pd.DataFrame({'Date' : dates, 'Value' : v}) for v in (x, y)]
+    lags = _.lag_pairs(dfs, ['A', 'B'], '1h', '12h').set_index(['x', 'y'])
+    assert lags.loc[('A', 'B'), 'lag'] == pd.Timedelta('4h')
+    assert lags.loc[('B', 'A'), 'lag'] == pd.Timedelta('-4h')
+    assert lags.loc[('B', 'A'), 'r'] == lags.loc[('A', 'B'), 'r']
+    assert lags.loc[('B', 'A'), 'n'] == lags.loc[('A', 'B'), 'n']
+    assert lags.loc[('B', 'A'), 'r0'] == lags.loc[('A', 'B'), 'r0']
+    # Shifting y back by the lag lines the series up.
+    aligned = _.lag_pairs([dfs[0], _.shift(dfs[1], -lags.loc[('A', 'B'), 'lag'])], ['A', 'B'], '1h', '12h')
+    assert (aligned['lag'] == pd.Timedelta(0)).all()
+
+def test_lag_pairs_covers_every_ordered_pair(series):
+    x, y = series
+    dates = pd.date_range('2020-01-01', periods = len(x), freq = '1h')
+    dfs = [pd.DataFrame({'Date' : dates, 'Value' : v}) for v in (x, y, x + y)]
+    lags = _.lag_pairs(dfs, ['A', 'B', 'C'], '1h', '6h')
+    assert list(zip(lags['x'], lags['y'])) == [('A', 'B'), ('A', 'C'), ('B', 'A'), ('B', 'C'), ('C', 'A'), ('C', 'B')]
@@ -0,0 +1,110 @@
+"""
+Tests of the datafile loaders: QC flags and policies, and the cache of flagged datafiles.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import loaders
+
+ROWS = [
+        # Site, Parameter, Date (LST), Value, Unit, QCCode, OPCode
+        ['Concord', 'PM2.5_T640', '2020/01/01 00:00', 5.0, 'ug/m3', 0, 0],
+        ['Concord', 'PM2.5_T640', '2020/01/01 01:00', -999, 'ug/m3', 0, 0],
+        ['Concord', 'PM2.5_T640', '2020/01/01 02:00', 7.0, 'ug/m3', 8, 0],
+        ['Concord', 'PM2.5_T640', '2020/01/01 03:00', 8.0, 'ug/m3', 0, 3],
+        ['Concord', 'PM2.5_T640', '2020/01/01 04:00', None, 'ug/m3', 0, 0],
+        ['Concord', 'PM2.5_T640', '2020/01/01 05:00', -1.0, 'ug/m3', 0, 0],
+        ['Concord', 'PM2.5_T640', '2020/01/01 06:00', 500.0, 'ug/m3', 0, 0],
+        ['Concord', 'PM2.5_T640', '2020/01/01 00:00', 6.0, 'ug/m3', 0, 0],
+        ['Concord', 'PM2.5_T640', '2020/01/01 07:00', 6.0, 'ug/m3', 0, 0],
+        ]
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / 'T640.csv'
+    pd.DataFrame(ROWS, columns = ['Site', 'Parameter', 'Date (LST)', 'Value', 'Unit', 'QCCode', 'OPCode']).to_csv(path, index = False)
+    return(str(path))
+
+def test_flags(path):
+    df = loaders.read(path, loaders.T640)
+    assert list(df['Flags']) == [0, loaders.SENTINEL, loaders.QC_CODE, loaders.OP_CODE, loaders.MISSING, 0, 0, 0, 0]
+    assert list(df)[:4] == ['Site', 'Date', 'Value', 'Flags']
+
+def test_default_policy_drops_missing_sentinels_and_repeats(path):
+    df = loaders.load(path, loaders.T640)
+    assert list(df['Value']) == [5.0, 7.0, 8.0, -1.0, 500.0, 6.0]
+    # The repeated 00:00 row is dropped and the first occurrence kept.
+    assert df['Date'].is_unique
+
+def test_policies(path):
+    df = loaders.read(path, loaders.T640)
+    strict = df[loaders.qc_mask(df, loaders.T640, loaders.QC_POLICIES['strict'])]
+    assert list(strict['Value']) == [5.0, -1.0, 500.0, 6.0]
+    positive = df[loaders.qc_mask(df, loaders.T640, loaders.QC_POLICIES['positive'])]
+    assert list(positive['Value']) == [5.0, 7.0, 8.0, 500.0, 6.0]
+    capped = df[loaders.qc_mask(df, loaders.T640, dict(loaders.DEFAULT_QC, ceiling = 100.0, floor = 0.0))]
+    assert list(capped['Value']) == [5.0, 7.0, 8.0, 6.0]
+    robust = df[loaders.qc_mask(df, loaders.T640, dict(loaders.DEFAULT_QC, outliers = 3.0))]
+    assert 500.0 not in list(robust['Value'])
+
+def test_dropped_rows_do_not_shadow_later_repeats(tmp_path):
+    # A flagged row must not hide a valid row with the same timestamp further down the file.
+    path = tmp_path / 'T640.csv'
+    rows = [['Concord', 'PM2.5_T640', '2020/01/01 00:00', -999, 'ug/m3', 0, 0], ['Concord', 'PM2.5_T640', '2020/01/01 00:00', 4.0, 'ug/m3', 0, 0]]
+    pd.DataFrame(rows, columns = ['Site', 'Parameter', 'Date (LST)', 'Value', 'Unit', 'QCCode', 'OPCode']).to_csv(path, index = False)
+    assert list(loaders.load(path, loaders.T640)['Value']) == [4.0]
+
+def test_no_policy_keeps_every_row(path):
+    assert len(loaders.load(path, loaders.T640, qc = None)) == len(ROWS)
+
+def test_cache_reuses_and_invalidates_entries(path, tmp_path):
+    directory = str(tmp_path / 'cache')
+    first = loaders.load_cached(path, loaders.T640, directory)
+    pd.testing.assert_frame_equal(first, loaders.load(path, loaders.T640), check_categorical = False)
+    entries = os.listdir(directory)
+    assert len(entries) == 1
+    # A second load reuses the entry.
+    loaders.load_cached(path, loaders.T640, directory)
+    assert os.listdir(directory) == entries
+    # Any policy can be applied to the cached rows.
+    assert len(loaders.load_cached(path, loaders.T640, directory, qc = None)) == len(ROWS)
+    # Changing the file replaces its entry.
+    with open(path, 'a') as f:
+        f.write('Concord,PM2.5_T640,2020/01/01 08:00,9.0,ug/m3,0,0\n')
+    second = loaders.load_cached(path, loaders.T640, directory)
+    assert list(second['Value'])[-1] == 9.0
+    assert len(os.listdir(directory)) == 1
+    assert os.listdir(directory) != entries
+
+def test_cache_key_changes_with_schema_and_version(path, monkeypatch):
+    key = loaders.cache_key(path, loaders.T640)
+    assert loaders.cache_key(path, dict(loaders.T640, sentinels = {'Value' : [-999, -1]})) != key
+    monkeypatch.setattr(loaders, 'SCHEMA_VERSION', loaders.SCHEMA_VERSION + 1)
+    assert loaders.cache_key(path, loaders.T640) != key
+
+def test_cache_leaves_other_temporary_files_alone(path, tmp_path):
+    directory = tmp_path / 'cache'
+    directory.mkdir()
+    # A temporary file another run is still writing for the same source.
+    source = loaders.hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16]
+    other = directory / (source + '_other.feather.tmp')
+    other.write_bytes(b'partial')
+    loaders.load_cached(path, loaders.T640, str(directory))
+    assert other.exists()
+
+def test_cache_key_hashes_contents_only_when_verifying(path, monkeypatch):
+    key = loaders.cache_key(path, loaders.T640)
+    verified = loaders.cache_key(path, loaders.T640, verify = True)
+    # Rewrite a value in place, keeping the size and modification time.
+    st = os.stat(path)
+    with open(path) as f:
+        text = f.read()
+    with open(path, 'w') as f:
+        f.write(text.replace('5.0', '9.0', 1))
+    os.utime(path, ns = (st.st_atime_ns, st.st_mtime_ns))
+    monkeypatch.setattr(loaders, 'file_hash', lambda path: pytest.fail('contents hashed without verify'))
+    assert loaders.cache_key(path, loaders.T640) == key
+    monkeypatch.undo()
+    assert loaders.cache_key(path, loaders.T640, verify = True) != verified
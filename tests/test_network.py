@@ -0,0 +1,44 @@
+"""
+Tests of the network-wide correlation matrix and the tiled time grid it can be computed from.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import df_funs as _
+
+@pytest.fixture
+def dfs():
+    rng = np.random.default_rng(0)
+    truth = np.cumsum(rng.normal(0.0, 1.0, 1000)) + 30.0
+    dates = pd.date_range('2020-01-01', periods = 1000, freq = '1h')
+    dfs = []
+    for k in range(0, 5):
+        keep = np.sort(rng.choice(1000, 700 + 50*k, replace = False))
+        dfs += [pd.DataFrame({'Date' : dates[keep], 'Value' : (1 + 0.1*k)*truth[keep] + rng.normal(0.0, 1.0 + k, len(keep))})]
+    return(dfs)
+
+def test_grid_tiles_match_to_grid(dfs):
+    grid, x = _.to_grid(dfs, '1h')
+    blocks = list(_.grid_tiles(dfs, '1h', 64))
+    assert max(b.shape[1] for b in blocks) == 64
+    assert np.array_equal(np.concatenate(blocks, axis = 1), grid, equal_nan = True)
+
+def test_correlation_matrix_matches_pairwise_fits(dfs):
+    from scipy import stats
+    grid, x = _.to_grid(dfs, '1h')
+    m = _.correlation_matrix(grid)
+    for i, j in [(0, 1), (2, 4), (3, 0)]:
+        ok = np.isfinite(grid[i]) & np.isfinite(grid[j])
+        fit = stats.linregress(grid[i][ok], grid[j][ok])
+        assert m['n'][i, j] == ok.sum()
+        assert m['r'][i, j] == pytest.approx(fit.rvalue, abs = 1e-12)
+        assert m['slope'][i, j] == pytest.approx(fit.slope, rel = 1e-10)
+        assert m['intercept'][i, j] == pytest.approx(fit.intercept, rel = 1e-9, abs = 1e-9)
+
+def test_streamed_tiles_match_the_whole_grid(dfs):
+    whole = _.correlation_matrix(_.to_grid(dfs, '1h')[0])
+    tiled = _.correlation_matrix(_.grid_tiles(dfs, '1h', 100))
+    assert np.array_equal(whole['n'], tiled['n'])
+    for k in ['r', 'slope', 'intercept']:
+        assert np.allclose(whole[k], tiled[k], rtol = 1e-10, atol = 1e-12, equal_nan = True)
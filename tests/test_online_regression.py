@@ -0,0 +1,94 @@
+"""
+Tests of the running regressions in df_funs: the Welford/Chan merge and subtraction, and rolling-window expiry.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import df_funs as _
+
+def ols(x, y):
+    """
+    Fit y against x directly, for comparison with the running sums.
+    """
+    slope, intercept = np.polyfit(x, y, 1)
+    return(slope, intercept, np.corrcoef(x, y)[0, 1])
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    x = rng.normal(1e4, 5.0, 3000)
+    y = 0.7*x + 2.0 + rng.normal(0.0, 1.0, 3000)
+    dates = pd.date_range('2020-01-01', periods = 3000, freq = '1h').to_numpy()
+    return(x, y, dates)
+
+def test_merge_matches_direct_fit(data):
+    x, y, _dates = data
+    reg = _.OnlineRegression()
+    for rows in np.array_split(np.arange(len(x)), 7):
+        reg.add(x[rows], y[rows])
+    fit = reg.fit()
+    slope, intercept, r = ols(x, y)
+    assert fit['n'] == len(x)
+    assert fit['slope'] == pytest.approx(slope, rel = 1e-9)
+    assert fit['intercept'] == pytest.approx(intercept, rel = 1e-6)
+    assert fit['rvalue'] == pytest.approx(r, rel = 1e-9)
+
+def test_remove_undoes_add(data):
+    x, y, _dates = data
+    reg = _.OnlineRegression()
+    reg.add(x[:2000], y[:2000])
+    reg.add(x[2000:], y[2000:])
+    reg.remove(x[2000:], y[2000:])
+    slope, intercept, r = ols(x[:2000], y[:2000])
+    assert reg.n == 2000
+    assert reg.fit()['slope'] == pytest.approx(slope, rel = 1e-8)
+    assert reg.fit()['rvalue'] == pytest.approx(r, rel = 1e-8)
+
+def test_empty_values_are_left_out():
+    reg = _.OnlineRegression()
+    reg.add([1.0, 2.0, np.nan, 3.0], [2.0, 4.0, 5.0, np.nan])
+    assert reg.n == 2
+    assert reg.fit()['slope'] == pytest.approx(2.0)
+
+@pytest.mark.parametrize('shuffle', [False, True])
+def test_window_matches_fit_of_rows_inside(data, shuffle):
+    x, y, dates = data
+    batches = np.array_split(np.arange(len(x)), 300)
+    if shuffle:
+        # Batches that arrive slightly out of order are expired by timestamp, not by arrival.
+        rng = np.random.default_rng(1)
+        order = np.arange(len(batches)) + rng.integers(0, 3, len(batches))
+        batches = [batches[k] for k in np.argsort(order, kind = 'stable')]
+    reg = _.OnlineRegression('10D')
+    for rows in batches:
+        reg.add(x[rows], y[rows], dates[rows])
+    latest = dates.max()
+    inside = dates > latest - np.timedelta64(10, 'D')
+    slope, intercept, r = ols(x[inside], y[inside])
+    assert reg.n == inside.sum()
+    assert reg.fit()['slope'] == pytest.approx(slope, rel = 1e-8)
+    assert reg.fit()['rvalue'] == pytest.approx(r, rel = 1e-8)
+
+def test_window_only_keeps_batches_inside(data):
+    x, y, dates = data
+    reg = _.OnlineRegression('1D')
+    for k in range(0, len(x)):
+        reg.add(x[k:k + 1], y[k:k + 1], dates[k:k + 1])
+    # Hourly rows in a one day window: 24 rows (and batches) are kept, not all 3000.
+    assert reg.n == 24
+    assert len(reg.rows) == 24
+
+def test_regressions_expire_every_stratum(data):
+    x, y, dates = data
+    df = pd.DataFrame({'Date' : dates, 'A' : x, 'B' : y})
+    strata = np.where(np.arange(len(x)) < 1500, 'early', 'late')
+    regs = _.OnlineRegressions(['A', 'B'], window = '10D')
+    regs.update(df.iloc[:1500], strata[:1500])
+    regs.update(df.iloc[1500:], strata[1500:])
+    fits = regs.fits().set_index(['x', 'y', 'stratum'])
+    # Every early row is more than 10 days older than the latest row, so the early stratum is empty.
+    assert fits.loc[('A', 'B', 'early'), 'n'] == 0
+    assert fits.loc[('A', 'B', 'late'), 'n'] == 240
+    slope, intercept, r = ols(y[-240:], x[-240:])
+    assert fits.loc[('B', 'A', 'late'), 'slope'] == pytest.approx(slope, rel = 1e-8)
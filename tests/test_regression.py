@@ -0,0 +1,120 @@
+"""
+Tests of the pairwise regressions in df_funs and their bootstrap confidence intervals.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import df_funs as _
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(0)
+    x = rng.normal(10.0, 3.0, 400)
+    df = pd.DataFrame({'A' : x, 'B' : 0.8*x + 1.0 + rng.normal(0.0, 0.5, 400), 'C' : 1.1*x + rng.normal(0.0, 1.0, 400)})
+    df.loc[::7, 'C'] = np.nan
+    return(df)
+
+def test_bootstrap_uses_the_rows_of_the_point_estimate(df):
+    # A and B have no empty cells of their own, but rows where C is empty are left out of their fit too.
+    fits = _.bootstrap_pairs(df, B = 200).set_index(['x', 'y'])
+    complete = df.dropna()
+    direct = _.bootstrap_fit(complete['A'], complete['B'], B = 200, seed = 0)
+    assert fits.loc[('A', 'B'), 'n'] == len(complete)
+    assert fits.loc[('A', 'B'), 'slope_lo'] == direct['slope_lo']
+    assert fits.loc[('A', 'B'), 'slope_hi'] == direct['slope_hi']
+    assert fits.loc[('A', 'B'), 'slope_lo'] < fits.loc[('A', 'B'), 'slope'] < fits.loc[('A', 'B'), 'slope_hi']
+
+def test_ols_matches_linregress(df):
+    from scipy import stats
+    fits = _.regress_pairs(df).set_index(['x', 'y'])
+    complete = df.dropna()
+    fit = stats.linregress(complete['A'], complete['B'])
+    assert fits.loc[('A', 'B'), 'slope'] == pytest.approx(fit.slope, rel = 1e-12)
+    assert fits.loc[('A', 'B'), 'intercept'] == pytest.approx(fit.intercept, rel = 1e-10)
+    assert fits.loc[('A', 'B'), 'rvalue'] == pytest.approx(fit.rvalue, rel = 1e-12)
+    assert fits.loc[('A', 'B'), 'stderr'] == pytest.approx(fit.stderr, rel = 1e-10)
+    assert fits.loc[('A', 'B'), 'pvalue'] == pytest.approx(fit.pvalue, rel = 1e-6, abs = 1e-300)
+
+def test_orthogonal_follows_the_principal_axis():
+    # The orthogonal fit minimizes perpendicular distances, so its slope is that of the leading eigenvector of the covariance matrix.
+    rng = np.random.default_rng(1)
+    t = rng.uniform(0.0, 30.0, 300)
+    x = t + rng.normal(0.0, 1.0, 300)
+    y = 0.8*t + 2.0 + rng.normal(0.0, 1.0, 300)
+    fit = _.regress(x, y, mode = 'orthogonal')
+    w, v = np.linalg.eigh(np.cov(x, y))
+    slope = v[1, -1]/v[0, -1]
+    assert fit['slope'] == pytest.approx(slope, rel = 1e-10)
+    assert fit['intercept'] == pytest.approx(y.mean() - slope*x.mean(), rel = 1e-9)
+
+def test_deming_ratio_limits():
+    # With a large error variance ratio, Deming regression approaches OLS of y on x; with a small one, the inverse of OLS of x on y.
+    rng = np.random.default_rng(2)
+    x = rng.normal(10.0, 3.0, 500)
+    y = 0.5*x + rng.normal(0.0, 1.0, 500)
+    ols = _.regress(x, y)
+    inverse = _.regress(y, x)
+    assert _.regress(x, y, mode = 'deming', delta = 1e8)['slope'] == pytest.approx(ols['slope'], rel = 1e-5)
+    assert _.regress(x, y, mode = 'deming', delta = 1e-8)['slope'] == pytest.approx(1/inverse['slope'], rel = 1e-5)
+
+def test_deming_swapping_axes_inverts_the_slope():
+    rng = np.random.default_rng(3)
+    x = rng.normal(10.0, 3.0, 500)
+    y = 1.3*x + rng.normal(0.0, 1.0, 500)
+    forward = _.regress(x, y, mode = 'deming', delta = 2.0)
+    backward = _.regress(y, x, mode = 'deming', delta = 0.5)
+    assert forward['slope'] == pytest.approx(1/backward['slope'], rel = 1e-12)
+
+def test_theil_sen_is_exact_on_a_line_and_robust_to_outliers():
+    x = np.arange(0.0, 50.0)
+    y = 2.0*x + 1.0
+    assert _.theil_sen(x, y) == pytest.approx((2.0, 1.0))
+    y[::10] = 1000.0
+    m, b = _.theil_sen(x, y)
+    assert m == pytest.approx(2.0)
+    assert b == pytest.approx(1.0)
+
+def test_theil_sen_sampled_pairs_approximate_the_exact_median():
+    rng = np.random.default_rng(4)
+    x = rng.normal(10.0, 3.0, 3000)
+    y = 0.7*x + rng.normal(0.0, 1.0, 3000)
+    exact = _.theil_sen(x, y)
+    sampled = _.theil_sen(x, y, max_pairs = 200000)
+    assert sampled[0] == pytest.approx(exact[0], abs = 0.01)
+    # Vertical pairs (equal x) are skipped rather than producing infinite slopes.
+    assert np.isnan(_.theil_sen([1.0, 1.0, 1.0], [1.0, 2.0, 3.0])[0])
+
+def test_strata_are_fitted_separately():
+    rng = np.random.default_rng(5)
+    x = rng.normal(10.0, 3.0, 400)
+    df = pd.DataFrame({'A' : x, 'B' : np.where(np.arange(400) % 2, 2.0, 0.5)*x + rng.normal(0.0, 0.5, 400)})
+    strata = np.where(np.arange(400) % 2, 'odd', 'even')
+    fits = _.regress_pairs(df, strata = strata, include_all = True).set_index(['x', 'y', 'stratum'])
+    assert fits.loc[('A', 'B', 'all'), 'n'] == 400
+    assert fits.loc[('A', 'B', 'odd'), 'n'] == 200
+    assert fits.loc[('A', 'B', 'odd'), 'slope'] == pytest.approx(_.regress(x[1::2], df['B'][1::2])['slope'], rel = 1e-12)
+    assert fits.loc[('A', 'B', 'even'), 'slope'] == pytest.approx(_.regress(x[::2], df['B'][::2])['slope'], rel = 1e-12)
+
+def test_bootstrap_strata_follow_the_levels():
+    # Stratum c has the opposite slope and is not one of the levels, so it is left out of the combined fit and its intervals.
+    rng = np.random.default_rng(6)
+    x = rng.normal(10.0, 3.0, 240)
+    strata = np.repeat(['a', 'b', 'c'], 80)
+    y = np.where(strata == 'c', -1.0, 1.0)*x + rng.normal(0.0, 0.5, 240)
+    df = pd.DataFrame({'A' : x, 'B' : y})
+    fits = _.bootstrap_pairs(df, strata = strata, levels = ['a', 'b'], include_all = True, B = 200).set_index(['x', 'y', 'stratum'])
+    combined = fits.loc[('A', 'B', 'all')]
+    assert combined['n'] == 160
+    assert combined['slope_lo'] < combined['slope'] < combined['slope_hi']
+    assert combined['slope_hi'] - combined['slope_lo'] < 0.1
+
+def test_bootstrap_stratum_named_all():
+    # A user stratum called 'all' is bootstrapped on its own rows, not on every row.
+    rng = np.random.default_rng(7)
+    x = rng.normal(10.0, 3.0, 200)
+    strata = np.repeat(['all', 'other'], 100)
+    df = pd.DataFrame({'A' : x, 'B' : np.where(strata == 'all', 1.0, -1.0)*x + rng.normal(0.0, 0.5, 200)})
+    fits = _.bootstrap_pairs(df, strata = strata, B = 200).set_index(['x', 'y', 'stratum'])
+    assert fits.loc[('A', 'B', 'all'), 'slope_lo'] > 0.9
+    assert fits.loc[('A', 'B', 'other'), 'slope_hi'] < -0.9
@@ -0,0 +1,67 @@
+"""
+Tests of the chunked resampling of raw data to window averages.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import df_funs as _
+import loaders
+
+def minutes(day, n, value = 1.0, site = 'A'):
+    """
+    Build n consecutive 1-minute rows starting at midnight of a day.
+    """
+    return(pd.DataFrame({'Site' : site, 'Date' : pd.date_range(day, periods = n, freq = '1min'), 'Value' : value}))
+
+def test_window_completeness():
+    df = pd.concat([minutes('2020-01-01', 1080), minutes('2020-01-02', 1079)], ignore_index = True)
+    new_df = _.resample(df)
+    assert list(new_df['Date']) == [pd.Timestamp('2020-01-01')]
+    assert new_df['Minutes in Average'].iloc[0] == 1080
+
+def test_repeated_minutes_are_counted_once():
+    # 1000 distinct minutes repeated twice would pass the 75% threshold if repeats were counted.
+    df = minutes('2020-01-01', 1000)
+    r = _.Resampler()
+    r.add(pd.concat([df, df.assign(Value = 5.0)], ignore_index = True))
+    assert len(r.result()) == 0
+    new_df = r.result(keep_incomplete = True)
+    assert new_df['Minutes in Average'].iloc[0] == 1000
+    assert r.duplicates == 1000
+
+def test_repeats_across_chunks_keep_the_first_value():
+    df = minutes('2020-01-01', 1440)
+    r = _.Resampler(by = ['Site'])
+    r.add(df.iloc[:800])
+    # The next chunk starts by repeating the last 100 minutes of the previous one with different values.
+    r.add(pd.concat([df.iloc[700:800].assign(Value = 100.0), df.iloc[800:]], ignore_index = True))
+    new_df = r.result()
+    assert new_df['Value'].iloc[0] == pytest.approx(1.0)
+    assert new_df['Minutes in Average'].iloc[0] == 1440
+
+def test_minutes_never_exceed_the_window():
+    df = minutes('2020-01-01', 1440)
+    r = _.Resampler()
+    for k in range(0, 3):
+        r.add(df)
+    assert r.result()['Minutes in Average'].max() == 1440
+
+def test_sites_are_averaged_separately():
+    df = pd.concat([minutes('2020-01-01', 1440, 1.0, 'A'), minutes('2020-01-01', 1440, 3.0, 'B')], ignore_index = True)
+    new_df = _.resample(df, by = ['Site'])
+    assert list(new_df['Site']) == ['A', 'B']
+    assert list(new_df['Value']) == [1.0, 3.0]
+
+def test_resample_file_matches_in_memory_resampling(tmp_path):
+    rng = np.random.default_rng(0)
+    dates = pd.date_range('2020-01-01', periods = 3*1440, freq = '1min')
+    rows = np.sort(np.concatenate([np.arange(len(dates)), rng.integers(0, len(dates), 200)]))
+    raw = pd.DataFrame({'Site' : 'A', 'Parameter' : 'PM2.5_T640', 'Date (LST)' : dates[rows].strftime('%Y/%m/%d %H:%M'),
+            'Value' : rng.random(len(rows)).round(3), 'Unit' : 'ug/m3', 'QCCode' : 0, 'OPCode' : 0})
+    path = tmp_path / 'raw.csv'
+    raw.to_csv(path, index = False)
+    new_df = loaders.resample_file(path, chunksize = 997)
+    expected = _.resample(loaders.load(path, loaders.T640), by = ['Site'])
+    assert list(new_df['Minutes in Average']) == [1440.0]*3
+    assert np.allclose(new_df['Value'], expected['Value'])
@@ -0,0 +1,38 @@
+"""
+Tests of the compact InstrumentSeries and its alignment.
+"""
+
+import numpy as np
+import pandas as pd
+import df_funs as _
+
+def frame(dates, values):
+    return(pd.DataFrame({'Date' : pd.to_datetime(dates), 'Value' : values}))
+
+def test_align_series_matches_time_sync_n():
+    rng = np.random.default_rng(0)
+    dfs = []
+    for k in range(0, 3):
+        dates = pd.date_range('2020-01-01', periods = 500, freq = '1h')[np.sort(rng.choice(500, 400, replace = False))]
+        # Repeat a few timestamps, with different values after the first occurrence.
+        repeat = np.sort(rng.choice(len(dates), 20, replace = False))
+        df = pd.concat([frame(dates, rng.random(len(dates))), frame(dates[repeat], -1.0)], ignore_index = True)
+        dfs += [df.sort_values('Date', kind = 'stable', ignore_index = True)]
+    values, x = _.align_series(*[_.InstrumentSeries.from_frame(df) for df in dfs])
+    aligned, expected = _.time_sync_n(*dfs)
+    assert x.equals(expected)
+    for v, df in zip(values, aligned):
+        assert np.array_equal(v, df['Value'].to_numpy(dtype = 'float32'))
+
+def test_align_series_with_no_shared_timestamps():
+    a = _.InstrumentSeries.from_frame(frame(['2020-01-01', '2020-01-02'], [1.0, 2.0]))
+    b = _.InstrumentSeries.from_frame(frame(['2020-01-03'], [3.0]))
+    values, x = _.align_series(a, b)
+    assert len(x) == 0
+    assert [len(v) for v in values] == [0, 0]
+
+def test_slice_shares_memory():
+    s = _.InstrumentSeries.from_frame(frame(pd.date_range('2020-01-01', periods = 10, freq = '1D'), np.arange(10.0)))
+    part = s.slice('2020-01-03', '2020-01-06')
+    assert len(part) == 3
+    assert np.shares_memory(part.values, s.values)
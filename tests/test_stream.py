@@ -0,0 +1,59 @@
+"""
+Tests of the filtered, chunked reading of large AQS-style exports.
+"""
+
+import pandas as pd
+import pytest
+import loaders
+
+@pytest.fixture
+def export(tmp_path):
+    """
+    Write an export in which two parameters (and two sites) share every timestamp, with a repeated row straddling a chunk boundary.
+    """
+    rows = []
+    for site in ['Concord', 'Oakland']:
+        for parameter, value in [('PM2.5_T640', 1.0), ('PM10_T640', 2.0)]:
+            for hour in range(0, 6):
+                rows += [[site, parameter, '2020/01/01 %02d:00' % hour, value + hour, 'ug/m3', 0, 0]]
+    rows += [['Concord', 'PM2.5_T640', '2020/01/01 00:00', 99.0, 'ug/m3', 0, 0]]
+    rows += [['Concord', 'PM2.5_T640', '2020/01/01 06:00', -999, 'ug/m3', 8, 0]]
+    df = pd.DataFrame(rows, columns = ['Site', 'Parameter', 'Date (LST)', 'Value', 'Unit', 'QCCode', 'OPCode'])
+    path = tmp_path / 'export.csv'
+    df.to_csv(path, index = False)
+    return(path)
+
+def test_parameters_sharing_timestamps_are_kept_apart(export):
+    df = loaders.stream(export, loaders.T640, parameters = ['PM2.5_T640', 'PM10_T640'], chunksize = 5)
+    assert 'Parameter' in df
+    assert len(df) == 24
+    concord = df[df['Site'] == 'Concord'].set_index(['Parameter', 'Date'])['Value']
+    assert concord[('PM2.5_T640', pd.Timestamp('2020-01-01 00:00'))] == 1.0
+    assert concord[('PM10_T640', pd.Timestamp('2020-01-01 00:00'))] == 2.0
+
+def test_filters(export):
+    df = loaders.stream(export, loaders.T640, sites = ['Oakland'], parameters = ['PM10_T640'], start = '2020-01-01 01:00', end = '2020-01-01 03:00')
+    assert list(df['Site'].astype(str).unique()) == ['Oakland']
+    assert list(df['Parameter'].astype(str).unique()) == ['PM10_T640']
+    assert list(df['Value']) == [3.0, 4.0]
+
+def test_repeats_across_chunks_keep_the_first_row(export):
+    df = loaders.stream(export, loaders.T640, sites = ['Concord'], parameters = ['PM2.5_T640'], chunksize = 4)
+    assert list(df['Value']) == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+
+def test_matches_load_without_filters(export):
+    # Without filters, the T640 schema reads no Parameter column; its rows are keyed by site and timestamp as load does.
+    pm25 = pd.read_csv(export)
+    path = export.parent / 'pm25.csv'
+    pm25[(pm25['Parameter'] == 'PM2.5_T640') & (pm25['Site'] == 'Concord')].to_csv(path, index = False)
+    assert loaders.stream(path, loaders.T640, chunksize = 3).equals(loaders.load(path, loaders.T640))
+
+def test_matches_load_on_shuffled_repeats(tmp_path):
+    # Rows out of time order, with repeats landing in earlier, the same and later chunks.
+    rng = pd.Series(range(0, 60)).sample(frac = 1, random_state = 0)
+    hours = list(rng % 20)
+    rows = [['Concord', 'PM2.5_T640', '2020/01/01 %02d:00' % h, float(k), 'ug/m3', 0, 0] for k, h in enumerate(hours)]
+    path = tmp_path / 'shuffled.csv'
+    pd.DataFrame(rows, columns = ['Site', 'Parameter', 'Date (LST)', 'Value', 'Unit', 'QCCode', 'OPCode']).to_csv(path, index = False)
+    for chunksize in [1, 7, 100]:
+        assert loaders.stream(path, loaders.T640, chunksize = chunksize).equals(loaders.load(path, loaders.T640))
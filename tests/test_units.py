@@ -0,0 +1,49 @@
+"""
+Tests of the unit registry and the unit conversion helpers.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+import df_funs as _
+
+def test_unit_factor_mass_units():
+    assert _.unit_factor('mg/m3') == 1000.0
+    assert _.unit_factor('ng/m3') == 0.001
+    assert _.unit_factor('ug/m3', 'mg/m3') == 0.001
+    assert _.unit_factor('ug/m3_LC') == 1.0
+
+def test_unit_factor_mixing_ratios():
+    # 1 ppb of ozone (48 g/mol) at 25 C and 1 atm is 48/24.45 ug/m3.
+    assert _.unit_factor('ppb', mw = 48.0) == pytest.approx(48.0/24.45)
+    assert _.unit_factor('ppm', mw = 48.0) == pytest.approx(1000*48.0/24.45)
+    assert _.unit_factor('ppm', 'ppb', mw = 48.0) == pytest.approx(1000.0)
+    with pytest.raises(ValueError):
+        _.unit_factor('ppb')
+    with pytest.raises(KeyError):
+        _.unit_factor('furlongs')
+
+def test_normalize_units_mixed_rows():
+    df = pd.DataFrame({'Value' : [1.0, 2.0, 3.0, 4.0], 'Unit' : ['mg/m3', 'ug/m3', 'ppb', None]})
+    new_df = _.normalize_units(df, mw = 48.0)
+    np.testing.assert_allclose(new_df['Value'], [1000.0, 2.0, 3*48.0/24.45, np.nan])
+    assert (new_df['Unit'] == 'ug/m3').all()
+    # The input is left alone unless inplace is set.
+    assert list(df['Unit'][:3]) == ['mg/m3', 'ug/m3', 'ppb']
+    assert _.normalize_units(df, mw = 48.0, inplace = True) is df
+    assert df['Value'][0] == 1000.0
+
+def test_normalize_units_needs_mw_for_ppb():
+    with pytest.raises(ValueError):
+        _.normalize_units(pd.DataFrame({'Value' : [1.0], 'Unit' : ['ppb']}))
+
+def test_conv_units_2():
+    dates = pd.date_range('2020-01-01', periods = 3, freq = 'h')
+    df = pd.DataFrame({'Site' : ['a']*3, 'Date' : dates, 'PM2.5' : [1.0, 2.0, np.nan]}, index = [5, 6, 7])
+    new_df = _.conv_units_2(df, 1000.0, 1, 2)
+    assert list(new_df) == ['PM2.5', 'Date']
+    assert list(new_df.index) == [0, 1, 2]
+    np.testing.assert_array_equal(new_df['PM2.5'], [1000.0, 2000.0, np.nan])
+    assert (new_df['Date'] == dates).all()
+    # Value is ignored: the column keeps its input name.
+    assert list(_.conv_units_2(df, 1000.0, 1, 2, Value = 'Other')) == ['PM2.5', 'Date']